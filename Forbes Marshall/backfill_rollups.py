@@ -0,0 +1,38 @@
+"""
+Daily Rollup Backfill
+Recomputes the daily_rollups table from the raw test results.
+
+Usage:
+    python backfill_rollups.py [start_day] [end_day]
+
+Days are given as YYYY-MM-DD and both are inclusive. Without them, every day
+that still has test results is rebuilt. Run once after upgrading a station to
+fill in rollups for results saved before the table existed, or any time the
+rollups need repairing. Safe to re-run.
+"""
+import sys
+from datetime import date
+from data.database import Database
+
+
+def main():
+    start_day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    end_day = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    db = Database()
+    try:
+        rebuilt = db.rebuild_daily_rollups(
+            start_day, end_day,
+            progress=lambda first, last: print(f"Rebuilt {first} to {last}")
+        )
+    finally:
+        db.close()
+
+    if rebuilt < 0:
+        print("Backfill failed")
+        sys.exit(1)
+    print(f"Rebuilt rollups for {rebuilt} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Frame Parser Benchmark
+Compares lines per second of the previous per-line parsing against utils.frame_parser.
+
+Usage:
+    python benchmark_frame_parser.py [lines]
+
+Feeds the same measurements in serial-read-sized chunks to each parser and
+reports the best of REPEATS runs, plus the speed relative to the previous
+parser, which varies far less between machines than lines/s does.
+No serial port or database is needed.
+"""
+import sys
+import time
+from utils.frame_parser import FrameParser, encode_binary
+
+# Bytes handed over per port.read(), roughly what a busy 115200 baud port returns
+CHUNK_SIZE = 4096
+PARAMETERS = ("Voltage", "current", "resistance")
+# Timed runs per parser; the fastest is reported
+REPEATS = 5
+
+
+def make_text_stream(lines):
+    return b"".join(f"{235 + i % 10},{PARAMETERS[i % 3]},{i % 50 / 10:.1f}\r\n".encode() for i in range(lines))
+
+
+def make_binary_stream(lines):
+    return b"".join(encode_binary(235 + i % 10, PARAMETERS[i % 3].lower(), i % 50 / 10) for i in range(lines))
+
+
+def chunks(stream):
+    return [stream[i:i + CHUNK_SIZE] for i in range(0, len(stream), CHUNK_SIZE)]
+
+
+def legacy_parse(stream_chunks):
+    """Line splitting and parsing as SerialHandler did it before the frame parser"""
+    buffer = b""
+    parsed = 0
+    for chunk in stream_chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        measurements = []
+        for raw in lines:
+            data = raw.decode('utf-8').strip()
+            parts = data.strip().split(',')
+            if len(parts) < 3:
+                continue
+            measurements.append((parts[0].strip(), parts[1].strip().lower(), float(parts[2].strip())))
+        parsed += len(measurements)
+    return parsed
+
+
+def frame_parse(stream_chunks):
+    parser = FrameParser()
+    parsed = 0
+    for chunk in stream_chunks:
+        measurements, _ = parser.feed(chunk)
+        parsed += len(measurements)
+    return parsed
+
+
+def run(name, func, stream_chunks, expected, baseline=None):
+    """Time one parser over the stream, print lines per second and return it"""
+    func(stream_chunks[:10])  # Warm up
+    elapsed = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        parsed = func(stream_chunks)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    if parsed != expected:
+        print(f"{name:<24} parsed {parsed} of {expected} frames")
+    rate = parsed / elapsed
+    relative = f"  {rate / baseline:5.2f}x previous" if baseline else ""
+    print(f"{name:<24} {rate:12,.0f} lines/s  ({elapsed * 1000:8.1f} ms){relative}")
+    return rate
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    text_chunks = chunks(make_text_stream(lines))
+    binary_chunks = chunks(make_binary_stream(lines))
+
+    previous = run("previous (text)", legacy_parse, text_chunks, lines)
+    run("frame parser (text)", frame_parse, text_chunks, lines, previous)
+    run("frame parser (binary)", frame_parse, binary_chunks, lines, previous)
+
+
+if __name__ == "__main__":
+    main()
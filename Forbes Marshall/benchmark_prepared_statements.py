@@ -0,0 +1,98 @@
+"""
+Prepared Statement Benchmark
+Compares per-call latency of plain text queries against the prepared statement registry.
+
+Usage:
+    python benchmark_prepared_statements.py [iterations]
+
+Runs against the database configured in config/config.py (use a local MySQL).
+Write benchmarks run inside a transaction that is rolled back, so no rows are kept.
+"""
+import sys
+import time
+from statistics import median
+from data import connection_pool
+from data.database import Database
+from data.prepared_statements import STATEMENTS, StatementRegistry
+
+
+def time_calls(func, iterations):
+    """Return per-call latencies in microseconds"""
+    # Warm up so the first prepare / connection setup is not measured
+    for _ in range(10):
+        func()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+    return latencies
+
+
+def report(name, text_latencies, prepared_latencies):
+    """Print median and p95 for both variants"""
+    def p95(values):
+        return sorted(values)[int(len(values) * 0.95) - 1]
+
+    text_med = median(text_latencies)
+    prep_med = median(prepared_latencies)
+    gain = (1 - prep_med / text_med) * 100 if text_med else 0
+    print(f"{name:<20} text {text_med:8.1f} us (p95 {p95(text_latencies):8.1f})  "
+          f"prepared {prep_med:8.1f} us (p95 {p95(prepared_latencies):8.1f})  {gain:+6.1f}%")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    db = Database()
+    # Dedicated connection so the benchmark does not disturb the shared one
+    conn = connection_pool.get_pool().get_connection()
+    text_cursor = conn.cursor(dictionary=True, buffered=True)
+    registry = StatementRegistry(conn)
+
+    text_cursor.execute("SELECT id FROM users ORDER BY id LIMIT 1")
+    user = text_cursor.fetchone()
+    text_cursor.execute("SELECT id FROM test_cases ORDER BY id LIMIT 1")
+    test_case = text_cursor.fetchone()
+    if not user or not test_case:
+        print("Benchmark needs at least one user and one test case")
+        return
+    username_row = db.get_user_by_id(user['id'])
+    username = username_row['username']
+    test_case_id = test_case['id']
+    stage_id = db.get_or_create_default_stage(test_case_id)
+
+    print(f"Per-call latency over {iterations} iterations\n")
+
+    def text_query(name, params, fetch=True):
+        text_cursor.execute(STATEMENTS[name], params)
+        if fetch:
+            text_cursor.fetchall()
+
+    # Lookups
+    for name, params in (('get_user_id', (username,)), ('get_test_stages', (test_case_id,))):
+        text = time_calls(lambda: text_query(name, params), iterations)
+        prepared = time_calls(lambda: registry.fetch_all(name, params), iterations)
+        report(name, text, prepared)
+
+    # Writes, rolled back afterwards
+    result_params = (test_case_id, user['id'], 'BENCH-0001', 'Pass', True, None)
+    text = time_calls(lambda: text_query('save_test_result', result_params, fetch=False), iterations)
+    prepared = time_calls(lambda: registry.execute('save_test_result', result_params), iterations)
+    report('save_test_result', text, prepared)
+
+    result_id = registry.execute('save_test_result', result_params).lastrowid
+    stage_params = (result_id, stage_id, 5.0, 1.0, 100.0, 'Pass', None)
+    text = time_calls(lambda: text_query('save_stage_result', stage_params, fetch=False), iterations)
+    prepared = time_calls(lambda: registry.execute('save_stage_result', stage_params), iterations)
+    report('save_stage_result', text, prepared)
+
+    conn.rollback()
+    registry.close()
+    text_cursor.close()
+    conn.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,12 @@ ROLE_LEVELS = {
     ROLE_TESTER: 1
 }
 
+# Storage backend: central MySQL server, or a local SQLite file for standalone stations
+BACKEND_MYSQL = "mysql"
+BACKEND_SQLITE = "sqlite"
+DB_BACKEND = BACKEND_MYSQL
+SQLITE_DB_PATH = os.path.join("data", "pcb_testing_station.db")
+
 # MySQL Database Configuration
 DB_HOST = "localhost"
 DB_USER = "root"
@@ -43,5 +49,62 @@ DB_PASSWORD = "root"
 DB_NAME = "pcb_testing"
 DB_PORT = 3306
 
+# Connection pool shared by all Database instances in the process
+DB_POOL_NAME = "pcb_testing_pool"
+DB_POOL_SIZE = 5
+# A thread's connection idle for longer than this is pinged before reuse
+DB_POOL_PING_SECONDS = 5
+
+# Optional read replica for reporting queries (None sends everything to DB_HOST)
+DB_REPLICA_HOST = None
+DB_REPLICA_PORT = 3306
+DB_REPLICA_USER = DB_USER
+DB_REPLICA_PASSWORD = DB_PASSWORD
+DB_REPLICA_POOL_SIZE = 3
+# Read from the primary while the replica is further behind than this
+DB_REPLICA_MAX_LAG_SECONDS = 30
+# How often a thread re-checks replica lag, and how long to avoid a failed replica
+DB_REPLICA_CHECK_SECONDS = 10
+DB_REPLICA_RETRY_SECONDS = 30
+
+# Write-behind persistence: test runs are journaled here and drained to MySQL
+SPOOL_DIR = os.path.join("data", "spool")
+SPOOL_BATCH_SIZE = 50
+SPOOL_RETRY_MIN_SECONDS = 1
+SPOOL_RETRY_MAX_SECONDS = 60
+
+# Retention purge: rows deleted per transaction, pause between batches, archive location
+RETENTION_BATCH_SIZE = 1000
+RETENTION_SLEEP_SECONDS = 0.2
+ARCHIVE_DIR = os.path.join("data", "archive")
+
+# Monthly result partitions created ahead of time by DatabaseUtilities.maintain_partitions
+PARTITION_MONTHS_AHEAD = 3
+
+# Cold archive: monthly .npz files for results older than COLD_ARCHIVE_DAYS
+COLD_ARCHIVE_DIR = os.path.join("data", "cold_archive")
+COLD_ARCHIVE_DAYS = 365
+COLD_ARCHIVE_CACHE_MONTHS = 12
+
+# Audit log appender: entries per INSERT, longest wait before writing, backlog cap
+AUDIT_BATCH_SIZE = 100
+AUDIT_FLUSH_SECONDS = 2.0
+AUDIT_MAX_PENDING = 10000
+
+# Serial reader: longest a single port read blocks, longest line kept without a newline
+SERIAL_READ_TIMEOUT_SECONDS = 0.05
+SERIAL_MAX_LINE_BYTES = 4096
+
+# Multi-jig stations: jig name -> COM port, each opened with the saved baud
+# rate/framing (empty uses the single saved port); measurements kept per jig
+SERIAL_JIGS = {}
+SERIAL_JIG_MAX_PENDING = 10000
+
+# Off (default): plain "<command>" lines; each bare ACK/NAK completes the oldest
+# command in flight, as existing jig firmware expects. Set True only for firmware
+# that accepts "<seq>:<command>" and replies "ACK <seq>" / "NAK <seq>", which
+# lets replies arrive out of order
+SERIAL_TAG_COMMANDS = False
+
 # Assets
 LOGO_PATH = resource_path("assets/logo.png")
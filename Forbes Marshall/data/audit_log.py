@@ -0,0 +1,200 @@
+"""
+Audit Log Appender
+Audit entries are queued in memory and written by a background thread in multi-row INSERTs
+"""
+import json
+import queue
+import time
+import threading
+import logging
+from datetime import datetime
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+from config.config import AUDIT_BATCH_SIZE, AUDIT_FLUSH_SECONDS, AUDIT_MAX_PENDING
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Row values in audit_log column order, as written by Database.insert_audit_entries
+AuditRow = Tuple[Optional[int], str, Optional[str], Optional[int], Optional[str], Optional[str], datetime]
+
+
+class AuditEntry(NamedTuple):
+    """One action waiting to be written"""
+    user_id: Optional[int]
+    action: str
+    entity_type: Optional[str]
+    entity_id: Optional[int]
+    old_values: Any
+    new_values: Any
+    timestamp: datetime
+
+
+# Queued to stop the worker after it has written everything before it
+_STOP = object()
+
+
+def changed_fields(old_values: Any, new_values: Any) -> Tuple[Any, Any]:
+    """
+    Reduce old/new values to the fields that differ
+
+    Only dictionaries are compared; anything else (a created or deleted
+    record with one side missing, or plain values) is kept as given.
+    """
+    if isinstance(old_values, dict) and isinstance(new_values, dict):
+        keys = [key for key in {**old_values, **new_values} if old_values.get(key) != new_values.get(key)]
+        old_changed = {key: old_values[key] for key in keys if key in old_values}
+        new_changed = {key: new_values[key] for key in keys if key in new_values}
+        return old_changed or None, new_changed or None
+    return old_values or None, new_values or None
+
+
+def to_row(entry: AuditEntry) -> AuditRow:
+    """Serialize an entry for insertion, storing only changed fields"""
+    old_values, new_values = changed_fields(entry.old_values, entry.new_values)
+    return (entry.user_id, entry.action, entry.entity_type, entry.entity_id,
+            json.dumps(old_values, default=str) if old_values else None,
+            json.dumps(new_values, default=str) if new_values else None,
+            entry.timestamp)
+
+
+class AuditAppender:
+    """
+    Background writer for audit entries
+
+    append() only copies the values onto a queue. The worker writes a batch
+    once it holds batch_size entries or its oldest entry is flush_interval
+    seconds old, and everything left on flush() and stop(). If a write
+    fails the batch is kept and retried after flush_interval; beyond
+    max_pending unwritten entries the oldest are dropped.
+    """
+
+    def __init__(self, db_factory: Callable[[], Any], batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_SECONDS, max_pending: int = AUDIT_MAX_PENDING) -> None:
+        """
+        Args:
+            db_factory: Creates the Database used by the worker thread
+            batch_size: Entries per INSERT and the size that triggers a write
+            flush_interval: Longest time an entry waits before being written
+            max_pending: Unwritten entries kept while the database is unavailable
+        """
+        self.db_factory = db_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.max_pending = max(self.batch_size, max_pending)
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._db: Any = None
+
+    def start(self) -> None:
+        """Start the worker thread"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+            self._thread.start()
+
+    def append(self, user_id: Optional[int], action: str, entity_type: Optional[str] = None,
+               entity_id: Optional[int] = None, old_values: Any = None, new_values: Any = None) -> None:
+        """Queue an audit entry; returns immediately"""
+        # Shallow copies so later changes by the caller do not leak into the entry
+        if isinstance(old_values, dict):
+            old_values = dict(old_values)
+        if isinstance(new_values, dict):
+            new_values = dict(new_values)
+        self._queue.put(AuditEntry(user_id, action, entity_type, entity_id,
+                                   old_values, new_values, datetime.now()))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything appended so far has been written (or the attempt failed)"""
+        self.start()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write what is queued and stop the worker"""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _write(self, batch: List[AuditEntry]) -> List[AuditEntry]:
+        """Write a batch; returns the entries still unwritten"""
+        if not batch:
+            return batch
+        try:
+            if self._db is None:
+                self._db = self.db_factory()
+            rows = [to_row(entry) for entry in batch]
+            for i in range(0, len(rows), self.batch_size):
+                self._db.insert_audit_entries(rows[i:i + self.batch_size])
+                # Written chunks must not be retried
+                batch = batch[self.batch_size:]
+            return batch
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} audit log entries: {e}")
+            try:
+                if self._db is not None:
+                    self._db.close()
+            except Exception:
+                pass
+            if len(batch) > self.max_pending:
+                logger.warning(f"Audit log backlog full, dropping {len(batch) - self.max_pending} oldest entries")
+                batch = batch[-self.max_pending:]
+            return batch
+
+    def _run(self) -> None:
+        batch: List[AuditEntry] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, AuditEntry):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Size or time threshold reached, or a flush/stop request
+            batch = self._write(batch)
+            if batch:
+                deadline = time.monotonic() + self.flush_interval
+            if isinstance(item, threading.Event):
+                item.set()
+            if item is _STOP:
+                if batch:
+                    logger.error(f"{len(batch)} audit log entries could not be written before shutdown")
+                if self._db is not None:
+                    self._db.close()
+                return
+
+
+_appender: Optional[AuditAppender] = None
+_appender_lock = threading.Lock()
+
+
+def get_appender(db_factory: Callable[[], Any]) -> AuditAppender:
+    """Return the process-wide appender, starting it on first use"""
+    global _appender
+    if _appender is None:
+        with _appender_lock:
+            if _appender is None:
+                _appender = AuditAppender(db_factory)
+                _appender.start()
+    return _appender
+
+
+def flush(timeout: float = 5.0) -> bool:
+    """Write pending entries now if the appender was started"""
+    return _appender.flush(timeout) if _appender is not None else True
+
+
+def shutdown(timeout: float = 5.0) -> None:
+    """Write pending entries and stop the appender if it was started"""
+    if _appender is not None:
+        _appender.stop(timeout)
@@ -0,0 +1,418 @@
+"""
+Cold Result Archive
+Old test results stored as one compressed NumPy (.npz) file per month with a JSON manifest
+"""
+import os
+import json
+import threading
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config.config import COLD_ARCHIVE_DIR, COLD_ARCHIVE_CACHE_MONTHS, RETENTION_BATCH_SIZE, RETENTION_SLEEP_SECONDS
+from data import partitions
+from data.retention import RetentionEngine
+from data.traceability import SERIAL_STRIP_CHARS, normalize_serial
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+DBRecord = Dict[str, Any]
+ColumnArrays = Dict[str, np.ndarray]
+
+# Column kinds: int (-1 for NULL), float (NaN for NULL), text ('' for NULL), time (NaT for NULL)
+RESULT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('id', 'int'), ('test_case_id', 'int'), ('user_id', 'int'), ('pcb_serial_number', 'text'),
+    ('status', 'text'), ('overall_pass', 'int'), ('start_time', 'time'), ('end_time', 'time'),
+    ('notes', 'text'), ('created_at', 'time'),
+)
+STAGE_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('id', 'int'), ('test_result_id', 'int'), ('stage_id', 'int'), ('stage_number', 'int'),
+    ('stage_name', 'text'), ('voltage_measured', 'float'), ('current_measured', 'float'),
+    ('resistance_measured', 'float'), ('status', 'text'), ('failure_reason', 'text'),
+    ('start_time', 'time'), ('end_time', 'time'), ('created_at', 'time'),
+)
+MEASUREMENT_COLUMNS = ('voltage_measured', 'current_measured', 'resistance_measured')
+
+_NULLS = {'int': -1, 'float': np.nan, 'text': '', 'time': None}
+_DTYPES = {'int': np.int64, 'float': np.float64, 'text': np.str_, 'time': 'datetime64[s]'}
+
+
+def _to_arrays(rows: Sequence[DBRecord], columns: Sequence[Tuple[str, str]]) -> ColumnArrays:
+    """Turn rows into one typed array per column"""
+    arrays: ColumnArrays = {}
+    for name, kind in columns:
+        null = _NULLS[kind]
+        values = [null if row.get(name) is None else row[name] for row in rows]
+        if kind == 'float':
+            values = [float(value) for value in values]
+        arrays[name] = np.array(values, dtype=_DTYPES[kind])
+    return arrays
+
+
+def _value(kind: str, value: Any) -> Any:
+    """Convert one array element back to what MySQL would return"""
+    if kind == 'int':
+        value = int(value)
+        return None if value == -1 else value
+    if kind == 'float':
+        return None if np.isnan(value) else float(value)
+    if kind == 'text':
+        return str(value) or None
+    return value.item()  # datetime64 -> datetime, NaT -> None
+
+
+def _to_rows(arrays: ColumnArrays, columns: Sequence[Tuple[str, str]], indices: Sequence[int]) -> List[DBRecord]:
+    """Materialize the rows at indices as dictionaries"""
+    return [{name: _value(kind, arrays[name][i]) for name, kind in columns} for i in indices]
+
+
+def _columns(data: ColumnArrays, prefix: str) -> ColumnArrays:
+    """One table's columns from a month file, without their prefix"""
+    return {name[len(prefix):]: array for name, array in data.items() if name.startswith(prefix)}
+
+
+def _month_key(month: date) -> str:
+    return f"{month:%Y-%m}"
+
+
+class ColdArchive:
+    """
+    Read and write the monthly archive files
+
+    Each month file holds the results of that month (by created_at) as
+    columns prefixed "results_" and their stage results as columns prefixed
+    "stages_", stage rows ordered by (test_result_id, created_at, id).
+    manifest.json records, per month, the file name, row counts and the
+    id and start_time ranges so queries only open the files they need.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, directory: str = COLD_ARCHIVE_DIR, cache_months: int = COLD_ARCHIVE_CACHE_MONTHS) -> None:
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, self.MANIFEST_FILE)
+        self.cache_months = max(1, cache_months)
+        self._cache: "OrderedDict[str, Tuple[float, ColumnArrays]]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # ============== MANIFEST ==============
+
+    def manifest(self) -> Dict[str, DBRecord]:
+        """Month ('YYYY-MM') -> file name, row counts, id range and start_time range"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['months']
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, months: Dict[str, DBRecord]) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'months': dict(sorted(months.items()))}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    # ============== WRITING ==============
+
+    def write_month(self, month: date, results: List[DBRecord], stage_results: List[DBRecord]) -> None:
+        """
+        Store a month of results, merging with what is already archived for it
+
+        Rows already in the file (same id) are replaced, so archiving the
+        same month twice does not duplicate anything.
+        """
+        key = _month_key(month)
+        entry = self.manifest().get(key)
+        if entry:
+            existing = self._load(entry['file'])
+            old_results = _to_rows(_columns(existing, 'results_'),
+                                   RESULT_COLUMNS, range(len(existing['results_id'])))
+            old_stages = _to_rows(_columns(existing, 'stages_'),
+                                  STAGE_COLUMNS, range(len(existing['stages_id'])))
+            results = list({row['id']: row for row in old_results + results}.values())
+            stage_results = list({row['id']: row for row in old_stages + stage_results}.values())
+
+        results.sort(key=lambda row: row['id'])
+        stage_results.sort(key=lambda row: (row['test_result_id'], row['created_at'] or datetime.min, row['id']))
+
+        arrays = {f"results_{name}": array for name, array in _to_arrays(results, RESULT_COLUMNS).items()}
+        arrays.update({f"stages_{name}": array for name, array in _to_arrays(stage_results, STAGE_COLUMNS).items()})
+
+        file_name = f"results_{key}.npz"
+        path = os.path.join(self.directory, file_name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        starts = [row['start_time'] for row in results if row['start_time']]
+        months = self.manifest()
+        months[key] = {
+            'file': file_name,
+            'results': len(results),
+            'stage_results': len(stage_results),
+            'min_id': results[0]['id'],
+            'max_id': results[-1]['id'],
+            'first_start': min(starts).isoformat() if starts else None,
+            'last_start': max(starts).isoformat() if starts else None,
+        }
+        self._write_manifest(months)
+        with self._lock:
+            self._cache.pop(file_name, None)
+
+    # ============== READING ==============
+
+    def _load(self, file_name: str) -> ColumnArrays:
+        """All columns of a month file, cached for the most recently used months"""
+        path = os.path.join(self.directory, file_name)
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._cache.get(file_name)
+            if cached and cached[0] == mtime:
+                self._cache.move_to_end(file_name)
+                return cached[1]
+
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        # Same normalization as the pcb_serial_normalized column in MySQL
+        serials = arrays['results_pcb_serial_number']
+        for char in SERIAL_STRIP_CHARS:
+            serials = np.char.replace(serials, char, '')
+        arrays['serial_normalized'] = np.char.upper(serials)
+
+        with self._lock:
+            self._cache[file_name] = (mtime, arrays)
+            while len(self._cache) > self.cache_months:
+                self._cache.popitem(last=False)
+        return arrays
+
+    def _months_for(self, start_date: Optional[datetime], end_date: Optional[datetime]) -> List[DBRecord]:
+        """Manifest entries whose start_time range overlaps [start_date, end_date), newest first"""
+        entries = []
+        for entry in self.manifest().values():
+            if start_date and entry['last_start'] and datetime.fromisoformat(entry['last_start']) < start_date:
+                continue
+            if end_date and entry['first_start'] and datetime.fromisoformat(entry['first_start']) >= end_date:
+                continue
+            entries.append(entry)
+        entries.sort(key=lambda entry: entry['max_id'], reverse=True)
+        return entries
+
+    @staticmethod
+    def _result_mask(data: ColumnArrays, status: Optional[str], user_id: Optional[int],
+                     start_date: Optional[datetime], end_date: Optional[datetime],
+                     serial_prefix: Optional[str], serial: Optional[str]) -> np.ndarray:
+        """Boolean mask of the results matching the filters (same meaning as Database filters)"""
+        mask = np.ones(len(data['results_id']), dtype=bool)
+        if status:
+            mask &= data['results_status'] == status
+        if user_id is not None:
+            mask &= data['results_user_id'] == user_id
+        if start_date:
+            mask &= data['results_start_time'] >= np.datetime64(start_date, 's')
+        if end_date:
+            mask &= data['results_start_time'] < np.datetime64(end_date, 's')
+        if serial_prefix:
+            mask &= np.char.startswith(data['serial_normalized'], normalize_serial(serial_prefix))
+        if serial is not None:
+            mask &= data['serial_normalized'] == normalize_serial(serial)
+        return mask
+
+    @staticmethod
+    def _first_stage_rows(data: ColumnArrays, result_ids: np.ndarray) -> np.ndarray:
+        """Index of each result's first stage row, or -1 if it has none"""
+        stage_result_ids = data['stages_test_result_id']
+        if not len(stage_result_ids):
+            return np.full(len(result_ids), -1)
+        unique_ids, first = np.unique(stage_result_ids, return_index=True)
+        pos = np.minimum(np.searchsorted(unique_ids, result_ids), len(unique_ids) - 1)
+        return np.where(unique_ids[pos] == result_ids, first[pos], -1)
+
+    def query_results(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                      start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                      serial_prefix: Optional[str] = None, serial: Optional[str] = None,
+                      limit: Optional[int] = None,
+                      after: Optional[Tuple[datetime, int]] = None) -> List[DBRecord]:
+        """
+        Archived results matching the filters, newest first
+
+        Rows have the same columns as Database.query_test_results, including
+        the first stage's measurements.
+
+        Args:
+            status, user_id, start_date, end_date, serial_prefix: As for query_test_results
+            serial: Only this PCB serial number (case and spaces are ignored)
+            limit: Maximum number of rows (None for all)
+            after: (start_time, id) keyset cursor; only rows ordered after it
+        """
+        rows: List[DBRecord] = []
+        for entry in self._months_for(start_date, end_date):
+            data = self._load(entry['file'])
+            mask = self._result_mask(data, status, user_id, start_date, end_date, serial_prefix, serial)
+            if after:
+                after_time = np.datetime64(after[0], 's')
+                starts = data['results_start_time']
+                mask &= (starts < after_time) | ((starts == after_time) & (data['results_id'] < after[1]))
+
+            indices = np.flatnonzero(mask)
+            if not len(indices):
+                continue
+            # Newest first within the month (rows without a start time last),
+            # keeping only what the page can use
+            starts = data['results_start_time'][indices]
+            keys = np.where(np.isnat(starts), np.iinfo(np.int64).min + 1, starts.astype(np.int64))
+            order = np.lexsort((-data['results_id'][indices], -keys))
+            indices = indices[order][:limit]
+
+            month_rows = _to_rows(_columns(data, 'results_'),
+                                  RESULT_COLUMNS, indices)
+            first = self._first_stage_rows(data, data['results_id'][indices])
+            for row, stage_index in zip(month_rows, first):
+                for column in MEASUREMENT_COLUMNS:
+                    row[column] = None if stage_index < 0 else _value('float', data[f"stages_{column}"][stage_index])
+            rows.extend(month_rows)
+
+        rows.sort(key=lambda row: (row['start_time'] or datetime.min, row['id']), reverse=True)
+        return rows[:limit]
+
+    def count_results(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                      start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                      serial_prefix: Optional[str] = None) -> DBRecord:
+        """Total/passed/failed counts of archived results matching the filters"""
+        counts = {'total': 0, 'passed': 0, 'failed': 0}
+        for entry in self._months_for(start_date, end_date):
+            data = self._load(entry['file'])
+            mask = self._result_mask(data, status, user_id, start_date, end_date, serial_prefix, None)
+            counts['total'] += int(mask.sum())
+            counts['passed'] += int((mask & (data['results_status'] == 'Pass')).sum())
+            counts['failed'] += int((mask & (data['results_status'] == 'Fail')).sum())
+        return counts
+
+    def get_result_stage_numbers(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                                 start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                                 serial_prefix: Optional[str] = None) -> List[int]:
+        """Distinct stage numbers recorded for the archived results matching the filters"""
+        numbers = set()
+        for entry in self._months_for(start_date, end_date):
+            data = self._load(entry['file'])
+            mask = self._result_mask(data, status, user_id, start_date, end_date, serial_prefix, None)
+            stage_mask = np.isin(data['stages_test_result_id'], data['results_id'][mask])
+            # -1 marks stage results whose stage no longer existed when archived
+            numbers.update(int(n) for n in np.unique(data['stages_stage_number'][stage_mask]) if n >= 0)
+        return sorted(numbers)
+
+    def _entry_for_result(self, test_result_id: int) -> Optional[DBRecord]:
+        for entry in self.manifest().values():
+            if entry['min_id'] <= test_result_id <= entry['max_id']:
+                return entry
+        return None
+
+    def get_result(self, test_result_id: int) -> Optional[DBRecord]:
+        """One archived test result, or None if it is not in the archive"""
+        entry = self._entry_for_result(test_result_id)
+        if not entry:
+            return None
+        data = self._load(entry['file'])
+        indices = np.flatnonzero(data['results_id'] == test_result_id)
+        if not len(indices):
+            return None
+        return _to_rows(_columns(data, 'results_'), RESULT_COLUMNS, indices)[0]
+
+    def get_stage_results(self, test_result_id: int) -> List[DBRecord]:
+        """Archived stage results of a test result, in run order"""
+        entry = self._entry_for_result(test_result_id)
+        if not entry:
+            return []
+        data = self._load(entry['file'])
+        indices = np.flatnonzero(data['stages_test_result_id'] == test_result_id)
+        return _to_rows(_columns(data, 'stages_'), STAGE_COLUMNS, indices)
+
+
+def _has_partition(conn: Any, month: date) -> bool:
+    """Whether test_results has a partition of its own for the month"""
+    cursor = conn.cursor(buffered=True)
+    try:
+        return partitions.partition_name(month) in partitions.list_partitions(cursor, 'test_results')
+    finally:
+        cursor.close()
+
+
+def archive_results(conn: Any, days: int, archive: Optional[ColdArchive] = None,
+                    batch_size: int = RETENTION_BATCH_SIZE,
+                    sleep_seconds: float = RETENTION_SLEEP_SECONDS) -> int:
+    """
+    Move whole months of results created more than days ago to the cold archive
+
+    Months are processed oldest first. Each month is written (merged) to its
+    file before anything is deleted; a month is then removed by dropping its
+    partition when the table is partitioned, or in batches otherwise.
+
+    Args:
+        conn: Open MySQL connection
+        days: Results older than this many days are archived
+        archive: Target archive (default: COLD_ARCHIVE_DIR)
+        batch_size: Test results per delete transaction when not partitioned
+        sleep_seconds: Pause between delete batches
+
+    Returns:
+        int: Number of test results moved
+    """
+    archive = archive or ColdArchive()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    moved = 0
+    try:
+        cursor.execute(
+            "SELECT DATE_SUB(NOW(), INTERVAL %s DAY) AS cutoff, MIN(created_at) AS oldest FROM test_results",
+            (days,)
+        )
+        row = cursor.fetchone()
+        if not row or not row['oldest']:
+            return 0
+
+        month = partitions.month_start(row['oldest'])
+        while True:
+            start = datetime.combine(month, datetime.min.time())
+            end = datetime.combine(partitions.add_months(month, 1), datetime.min.time())
+            if end > row['cutoff']:
+                break
+
+            cursor.execute(
+                "SELECT * FROM test_results WHERE created_at >= %s AND created_at < %s ORDER BY id",
+                (start, end)
+            )
+            results = cursor.fetchall()
+            if results:
+                cursor.execute(
+                    """SELECT tsr.*, ts.stage_number, ts.stage_name
+                       FROM test_stage_results tsr
+                       JOIN test_results tr ON tr.id = tsr.test_result_id
+                       LEFT JOIN test_stages ts ON ts.id = tsr.stage_id
+                       WHERE tr.created_at >= %s AND tr.created_at < %s""",
+                    (start, end)
+                )
+                archive.write_month(month, results, cursor.fetchall())
+
+                if _has_partition(conn, month):
+                    partitions.drop_expired_results(conn, end)
+                    # Stage results are partitioned by their own created_at: those of
+                    # runs that crossed into the next month are still in MySQL
+                    RetentionEngine(conn, batch_size, sleep_seconds).delete_stage_results(
+                        [result['id'] for result in results]
+                    )
+                else:
+                    RetentionEngine(conn, batch_size, sleep_seconds).delete_test_results(
+                        [result['id'] for result in results]
+                    )
+                moved += len(results)
+                logger.info(f"Archived {len(results)} test results from {_month_key(month)}")
+
+            month = partitions.add_months(month, 1)
+        return moved
+    finally:
+        cursor.close()
@@ -0,0 +1,260 @@
+"""
+Connection Pool - MySQL Implementation
+Process-wide pooled connections shared by every Database instance, with
+reporting reads optionally routed to a replica
+"""
+import time
+import threading
+import logging
+from typing import Any, Dict, Optional
+from mysql.connector import pooling, Error
+from config.config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT, DB_POOL_NAME, DB_POOL_SIZE
+from config.config import DB_POOL_PING_SECONDS
+from config.config import (DB_REPLICA_HOST, DB_REPLICA_PORT, DB_REPLICA_USER, DB_REPLICA_PASSWORD,
+                           DB_REPLICA_POOL_SIZE, DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_CHECK_SECONDS,
+                           DB_REPLICA_RETRY_SECONDS)
+from data.prepared_statements import StatementRegistry
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+_pool: Optional[pooling.MySQLConnectionPool] = None
+_pool_lock = threading.Lock()
+
+# Each thread checks out one pooled connection and keeps it until released,
+# so all views running on the Tk main thread share a single connection.
+# It runs at READ COMMITTED: a thread that only reads may never commit, and
+# under REPEATABLE READ its first SELECT would fix the data it sees for good.
+_local = threading.local()
+
+_replica_pool: Optional[pooling.MySQLConnectionPool] = None
+# While time.monotonic() is below this, reads skip the replica after a failure
+_replica_down_until = 0.0
+
+
+def get_pool() -> pooling.MySQLConnectionPool:
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                try:
+                    _pool = pooling.MySQLConnectionPool(
+                        pool_name=DB_POOL_NAME,
+                        pool_size=DB_POOL_SIZE,
+                        host=DB_HOST,
+                        user=DB_USER,
+                        password=DB_PASSWORD,
+                        database=DB_NAME,
+                        port=DB_PORT,
+                        autocommit=False
+                    )
+                    logger.info(f"Connection pool '{DB_POOL_NAME}' created (size={DB_POOL_SIZE})")
+                except Error as e:
+                    logger.error(f"Error creating connection pool: {e}")
+                    raise
+    return _pool
+
+
+def _is_alive(conn: Any) -> bool:
+    try:
+        conn.ping(reconnect=False)
+        return True
+    except Error as e:
+        logger.warning(f"Pooled connection lost, checking out a new one: {e}")
+        return False
+
+
+def get_connection() -> Any:
+    """
+    Return the pooled connection checked out by the calling thread
+
+    A connection idle for more than DB_POOL_PING_SECONDS is pinged first; if
+    the server has closed it (wait_timeout, restart) it is released and a
+    fresh one checked out, so the thread does not keep failing until restart.
+    """
+    conn = getattr(_local, 'conn', None)
+    now = time.monotonic()
+    if conn is not None and now - _local.used > DB_POOL_PING_SECONDS and not _is_alive(conn):
+        release_connection()
+        conn = None
+    if conn is None:
+        conn = get_pool().get_connection()
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        _local.conn = conn
+        _local.cursor = cursor
+        _local.statements = StatementRegistry(conn)
+    _local.used = now
+    return conn
+
+
+def get_cursor() -> Any:
+    """Return the dictionary cursor bound to the calling thread's connection"""
+    get_connection()
+    return _local.cursor
+
+
+def get_statements() -> StatementRegistry:
+    """Return the prepared statements bound to the calling thread's connection"""
+    get_connection()
+    return _local.statements
+
+
+def _get_replica_pool() -> pooling.MySQLConnectionPool:
+    """Return the replica connection pool, creating it on first use"""
+    global _replica_pool
+    if _replica_pool is None:
+        with _pool_lock:
+            if _replica_pool is None:
+                _replica_pool = pooling.MySQLConnectionPool(
+                    pool_name=f"{DB_POOL_NAME}_replica",
+                    pool_size=DB_REPLICA_POOL_SIZE,
+                    host=DB_REPLICA_HOST,
+                    user=DB_REPLICA_USER,
+                    password=DB_REPLICA_PASSWORD,
+                    database=DB_NAME,
+                    port=DB_REPLICA_PORT,
+                    # Every read sees the latest replicated data instead of an old snapshot
+                    autocommit=True
+                )
+                logger.info(f"Replica connection pool created for {DB_REPLICA_HOST}:{DB_REPLICA_PORT}")
+    return _replica_pool
+
+
+def replica_lag(conn: Any) -> Optional[float]:
+    """
+    Seconds the server behind conn is behind its source
+
+    Returns:
+        float: Replication delay; 0.0 for a server that is not a replica
+               (e.g. a second standalone instance used for testing), or
+               None if replication is configured but not running
+    """
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            # MySQL before 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not row:
+        return 0.0
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+def _open_replica() -> Optional[Any]:
+    """Check out a replica connection if one is configured, reachable and recent enough"""
+    global _replica_down_until
+    if not DB_REPLICA_HOST or time.monotonic() < _replica_down_until:
+        return None
+    conn = None
+    try:
+        conn = _get_replica_pool().get_connection()
+        lag = replica_lag(conn)
+        if lag is not None and lag <= DB_REPLICA_MAX_LAG_SECONDS:
+            return conn
+        logger.warning(f"Replica is stale (lag: {lag}s), reading from the primary")
+    except Error as e:
+        logger.warning(f"Replica unavailable, reading from the primary: {e}")
+    if conn is not None:
+        try:
+            conn.close()
+        except Error:
+            pass
+    _replica_down_until = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+    return None
+
+
+def get_read_connection() -> Any:
+    """Check out a connection for a reporting query: the replica when usable, else the primary (caller closes)"""
+    return _open_replica() or get_pool().get_connection()
+
+
+def get_read_cursor() -> Any:
+    """
+    Return a dictionary cursor for reporting queries on the calling thread
+
+    Uses a replica connection kept by the thread and re-checked every
+    DB_REPLICA_CHECK_SECONDS; falls back to the thread's primary cursor
+    when no replica is configured, reachable or recent enough.
+    """
+    if not DB_REPLICA_HOST:
+        return get_cursor()
+    read_conn = getattr(_local, 'read_conn', None)
+    if read_conn is not None and time.monotonic() - _local.read_checked < DB_REPLICA_CHECK_SECONDS:
+        return _local.read_cursor
+
+    _release_read_connection()
+    read_conn = _open_replica()
+    if read_conn is None:
+        return get_cursor()
+    _local.read_conn = read_conn
+    _local.read_cursor = read_conn.cursor(dictionary=True, buffered=True)
+    _local.read_checked = time.monotonic()
+    return _local.read_cursor
+
+
+def replica_status() -> Dict[str, Any]:
+    """
+    Report whether reporting reads can use the replica
+
+    Returns:
+        dict: configured, available, lag_seconds (None if unknown) and
+              stale (lag above DB_REPLICA_MAX_LAG_SECONDS or unknown)
+    """
+    status: Dict[str, Any] = {'configured': bool(DB_REPLICA_HOST), 'available': False,
+                              'lag_seconds': None, 'stale': True}
+    if not DB_REPLICA_HOST:
+        return status
+    try:
+        conn = _get_replica_pool().get_connection()
+        try:
+            status['lag_seconds'] = replica_lag(conn)
+        finally:
+            conn.close()
+        status['available'] = True
+        status['stale'] = status['lag_seconds'] is None or status['lag_seconds'] > DB_REPLICA_MAX_LAG_SECONDS
+    except Error as e:
+        logger.warning(f"Replica status check failed: {e}")
+    return status
+
+
+def _release_read_connection() -> None:
+    """Return the calling thread's replica connection to its pool"""
+    cursor = getattr(_local, 'read_cursor', None)
+    conn = getattr(_local, 'read_conn', None)
+    _local.read_cursor = None
+    _local.read_conn = None
+    try:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+    except Error as e:
+        logger.warning(f"Error releasing replica connection: {e}")
+
+
+def release_connection() -> None:
+    """Return the calling thread's connections to their pools"""
+    _release_read_connection()
+    cursor = getattr(_local, 'cursor', None)
+    conn = getattr(_local, 'conn', None)
+    statements = getattr(_local, 'statements', None)
+    _local.cursor = None
+    _local.conn = None
+    _local.statements = None
+    # Close each part separately so that even a dead connection is handed back
+    # to the pool (closing a pooled connection returns it; the pool reconnects
+    # it on the next checkout)
+    for resource in (statements, cursor, conn):
+        if resource is None:
+            continue
+        try:
+            resource.close()
+        except Error as e:
+            logger.warning(f"Error releasing pooled connection: {e}")
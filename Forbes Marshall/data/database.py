@@ -3,13 +3,26 @@ Database Management - MySQL Implementation
 SQL Database for PCB Testing Automation System
 """
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 import bcrypt
 import logging
+import os
 from config.config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT, ROLE_ADMIN, ROLE_MANAGER, ROLE_TESTER
-from datetime import datetime
-import json
-from typing import List, Dict, Any, Optional
+from config.config import DB_BACKEND, BACKEND_SQLITE
+from data import connection_pool
+from data.migrations import run_migrations
+from data.prepared_statements import StatementRegistry
+from data import statistics
+from data import rollups
+from data import test_plan
+from data import traceability
+from data import audit_log
+from data.test_plan import TestPlan
+from data.export import ExportEngine, FORMAT_CSV
+from utils import identity_cache
+from datetime import date, datetime, timedelta
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
@@ -17,232 +30,113 @@ logger = logging.getLogger(__name__)
 # Type alias for database records
 DBRecord = Dict[str, Any]
 
+# Keyset pagination cursor for test results: (start_time, id) of the last row seen
+ResultsCursor = Tuple[datetime, int]
+
+# Schema bootstrap runs once per process, not once per Database instance
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+# Test results per round-trip when exporting with stage measurements
+EXPORT_BATCH_SIZE = 500
+
+# start_time comes from the station clock and created_at from the server's, so
+# a created_at bound derived from start_time allows this much clock skew
+CREATED_AT_SKEW = timedelta(days=1)
+
 class Database:
+    def __new__(cls) -> "Database":
+        # Every Database() in the process uses the configured storage backend
+        if cls is Database and DB_BACKEND == BACKEND_SQLITE:
+            from data.sqlite_database import SQLiteDatabase
+            cls = SQLiteDatabase
+        return super().__new__(cls)
+    
     def __init__(self) -> None:
-        self.conn: Any = None
-        self.cursor: Any = None
         self.init_database()
     
+    @property
+    def conn(self) -> Any:
+        """Pooled connection checked out by the calling thread"""
+        return connection_pool.get_connection()
+    
+    @property
+    def statements(self) -> StatementRegistry:
+        """Prepared statements for the hot calls on the shared connection"""
+        return connection_pool.get_statements()
+    
+    @property
+    def cursor(self) -> Any:
+        """Dictionary cursor bound to the calling thread's pooled connection"""
+        return connection_pool.get_cursor()
+    
     def connect(self) -> None:
         """Establish database connection"""
         try:
-            self.conn = mysql.connector.connect(
-                host=DB_HOST,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                database=DB_NAME,
-                port=DB_PORT,
-                autocommit=False
-            )
-            self.cursor = self.conn.cursor(dictionary=True)
+            connection_pool.get_connection()
         except Error as e:
             logger.error(f"Error connecting to MySQL: {e}")
             raise
     
     def close(self) -> None:
-        """Close database connection"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
+        """Return this thread's connection to the pool"""
+        connection_pool.release_connection()
+    
+    @property
+    def read_cursor(self) -> Any:
+        """Dictionary cursor for reporting queries (replica when configured, else the primary)"""
+        return connection_pool.get_read_cursor()
+    
+    def _open_export_connection(self) -> Any:
+        """Connection used only for one streaming export (replica when usable); the caller closes it"""
+        return connection_pool.get_read_connection()
     
     def init_database(self) -> None:
-        """Initialize database tables and default users"""
-        try:
-            # First, connect to MySQL server without database to create the database if needed
-            conn_temp = mysql.connector.connect(
-                host=DB_HOST,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                port=DB_PORT
-            )
-            cursor_temp = conn_temp.cursor()
-            
-            # Create database if it doesn't exist
-            cursor_temp.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
-            cursor_temp.close()
-            conn_temp.close()
-            
-            # Now connect to the specific database
-            self.connect()
-            
-            # Enable foreign key support
-            self.cursor.execute("SET FOREIGN_KEY_CHECKS=1")
-            
-            # Users table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    username VARCHAR(255) UNIQUE NOT NULL,
-                    password_hash VARCHAR(255) NOT NULL,
-                    role ENUM('Admin', 'Manager', 'Tester') NOT NULL,
-                    email VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1,
-                    INDEX idx_username (username),
-                    INDEX idx_role (role)
-                )
-            ''')
-            
-            # Test cases table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS test_cases (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    voltage_min DECIMAL(10, 2) NOT NULL,
-                    voltage_max DECIMAL(10, 2) NOT NULL,
-                    current_min DECIMAL(10, 2) NOT NULL,
-                    current_max DECIMAL(10, 2) NOT NULL,
-                    resistance_min DECIMAL(10, 2) NOT NULL,
-                    resistance_max DECIMAL(10, 2) NOT NULL,
-                    created_by INT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (created_by) REFERENCES users(id),
-                    INDEX idx_created_by (created_by)
-                )
-            ''')
-            
-            # Test stages table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS test_stages (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    test_case_id INT NOT NULL,
-                    stage_number INT NOT NULL,
-                    stage_name VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    voltage_min DECIMAL(10, 2),
-                    voltage_max DECIMAL(10, 2),
-                    current_min DECIMAL(10, 2),
-                    current_max DECIMAL(10, 2),
-                    resistance_min DECIMAL(10, 2),
-                    resistance_max DECIMAL(10, 2),
-                    duration_seconds INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (test_case_id) REFERENCES test_cases(id) ON DELETE CASCADE,
-                    UNIQUE KEY unique_stage (test_case_id, stage_number),
-                    INDEX idx_test_case_id (test_case_id)
-                )
-            ''')
-            
-            # Test results table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS test_results (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    test_case_id INT NOT NULL,
-                    user_id INT NOT NULL,
-                    pcb_serial_number VARCHAR(255),
-                    status ENUM('Pass', 'Fail', 'In Progress') NOT NULL,
-                    overall_pass BOOLEAN,
-                    start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    end_time TIMESTAMP NULL,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (test_case_id) REFERENCES test_cases(id),
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    INDEX idx_user_id (user_id),
-                    INDEX idx_test_case_id (test_case_id),
-                    INDEX idx_start_time (start_time)
-                )
-            ''')
-            
-            # Test stage results table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS test_stage_results (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    test_result_id INT NOT NULL,
-                    stage_id INT NOT NULL,
-                    voltage_measured DECIMAL(10, 2),
-                    current_measured DECIMAL(10, 2),
-                    resistance_measured DECIMAL(10, 2),
-                    status ENUM('Pass', 'Fail', 'Not Run') NOT NULL,
-                    failure_reason TEXT,
-                    start_time TIMESTAMP NULL,
-                    end_time TIMESTAMP NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (test_result_id) REFERENCES test_results(id) ON DELETE CASCADE,
-                    FOREIGN KEY (stage_id) REFERENCES test_stages(id),
-                    INDEX idx_test_result_id (test_result_id)
-                )
-            ''')
-            
-            # Jig diagrams table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS jig_diagrams (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    test_case_id INT,
-                    diagram_name VARCHAR(255) NOT NULL,
-                    file_path VARCHAR(500) NOT NULL,
-                    description TEXT,
-                    uploaded_by INT NOT NULL,
-                    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (test_case_id) REFERENCES test_cases(id) ON DELETE SET NULL,
-                    FOREIGN KEY (uploaded_by) REFERENCES users(id),
-                    INDEX idx_test_case_id (test_case_id)
-                )
-            ''')
-            
-            # Communication configuration table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS communication_config (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    config_name VARCHAR(255) NOT NULL,
-                    com_port VARCHAR(50),
-                    baud_rate INT DEFAULT 9600,
-                    data_bits INT DEFAULT 8,
-                    stop_bits INT DEFAULT 1,
-                    parity VARCHAR(10) DEFAULT 'None',
-                    timeout_seconds INT DEFAULT 5,
-                    created_by INT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (created_by) REFERENCES users(id),
-                    INDEX idx_created_by (created_by)
-                )
-            ''')
-            
-            # Test statistics table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS test_statistics (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    test_case_id INT NOT NULL,
-                    total_tests INT DEFAULT 0,
-                    passed_tests INT DEFAULT 0,
-                    failed_tests INT DEFAULT 0,
-                    pass_rate DECIMAL(5, 2) DEFAULT 0.0,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (test_case_id) REFERENCES test_cases(id) ON DELETE CASCADE,
-                    UNIQUE KEY unique_test_case (test_case_id),
-                    INDEX idx_test_case_id (test_case_id)
-                )
-            ''')
-            
-            # Audit log table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_log (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT,
-                    action VARCHAR(255) NOT NULL,
-                    entity_type VARCHAR(255),
-                    entity_id INT,
-                    old_values JSON,
-                    new_values JSON,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    INDEX idx_user_id (user_id),
-                    INDEX idx_timestamp (timestamp)
-                )
-            ''')
+        """Initialize database tables and default users (once per process)"""
+        global _schema_ready
+        if _schema_ready:
+            return
+        
+        with _schema_lock:
+            if _schema_ready:
+                return
+            self._bootstrap_schema()
+            _schema_ready = True
+    
+    def _bootstrap_schema(self) -> None:
+        """Create the database if needed, apply pending migrations and default users"""
+        try:
+            try:
+                connection_pool.get_pool()
+            except Error as e:
+                if e.errno != errorcode.ER_BAD_DB_ERROR:
+                    raise
+                self._create_database()
+                connection_pool.get_pool()
             
-            self.conn.commit()
+            version = run_migrations(self.conn)
+            logger.info(f"Database schema version: {version}")
             self._create_default_users()
             
         except Error as e:
             logger.error(f"Error initializing database: {e}")
             raise
     
+    def _create_database(self) -> None:
+        """Create the application database on a fresh MySQL server"""
+        # Connect to MySQL server without database to create it
+        conn_temp = mysql.connector.connect(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=DB_PORT
+        )
+        cursor_temp = conn_temp.cursor()
+        cursor_temp.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
+        cursor_temp.close()
+        conn_temp.close()
+        logger.info(f"Created database {DB_NAME}")
+    
     def _create_default_users(self) -> None:
         """Create default users if they don't exist"""
         default_users: List[tuple] = [
@@ -273,7 +167,10 @@ class Database:
                 (username, password_hash, role)
             )
             self.conn.commit()
-            return self.cursor.lastrowid
+            user_id = self.cursor.lastrowid
+            identity_cache.invalidate(username)
+            identity_cache.remember(username, user_id)
+            return user_id
         except Exception as e:
             self.conn.rollback()
             logger.error(f"Error creating user: {e}")
@@ -293,11 +190,17 @@ class Database:
             return None
     
     def get_user_id(self, username: str) -> Optional[int]:
-        """Get user ID by username"""
+        """Get user ID by username, from the identity cache when possible"""
+        cached: Optional[int] = identity_cache.get_user_id(username)
+        if cached is not None:
+            return cached
         try:
-            self.cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            result: Optional[DBRecord] = self.cursor.fetchone()
-            return int(result['id']) if result else None
+            result: Optional[DBRecord] = self.statements.fetch_one('get_user_id', (username,))
+            if not result:
+                return None
+            user_id = int(result['id'])
+            identity_cache.remember(username, user_id)
+            return user_id
         except Exception as e:
             logger.error(f"Error getting user ID: {e}")
             return None
@@ -354,11 +257,25 @@ class Database:
 
             # First, delete test stage results that reference test results related to this test case
             self.cursor.execute("""
-                DELETE tsr FROM test_stage_results tsr
-                INNER JOIN test_results tr ON tsr.test_result_id = tr.id
-                WHERE tr.test_case_id = %s
+                DELETE FROM test_stage_results
+                WHERE test_result_id IN (SELECT id FROM test_results WHERE test_case_id = %s)
             """, (test_case_id,))
 
+            # Take the results being deleted out of the per-user and global counters
+            self.cursor.execute("""
+                SELECT user_id,
+                       COUNT(*) AS total,
+                       SUM(CASE WHEN overall_pass = 1 THEN 1 ELSE 0 END) AS passed,
+                       SUM(CASE WHEN overall_pass = 0 THEN 1 ELSE 0 END) AS failed
+                FROM test_results WHERE test_case_id = %s
+                GROUP BY user_id
+            """, (test_case_id,))
+            for row in self.cursor.fetchall():
+                statistics.apply_result_delta(
+                    self.cursor, test_case_id, row['user_id'],
+                    -int(row['total']), -int(row['passed'] or 0), -int(row['failed'] or 0)
+                )
+
             # Then delete test results that reference this test case
             self.cursor.execute("DELETE FROM test_results WHERE test_case_id = %s", (test_case_id,))
 
@@ -370,11 +287,13 @@ class Database:
 
             # Delete test statistics that reference this test case
             self.cursor.execute("DELETE FROM test_statistics WHERE test_case_id = %s", (test_case_id,))
+            self.cursor.execute("DELETE FROM daily_rollups WHERE test_case_id = %s", (test_case_id,))
 
             # Finally, delete the test case itself
             self.cursor.execute("DELETE FROM test_cases WHERE id = %s", (test_case_id,))
 
             self.conn.commit()
+            test_plan.invalidate(test_case_id)
             logger.info(f"Successfully deleted test case {test_case_id} and all related records")
             return True
         except Exception as e:
@@ -453,6 +372,7 @@ class Database:
                  current_min, current_max, resistance_min, resistance_max)
             )
             self.conn.commit()
+            test_plan.invalidate(test_case_id)
             return self.cursor.lastrowid
         except Exception as e:
             self.conn.rollback()
@@ -461,15 +381,50 @@ class Database:
     
     def get_test_stages(self, test_case_id: int) -> List[DBRecord]:
         """Get all stages for a test case"""
+        try:
+            return self.statements.fetch_all('get_test_stages', (test_case_id,))
+        except Exception as e:
+            logger.error(f"Error getting test stages: {e}")
+            return []
+    
+    def get_test_plan(self, test_case_id: int) -> Optional[TestPlan]:
+        """Get the compiled, cached plan (test case limits and stages) for a test case"""
+        try:
+            return test_plan.load_plan(self.cursor, test_case_id)
+        except Exception as e:
+            # Keep testing on the last known limits while the database is unreachable
+            plan = test_plan.cached_plan(test_case_id)
+            if plan:
+                logger.warning(f"Using cached test plan for test case {test_case_id}: {e}")
+            else:
+                logger.error(f"Error loading test plan: {e}")
+            return plan
+    
+    def get_or_create_default_stage(self, test_case_id: int) -> Optional[int]:
+        """Get the first stage of a test case, creating a default stage if it has none"""
         try:
             self.cursor.execute(
-                "SELECT * FROM test_stages WHERE test_case_id = %s ORDER BY stage_number", 
+                "SELECT id FROM test_stages WHERE test_case_id = %s ORDER BY stage_number LIMIT 1",
                 (test_case_id,)
             )
-            return self.cursor.fetchall()
+            stage = self.cursor.fetchone()
+            if stage:
+                return int(stage['id'])
+            
+            logger.info(f"No stage found for test case {test_case_id}, creating default stage")
+            self.cursor.execute(
+                """INSERT INTO test_stages (test_case_id, stage_number, stage_name, description,
+                   voltage_min, voltage_max, current_min, current_max, resistance_min, resistance_max)
+                   VALUES (%s, 1, 'Default Stage', 'Auto-created stage for single PCB test',
+                   0, 999, 0, 999, 0, 9999)""",
+                (test_case_id,)
+            )
+            self.conn.commit()
+            return self.cursor.lastrowid
         except Exception as e:
-            logger.error(f"Error getting test stages: {e}")
-            return []
+            self.conn.rollback()
+            logger.error(f"Error getting default stage: {e}")
+            return None
     
     def get_stage_by_id(self, stage_id):
         """Get stage by ID"""
@@ -484,13 +439,13 @@ class Database:
                         overall_pass=None, notes=None):
         """Save a test result"""
         try:
-            self.cursor.execute(
-                """INSERT INTO test_results (test_case_id, user_id, pcb_serial_number, status, overall_pass, notes) 
-                   VALUES (%s, %s, %s, %s, %s, %s)""",
-                (test_case_id, user_id, pcb_serial_number, status, overall_pass, notes)
-            )
+            result_id = self.statements.execute(
+                'save_test_result', (test_case_id, user_id, pcb_serial_number, status, overall_pass, notes)
+            ).lastrowid
+            statistics.record_result(self.cursor, test_case_id, user_id, overall_pass)
+            rollups.record_test_run(self.cursor, result_id)
             self.conn.commit()
-            return self.cursor.lastrowid
+            return result_id
         except Exception as e:
             self.conn.rollback()
             logger.error(f"Error saving test result: {e}")
@@ -499,10 +454,25 @@ class Database:
     def update_test_result_status(self, result_id, status, overall_pass=None):
         """Update test result status"""
         try:
+            self.cursor.execute(
+                """SELECT test_case_id, user_id, overall_pass, DATE(start_time) AS day
+                   FROM test_results WHERE id = %s FOR UPDATE""",
+                (result_id,)
+            )
+            previous = self.cursor.fetchone()
             self.cursor.execute(
                 "UPDATE test_results SET status = %s, overall_pass = %s, end_time = NOW() WHERE id = %s",
                 (status, overall_pass, result_id)
             )
+            if previous:
+                old_pass = None if previous['overall_pass'] is None else bool(previous['overall_pass'])
+                new_pass = None if overall_pass is None else bool(overall_pass)
+                statistics.record_outcome_change(
+                    self.cursor, previous['test_case_id'], previous['user_id'], old_pass, new_pass
+                )
+                rollups.record_outcome_change(
+                    self.cursor, previous['day'], previous['test_case_id'], previous['user_id'], old_pass, new_pass
+                )
             self.conn.commit()
             return True
         except Exception as e:
@@ -519,6 +489,20 @@ class Database:
             logger.error(f"Error getting test results: {e}")
             return []
 
+    def get_recent_result_notes(self, limit: int = 5) -> List[DBRecord]:
+        """Get the most recent test results whose notes report a problem"""
+        try:
+            self.cursor.execute(
+                """SELECT id, notes FROM test_results
+                   WHERE notes IS NOT NULL AND notes <> '' AND LOWER(notes) <> 'pass'
+                   ORDER BY start_time DESC, id DESC LIMIT %s""",
+                (limit,)
+            )
+            return self.cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting recent result notes: {e}")
+            return []
+    
     def get_test_results_with_measurements(self) -> List[DBRecord]:
         """Get all test results with their first stage measurements (optimized query)"""
         try:
@@ -543,6 +527,147 @@ class Database:
             logger.error(f"Error getting test results with measurements: {e}")
             return []
 
+    @staticmethod
+    def _build_result_filters(status: Optional[str] = None, user_id: Optional[int] = None,
+                              start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                              serial_prefix: Optional[str] = None) -> Tuple[List[str], List[Any]]:
+        """Build WHERE clauses and parameters for test result filters"""
+        clauses: List[str] = []
+        params: List[Any] = []
+        
+        if status:
+            clauses.append("tr.status = %s")
+            params.append(status)
+        if user_id is not None:
+            clauses.append("tr.user_id = %s")
+            params.append(user_id)
+        if start_date:
+            # A result is stored after it starts, so a bound on created_at (widened
+            # for clock skew) holds too and lets MySQL skip older monthly partitions
+            clauses.append("tr.start_time >= %s AND tr.created_at >= %s")
+            params.extend([start_date, start_date - CREATED_AT_SKEW])
+        if end_date:
+            clauses.append("tr.start_time < %s")
+            params.append(end_date)
+        if serial_prefix:
+            # Prefix search on the indexed normalized serial, so scanner case
+            # and spacing do not matter; escape LIKE wildcards to match literally
+            prefix = traceability.normalize_serial(serial_prefix)
+            escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("tr.pcb_serial_normalized LIKE %s")
+            params.append(escaped + '%')
+        
+        return clauses, params
+    
+    def query_test_results(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                           start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                           serial_prefix: Optional[str] = None, limit: int = 100,
+                           after: Optional[ResultsCursor] = None,
+                           raise_errors: bool = False) -> Tuple[List[DBRecord], Optional[ResultsCursor]]:
+        """
+        Get one page of test results, newest first, filtered in SQL
+
+        Each row includes the measurements of its first stage result.
+
+        Args:
+            status: Only results with this status
+            user_id: Only results recorded by this user
+            start_date: Only results started at or after this time
+            end_date: Only results started before this time
+            serial_prefix: Only PCB serial numbers starting with this prefix
+            limit: Maximum number of rows to return
+            after: Cursor returned by the previous call, to fetch the next page
+            raise_errors: Raise database errors instead of returning an empty page
+
+        Returns:
+            tuple: (rows, cursor for the next page or None if this was the last page)
+        """
+        try:
+            cursor = self.read_cursor
+            clauses, params = self._build_result_filters(status, user_id, start_date, end_date, serial_prefix)
+            if after:
+                clauses.append("(tr.start_time < %s OR (tr.start_time = %s AND tr.id < %s))")
+                params.extend([after[0], after[0], after[1]])
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            
+            # Fetch one extra row to know whether another page exists
+            cursor.execute(f"""
+                SELECT tr.*,
+                       tsr.voltage_measured,
+                       tsr.current_measured,
+                       tsr.resistance_measured
+                FROM test_results tr
+                LEFT JOIN test_stage_results tsr ON tsr.id = (
+                    SELECT s.id FROM test_stage_results s
+                    WHERE s.test_result_id = tr.id
+                    ORDER BY s.created_at, s.id
+                    LIMIT 1
+                )
+                {where}
+                ORDER BY tr.start_time DESC, tr.id DESC
+                LIMIT %s
+            """, (*params, limit + 1))
+            rows: List[DBRecord] = cursor.fetchall()
+            
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                return rows, (last['start_time'], last['id'])
+            return rows, None
+        except Exception as e:
+            logger.error(f"Error querying test results: {e}")
+            if raise_errors:
+                raise
+            return [], None
+    
+    def count_test_results(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                           start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                           serial_prefix: Optional[str] = None) -> DBRecord:
+        """Get total/passed/failed counts for the same filters as query_test_results"""
+        try:
+            cursor = self.read_cursor
+            clauses, params = self._build_result_filters(status, user_id, start_date, end_date, serial_prefix)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            cursor.execute(f"""
+                SELECT COUNT(*) AS total,
+                       SUM(CASE WHEN tr.status = 'Pass' THEN 1 ELSE 0 END) AS passed,
+                       SUM(CASE WHEN tr.status = 'Fail' THEN 1 ELSE 0 END) AS failed
+                FROM test_results tr
+                {where}
+            """, tuple(params))
+            row = cursor.fetchone() or {}
+            return {
+                'total': int(row.get('total') or 0),
+                'passed': int(row.get('passed') or 0),
+                'failed': int(row.get('failed') or 0)
+            }
+        except Exception as e:
+            logger.error(f"Error counting test results: {e}")
+            return {'total': 0, 'passed': 0, 'failed': 0}
+    
+    def get_pcb_history(self, serial: str, user_id: Optional[int] = None) -> List[DBRecord]:
+        """
+        Get every test run of one board, with stage results, in a single query
+
+        Args:
+            serial: PCB serial number as scanned (case and spaces are ignored)
+            user_id: Only runs recorded by this user
+
+        Returns:
+            list: Runs oldest first, each with 'attempt' and its 'stages'
+        """
+        try:
+            params: List[Any] = [traceability.normalize_serial(serial)]
+            user_filter = ""
+            if user_id is not None:
+                user_filter = "AND tr.user_id = %s"
+                params.append(user_id)
+            self.cursor.execute(traceability.HISTORY_QUERY.format(user_filter=user_filter), tuple(params))
+            return traceability.group_history(self.cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting PCB history: {e}")
+            return []
+    
     def get_test_result_by_id(self, result_id):
         """Get test result by ID"""
         try:
@@ -556,19 +681,136 @@ class Database:
                          resistance_measured, status, failure_reason=None):
         """Save a stage result"""
         try:
-            self.cursor.execute(
-                """INSERT INTO test_stage_results (test_result_id, stage_id, voltage_measured, current_measured, 
-                   resistance_measured, status, failure_reason, start_time, end_time) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), NOW())""",
+            cursor = self.statements.execute(
+                'save_stage_result',
                 (test_result_id, stage_id, voltage_measured, current_measured, resistance_measured, status, failure_reason)
             )
+            stage_result_id = cursor.lastrowid
+            rollups.record_stage_result(self.cursor, stage_result_id)
             self.conn.commit()
-            return self.cursor.lastrowid
+            return stage_result_id
         except Exception as e:
             self.conn.rollback()
             logger.error(f"Error saving stage result: {e}")
             return None
     
+    def save_test_run(self, result: DBRecord, stage_results: List[DBRecord]) -> Optional[int]:
+        """
+        Save a test result and all of its stage results in one transaction
+
+        Args:
+            result: Header row with test_case_id, user_id, pcb_serial_number,
+                status and optionally overall_pass and notes
+            stage_results: Stage rows with stage_id, voltage_measured,
+                current_measured, resistance_measured, status and
+                optionally failure_reason
+
+        Returns:
+            int: ID of the saved test result, or None if nothing was written
+        """
+        try:
+            test_result_id = self._insert_test_run(result, stage_results)
+            self.conn.commit()
+            self._audit_test_run(test_result_id, result, stage_results)
+            return test_result_id
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Error saving test run: {e}")
+            return None
+    
+    def _audit_test_run(self, test_result_id: int, result: DBRecord, stage_results: List[DBRecord],
+                        journal_id: Optional[str] = None) -> None:
+        """Record a saved test run in the audit log"""
+        details = {
+            'test_case_id': result['test_case_id'],
+            'pcb_serial_number': result.get('pcb_serial_number'),
+            'status': result['status'],
+            'stages': len(stage_results)
+        }
+        if journal_id:
+            details['journal_id'] = journal_id
+        self.log_action(result['user_id'], "Test Run Saved", "test_result", test_result_id, None, details)
+    
+    def _insert_test_run(self, result: DBRecord, stage_results: List[DBRecord]) -> int:
+        """
+        Insert a test result, its stage results and counter / rollup updates without committing
+
+        result may carry start_time / end_time and stage rows may carry
+        start_time / end_time; missing times default to NOW().
+        """
+        self.cursor.execute(
+            """INSERT INTO test_results (test_case_id, user_id, pcb_serial_number, status, overall_pass, notes,
+               start_time, end_time)
+               VALUES (%s, %s, %s, %s, %s, %s, COALESCE(%s, NOW()), %s)""",
+            (result['test_case_id'], result['user_id'], result['pcb_serial_number'], result['status'],
+             result.get('overall_pass'), result.get('notes'), result.get('start_time'), result.get('end_time'))
+        )
+        test_result_id = self.cursor.lastrowid
+        statistics.record_result(self.cursor, result['test_case_id'], result['user_id'],
+                                 result.get('overall_pass'))
+        
+        if stage_results:
+            self.cursor.executemany(
+                """INSERT INTO test_stage_results (test_result_id, stage_id, voltage_measured, current_measured, 
+                   resistance_measured, status, failure_reason, start_time, end_time) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, COALESCE(%s, NOW()), COALESCE(%s, NOW()))""",
+                [(test_result_id, stage['stage_id'], stage.get('voltage_measured'), stage.get('current_measured'),
+                  stage.get('resistance_measured'), stage['status'], stage.get('failure_reason'),
+                  stage.get('start_time'), stage.get('end_time'))
+                 for stage in stage_results]
+            )
+        rollups.record_test_run(self.cursor, test_result_id)
+        return test_result_id
+    
+    def save_spooled_test_runs(self, runs: List[DBRecord]) -> int:
+        """
+        Write test runs drained from the local spool in one transaction
+
+        Runs whose journal_id was already applied (e.g. the previous drain
+        committed but the spool was not acknowledged) are skipped, so
+        replaying the spool never duplicates results.
+
+        Args:
+            runs: Spool records with journal_id, result and stage_results, in journal order
+
+        Returns:
+            int: Number of runs written (excluding already applied ones)
+
+        Raises:
+            Exception: Any database error; the transaction is rolled back
+        """
+        if not runs:
+            return 0
+        try:
+            placeholders = ', '.join(['%s'] * len(runs))
+            self.cursor.execute(
+                f"SELECT journal_id FROM spool_applied WHERE journal_id IN ({placeholders})",
+                tuple(run['journal_id'] for run in runs)
+            )
+            applied = {row['journal_id'] for row in self.cursor.fetchall()}
+            
+            saved = []
+            for run in runs:
+                if run['journal_id'] in applied:
+                    continue
+                test_result_id = self._insert_test_run(run['result'], run['stage_results'])
+                self.cursor.execute(
+                    "INSERT INTO spool_applied (journal_id, test_result_id) VALUES (%s, %s)",
+                    (run['journal_id'], test_result_id)
+                )
+                saved.append((test_result_id, run))
+            
+            self.conn.commit()
+            for test_result_id, run in saved:
+                self._audit_test_run(test_result_id, run['result'], run['stage_results'], run['journal_id'])
+            return len(saved)
+        except Exception:
+            try:
+                self.conn.rollback()
+            except Error:
+                pass
+            raise
+    
     def get_stage_results(self, test_result_id):
         """Get all stage results for a test result"""
         try:
@@ -581,6 +823,160 @@ class Database:
             logger.error(f"Error getting stage results: {e}")
             return []
     
+    def get_stage_results_bulk(self, test_result_ids: List[int], batch_size: int = EXPORT_BATCH_SIZE,
+                               raise_errors: bool = False) -> Dict[int, List[DBRecord]]:
+        """
+        Get stage results for many test results using batched IN (...) queries
+
+        Args:
+            test_result_ids: Test result IDs to look up
+            batch_size: Maximum number of IDs per query
+            raise_errors: Raise database errors instead of returning an empty dict
+
+        Returns:
+            dict: test_result_id -> stage results (with stage_number and stage_name), in run order
+        """
+        stages_by_result: Dict[int, List[DBRecord]] = {rid: [] for rid in test_result_ids}
+        ids = list(stages_by_result)
+        try:
+            cursor = self.read_cursor
+            for i in range(0, len(ids), batch_size):
+                batch = ids[i:i + batch_size]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"""
+                    SELECT tsr.*, ts.stage_number, ts.stage_name
+                    FROM test_stage_results tsr
+                    JOIN test_stages ts ON ts.id = tsr.stage_id
+                    WHERE tsr.test_result_id IN ({placeholders})
+                    ORDER BY tsr.test_result_id, tsr.created_at, tsr.id
+                """, tuple(batch))
+                for row in cursor.fetchall():
+                    stages_by_result[row['test_result_id']].append(row)
+            return stages_by_result
+        except Exception as e:
+            logger.error(f"Error getting stage results in bulk: {e}")
+            if raise_errors:
+                raise
+            return {}
+    
+    def get_result_stage_numbers(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                                 start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                                 serial_prefix: Optional[str] = None, raise_errors: bool = False) -> List[int]:
+        """Get the distinct stage numbers recorded for the filtered test results"""
+        try:
+            cursor = self.read_cursor
+            clauses, params = self._build_result_filters(status, user_id, start_date, end_date, serial_prefix)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            cursor.execute(f"""
+                SELECT DISTINCT ts.stage_number
+                FROM test_results tr
+                JOIN test_stage_results tsr ON tsr.test_result_id = tr.id
+                JOIN test_stages ts ON ts.id = tsr.stage_id
+                {where}
+                ORDER BY ts.stage_number
+            """, tuple(params))
+            return [row['stage_number'] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting stage numbers: {e}")
+            if raise_errors:
+                raise
+            return []
+    
+    def export_test_results_with_stages(self, output_file: str, status: Optional[str] = None,
+                                        user_id: Optional[int] = None, start_date: Optional[datetime] = None,
+                                        end_date: Optional[datetime] = None, serial_prefix: Optional[str] = None,
+                                        batch_size: int = EXPORT_BATCH_SIZE, source: Any = None) -> int:
+        """
+        Export filtered test results to CSV with one column group per stage
+
+        Results are read a page at a time and their stage results fetched with
+        one batched query per page, so the number of queries grows with
+        rows / batch_size rather than with rows. Any database error aborts the
+        export and removes the partly written file, so a dropped connection
+        never leaves a truncated CSV behind.
+
+        Args:
+            output_file: Destination CSV path
+            status, user_id, start_date, end_date, serial_prefix: Same filters as query_test_results
+            batch_size: Test results per page
+            source: Object with this class's query_test_results, get_stage_results_bulk
+                and get_result_stage_numbers to read from (default: this database);
+                TieredResults passes itself so archived results are included
+
+        Returns:
+            int: Number of test results written
+
+        Raises:
+            Exception: If the export fails part-way
+        """
+        import csv
+        
+        source = source or self
+        filters = dict(status=status, user_id=user_id, start_date=start_date,
+                       end_date=end_date, serial_prefix=serial_prefix)
+        stage_numbers = source.get_result_stage_numbers(**filters, raise_errors=True)
+        
+        def fmt(value: Any) -> str:
+            return f"{value:.2f}" if value is not None else "N/A"
+        
+        header = ['Test ID', 'PCB ID', 'Tester ID', 'Status', 'Notes', 'Test Date/Time']
+        for n in stage_numbers:
+            header += [f'Stage {n} Name', f'Stage {n} Voltage (V)', f'Stage {n} Current (A)',
+                       f'Stage {n} Resistance (Ω)', f'Stage {n} Status']
+        
+        written = 0
+        try:
+            with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(header)
+                
+                after: Optional[ResultsCursor] = None
+                while True:
+                    results, after = source.query_test_results(limit=batch_size, after=after,
+                                                               raise_errors=True, **filters)
+                    if not results:
+                        break
+                    stages_by_result = source.get_stage_results_bulk([r['id'] for r in results], batch_size,
+                                                                     raise_errors=True)
+                    
+                    for result in results:
+                        # Keep the first run of each stage if it was repeated
+                        by_number: Dict[int, DBRecord] = {}
+                        for stage in stages_by_result.get(result['id'], []):
+                            by_number.setdefault(stage['stage_number'], stage)
+                    
+                        row = [
+                            result['id'],
+                            result.get('pcb_serial_number', 'N/A'),
+                            result.get('user_id', 'N/A'),
+                            result.get('status', 'N/A'),
+                            result.get('notes', ''),
+                            result.get('start_time', 'N/A')
+                        ]
+                        for n in stage_numbers:
+                            stage = by_number.get(n)
+                            if stage:
+                                row += [stage['stage_name'], fmt(stage['voltage_measured']),
+                                        fmt(stage['current_measured']), fmt(stage['resistance_measured']),
+                                        stage['status']]
+                            else:
+                                row += ['', 'N/A', 'N/A', 'N/A', '']
+                        writer.writerow(row)
+                    
+                    written += len(results)
+                    if after is None:
+                        break
+        except Exception:
+            # Do not leave a truncated export that looks complete
+            try:
+                os.remove(output_file)
+            except OSError:
+                pass
+            raise
+        
+        logger.info(f"Exported {written} test results with stages to {output_file}")
+        return written
+    
     def save_jig_diagram(self, test_case_id, diagram_name, file_path, description, uploaded_by):
         """Save a jig diagram"""
         try:
@@ -620,13 +1016,21 @@ class Database:
                         parity, timeout_seconds, created_by):
         """Save communication configuration"""
         try:
+            previous = self.get_comm_config()
             self.cursor.execute(
                 """INSERT INTO communication_config (config_name, com_port, baud_rate, data_bits, stop_bits, parity, timeout_seconds, created_by) 
                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
                 (config_name, com_port, baud_rate, data_bits, stop_bits, parity, timeout_seconds, created_by)
             )
+            config_id = self.cursor.lastrowid
             self.conn.commit()
-            return self.cursor.lastrowid
+            
+            settings = dict(config_name=config_name, com_port=com_port, baud_rate=baud_rate, data_bits=data_bits,
+                            stop_bits=stop_bits, parity=parity, timeout_seconds=timeout_seconds)
+            old_settings = {key: previous[key] for key in settings} if previous else None
+            self.log_action(created_by, "Comm Config Saved", "communication_config", config_id,
+                            old_settings, settings)
+            return config_id
         except Exception as e:
             self.conn.rollback()
             logger.error(f"Error saving communication config: {e}")
@@ -670,13 +1074,7 @@ class Database:
             pass_rate = (passed / total * 100) if total > 0 else 0
             
             # Insert or update statistics
-            self.cursor.execute(
-                """INSERT INTO test_statistics (test_case_id, total_tests, passed_tests, failed_tests, pass_rate) 
-                   VALUES (%s, %s, %s, %s, %s) 
-                   ON DUPLICATE KEY UPDATE 
-                   total_tests = %s, passed_tests = %s, failed_tests = %s, pass_rate = %s""",
-                (test_case_id, total, passed, failed, pass_rate, total, passed, failed, pass_rate)
-            )
+            statistics.set_test_case_counts(self.cursor, test_case_id, total, passed, failed, pass_rate)
             self.conn.commit()
             return True
         except Exception as e:
@@ -684,71 +1082,193 @@ class Database:
             logger.error(f"Error updating test statistics: {e}")
             return False
     
+    def get_summary_statistics(self, user_id: Optional[int] = None) -> DBRecord:
+        """Get maintained pass/fail counters for one user, or for all results"""
+        try:
+            cursor = self.read_cursor
+            if user_id is None:
+                scope, scope_id = statistics.SCOPE_GLOBAL, 0
+            else:
+                scope, scope_id = statistics.SCOPE_USER, user_id
+            cursor.execute(
+                """SELECT total_tests, passed_tests, failed_tests FROM summary_statistics
+                   WHERE scope = %s AND scope_id = %s""",
+                (scope, scope_id)
+            )
+            row = cursor.fetchone() or {}
+            return {
+                'total_tests': int(row.get('total_tests') or 0),
+                'passed_tests': int(row.get('passed_tests') or 0),
+                'failed_tests': int(row.get('failed_tests') or 0)
+            }
+        except Exception as e:
+            logger.error(f"Error getting summary statistics: {e}")
+            return {'total_tests': 0, 'passed_tests': 0, 'failed_tests': 0}
+    
+    def rebuild_statistics(self) -> bool:
+        """Recompute all maintained counters from test_results"""
+        try:
+            statistics.rebuild_statistics(self.cursor)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Error rebuilding statistics: {e}")
+            return False
+    
+    def get_daily_yield(self, days: int = 7, user_id: Optional[int] = None) -> List[DBRecord]:
+        """
+        Get per-day test run counts, newest first
+
+        Args:
+            days: Number of days back from today to include
+            user_id: Only count this user's test runs
+
+        Returns:
+            list: Rows with day, total, passed and failed (days without runs are left out)
+        """
+        try:
+            cursor = self.read_cursor
+            where, params = rollups.rollup_filters(date.today() - timedelta(days=days - 1), None, user_id)
+            cursor.execute(
+                f"""SELECT day, SUM(total) AS total, SUM(passed) AS passed, SUM(failed) AS failed
+                    FROM daily_rollups WHERE stage_id = %s AND {where}
+                    GROUP BY day ORDER BY day DESC""",
+                [rollups.RUN_STAGE_ID] + params
+            )
+            return [{'day': row['day'], 'total': int(row['total'] or 0),
+                     'passed': int(row['passed'] or 0), 'failed': int(row['failed'] or 0)}
+                    for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting daily yield: {e}")
+            return []
+    
+    def rebuild_daily_rollups(self, start_day: Optional[date] = None, end_day: Optional[date] = None,
+                              days_per_batch: int = 31, progress=None) -> int:
+        """
+        Recompute the daily rollups from the raw results (backfill / repair)
+
+        Each batch of days is rebuilt and committed separately. By default
+        only days that still have raw results are rebuilt, so rollups of
+        purged or archived results are kept.
+
+        Args:
+            start_day: First day to rebuild (default: day of the oldest test result)
+            end_day: Last day to rebuild (default: day of the newest test result)
+            days_per_batch: Days recomputed per transaction
+            progress: Called with (first day, last day) after each batch
+
+        Returns:
+            int: Number of days rebuilt, or -1 on error
+        """
+        try:
+            first, last = rollups.result_days(self.cursor)
+            start_day = start_day or first
+            end_day = end_day or last
+            if start_day is None or end_day is None:
+                return 0
+            rebuilt = 0
+            for batch_start, batch_end in rollups.rollup_days(start_day, end_day, days_per_batch):
+                rollups.rebuild_rollups(self.cursor, batch_start, batch_end)
+                self.conn.commit()
+                rebuilt += (batch_end - batch_start).days + 1
+                if progress:
+                    progress(batch_start, batch_end)
+            return rebuilt
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Error rebuilding daily rollups: {e}")
+            return -1
+    
     def get_test_statistics(self, test_case_id):
         """Get test statistics for a test case"""
         try:
-            self.cursor.execute(
+            cursor = self.read_cursor
+            cursor.execute(
                 "SELECT * FROM test_statistics WHERE test_case_id = %s", 
                 (test_case_id,)
             )
-            return self.cursor.fetchone()
+            return cursor.fetchone()
         except Exception as e:
             logger.error(f"Error getting test statistics: {e}")
             return None
     
     def log_action(self, user_id, action, entity_type=None, entity_id=None, 
                   old_values=None, new_values=None):
-        """Log user action in audit log"""
+        """
+        Log user action in audit log
+
+        The entry is queued and written in the background (see data.audit_log);
+        for dictionaries only the fields that differ between old_values and
+        new_values are stored.
+
+        Returns:
+            bool: True once the entry is queued
+        """
+        try:
+            audit_log.get_appender(Database).append(user_id, action, entity_type, entity_id, old_values, new_values)
+            return True
+        except Exception as e:
+            logger.error(f"Error logging action: {e}")
+            return False
+    
+    def insert_audit_entries(self, rows: List[Tuple]) -> None:
+        """
+        Write audit log rows with one multi-row INSERT
+
+        Args:
+            rows: (user_id, action, entity_type, entity_id, old_values, new_values, timestamp) tuples
+
+        Raises:
+            Exception: Any database error; the transaction is rolled back
+        """
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
         try:
-            old_values_json = json.dumps(old_values) if old_values else None
-            new_values_json = json.dumps(new_values) if new_values else None
-            
             self.cursor.execute(
-                """INSERT INTO audit_log (user_id, action, entity_type, entity_id, old_values, new_values) 
-                   VALUES (%s, %s, %s, %s, %s, %s)""",
-                (user_id, action, entity_type, entity_id, old_values_json, new_values_json)
+                f"""INSERT INTO audit_log (user_id, action, entity_type, entity_id, old_values, new_values, timestamp)
+                    VALUES {placeholders}""",
+                tuple(value for row in rows for value in row)
             )
             self.conn.commit()
-            return self.cursor.lastrowid
-        except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Error logging action: {e}")
-            return None
+        except Exception:
+            try:
+                self.conn.rollback()
+            except Error:
+                pass
+            raise
     
     def get_audit_log(self) -> List[DBRecord]:
         """Get audit log entries"""
         try:
+            # Include entries still waiting in the appender
+            audit_log.flush()
             self.cursor.execute("SELECT * FROM audit_log ORDER BY timestamp DESC")
             return self.cursor.fetchall()
         except Exception as e:
             logger.error(f"Error getting audit log: {e}")
             return []
     
-    def export_test_results_to_csv(self, test_case_id=None):
-        """Export test results to CSV"""
+    def export_test_results_to_csv(self, test_case_id=None, fmt=FORMAT_CSV, compress=False, progress=None):
+        """Export test results to CSV (or NDJSON), streaming rows to the file"""
+        conn = None
         try:
-            import csv
-            from datetime import datetime
-            
             if test_case_id:
-                self.cursor.execute(
-                    "SELECT * FROM test_results WHERE test_case_id = %s ORDER BY start_time DESC",
-                    (test_case_id,)
-                )
+                query = "SELECT * FROM test_results WHERE test_case_id = %s ORDER BY start_time DESC"
+                params: tuple = (test_case_id,)
             else:
-                self.cursor.execute("SELECT * FROM test_results ORDER BY start_time DESC")
+                query = "SELECT * FROM test_results ORDER BY start_time DESC"
+                params = ()
             
-            results = self.cursor.fetchall()
-            filename = f"test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            filename = ExportEngine.default_filename("test_results", fmt, compress)
             
-            if results:
-                with open(filename, 'w', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=results[0].keys())
-                    writer.writeheader()
-                    for row in results:
-                        writer.writerow(row)
+            # Stream on a dedicated connection so this thread's shared cursor stays usable
+            conn = self._open_export_connection()
+            ExportEngine(progress=progress).export_query(conn, query, params, filename, fmt, compress)
             
             return filename
         except Exception as e:
             logger.error(f"Error exporting results: {e}")
             return None
+        finally:
+            if conn:
+                conn.close()
@@ -2,16 +2,23 @@
 Database Utilities - MySQL Implementation
 Backup, maintenance, and data management utilities for PCB Testing system
 """
-import mysql.connector
 from mysql.connector import Error
 import os
-import csv
 import json
 import subprocess
 import tempfile
 import logging
 from datetime import datetime
 from config.config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT
+from data.connection_pool import get_pool, get_read_connection, replica_status
+from data.export import ExportEngine, FORMAT_CSV
+from data.retention import RetentionEngine
+from data import partitions
+from data import cold_archive
+from data import rollups
+from config.config import RETENTION_BATCH_SIZE, RETENTION_SLEEP_SECONDS, ARCHIVE_DIR, PARTITION_MONTHS_AHEAD
+from config.config import COLD_ARCHIVE_DAYS
+from utils import identity_cache
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
@@ -34,19 +41,30 @@ class DatabaseUtilities:
             os.makedirs(self.backup_dir)
     
     def connect(self):
-        """Create database connection"""
+        """Check out a connection from the shared pool (close() returns it)"""
         try:
-            return mysql.connector.connect(
-                host=self.db_host,
-                user=self.db_user,
-                password=self.db_password,
-                database=self.db_name,
-                port=self.db_port
-            )
+            return get_pool().get_connection()
+        except Error as e:
+            logger.error(f"Connection error: {e}")
+            return None
+    
+    def connect_read(self):
+        """Check out a connection for reporting queries (replica when usable, else the primary)"""
+        try:
+            return get_read_connection()
         except Error as e:
             logger.error(f"Connection error: {e}")
             return None
     
+    def get_replica_status(self):
+        """
+        Check the reporting replica
+
+        Returns:
+            dict: configured, available, lag_seconds and stale
+        """
+        return replica_status()
+    
     # ============== BACKUP OPERATIONS ==============
     
     def create_backup(self, backup_name=None):
@@ -159,6 +177,8 @@ password={self.db_password}
                     _, stderr = process.communicate()
 
                     if process.returncode == 0:
+                        # Restored users may have different IDs
+                        identity_cache.invalidate()
                         logger.info(f"✓ Database restored from: {backup_file}")
                         return True
                     else:
@@ -206,7 +226,7 @@ password={self.db_password}
             # CHECK TABLE requires table names - validate against whitelist
             allowed_tables = ['users', 'test_cases', 'test_results', 'test_stages',
                             'test_stage_results', 'jig_diagrams', 'communication_config',
-                            'test_statistics', 'audit_log']
+                            'test_statistics', 'summary_statistics', 'audit_log']
 
             # Build safe CHECK TABLE query with validated table names
             check_query = "CHECK TABLE " + ", ".join(allowed_tables)
@@ -232,7 +252,8 @@ password={self.db_password}
 
             cursor = conn.cursor()
             allowed_tables = ['users', 'test_cases', 'test_results', 'test_stages', 'test_stage_results',
-                            'jig_diagrams', 'communication_config', 'test_statistics', 'audit_log']
+                            'jig_diagrams', 'communication_config', 'test_statistics', 'summary_statistics',
+                            'audit_log']
 
             for table in allowed_tables:
                 # OPTIMIZE TABLE requires table name - use whitelist validation
@@ -251,7 +272,7 @@ password={self.db_password}
     def get_database_stats(self):
         """Get database statistics"""
         try:
-            conn = self.connect()
+            conn = self.connect_read()
             if not conn:
                 return None
 
@@ -300,12 +321,24 @@ password={self.db_password}
     
     # ============== DATA EXPORT OPERATIONS ==============
     
-    def export_table_to_csv(self, table_name, output_file=None):
-        """Export table to CSV"""
+    def export_table_to_csv(self, table_name, output_file=None, fmt=FORMAT_CSV, compress=False, progress=None):
+        """
+        Export table to CSV (or NDJSON), streaming rows in chunks
+
+        Args:
+            table_name (str): Table to export (must be whitelisted)
+            output_file (str): Destination path, defaults to a timestamped file in data/
+            fmt (str): FORMAT_CSV or FORMAT_NDJSON
+            compress (bool): Gzip the output
+            progress (callable): Called with the number of rows written so far
+
+        Returns:
+            str: Path to export file
+        """
         # Whitelist of allowed table names to prevent SQL injection
         allowed_tables = ['users', 'test_cases', 'test_results', 'test_stages',
                          'test_stage_results', 'jig_diagrams', 'communication_config',
-                         'test_statistics', 'audit_log']
+                         'test_statistics', 'summary_statistics', 'audit_log']
 
         if table_name not in allowed_tables:
             logger.error(f"Invalid table name: {table_name}")
@@ -313,45 +346,37 @@ password={self.db_password}
 
         try:
             if output_file is None:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                output_file = os.path.join('data', f'{table_name}_{timestamp}.csv')
+                output_file = os.path.join('data', ExportEngine.default_filename(table_name, fmt, compress))
 
-            conn = self.connect()
+            conn = self.connect_read()
             if not conn:
                 return None
 
-            cursor = conn.cursor(dictionary=True)
-            # Table name validated against whitelist, safe to use
-            cursor.execute(f"SELECT * FROM {table_name}")
-            rows = cursor.fetchall()
-
-            if rows:
-                with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-                    writer.writeheader()
-                    for row in rows:
-                        writer.writerow(row)
-
-            cursor.close()
-            conn.close()
+            try:
+                # Table name validated against whitelist, safe to use
+                ExportEngine(progress=progress).export_query(
+                    conn, f"SELECT * FROM {table_name}", None, output_file, fmt, compress
+                )
+            finally:
+                conn.close()
             return output_file
 
         except Exception as e:
             logger.error(f"Export error: {e}")
             return None
     
-    def export_test_results_detailed(self, output_file=None):
-        """Export detailed test results"""
+    def export_test_results_detailed(self, output_file=None, fmt=FORMAT_CSV, compress=False, progress=None):
+        """Export detailed test results (one row per stage result), streaming rows in chunks"""
         try:
             if output_file is None:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                output_file = os.path.join('data', f'test_results_detailed_{timestamp}.csv')
+                output_file = os.path.join(
+                    'data', ExportEngine.default_filename('test_results_detailed', fmt, compress)
+                )
             
-            conn = self.connect()
+            conn = self.connect_read()
             if not conn:
                 return None
             
-            cursor = conn.cursor(dictionary=True)
             query = """
                 SELECT 
                     tr.id as result_id,
@@ -377,18 +402,10 @@ password={self.db_password}
                 ORDER BY tr.start_time DESC
             """
             
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            
-            if rows:
-                with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-                    writer.writeheader()
-                    for row in rows:
-                        writer.writerow(row)
-            
-            cursor.close()
-            conn.close()
+            try:
+                ExportEngine(progress=progress).export_query(conn, query, None, output_file, fmt, compress)
+            finally:
+                conn.close()
             print(f"✓ Exported to: {output_file}")
             return output_file
             
@@ -398,8 +415,43 @@ password={self.db_password}
     
     # ============== DATA CLEANUP OPERATIONS ==============
     
-    def delete_old_test_results(self, days=90):
-        """Delete test results older than specified days"""
+    def _retention_engine(self, conn, batch_size, sleep_seconds, archive, progress):
+        """Build a RetentionEngine with the configured defaults"""
+        return RetentionEngine(
+            conn,
+            batch_size=RETENTION_BATCH_SIZE if batch_size is None else batch_size,
+            sleep_seconds=RETENTION_SLEEP_SECONDS if sleep_seconds is None else sleep_seconds,
+            archive_dir=ARCHIVE_DIR if archive else None,
+            progress=progress
+        )
+    
+    def _retention_cutoff(self, conn, days):
+        """Server time days ago"""
+        cursor = conn.cursor(buffered=True)
+        try:
+            cursor.execute("SELECT DATE_SUB(NOW(), INTERVAL %s DAY)", (days,))
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+    
+    def delete_old_test_results(self, days=90, batch_size=None, sleep_seconds=None, archive=False, progress=None):
+        """
+        Delete test results (and their stage results) older than specified days
+
+        Whole monthly partitions that have expired are dropped first (unless
+        archiving); the remaining rows are deleted in small id-ordered
+        batches. If interrupted, run it again to continue where it stopped.
+
+        Args:
+            days (int): Retention period
+            batch_size (int): Test results per transaction (default RETENTION_BATCH_SIZE)
+            sleep_seconds (float): Pause between batches (default RETENTION_SLEEP_SECONDS)
+            archive (bool): Write each batch to ARCHIVE_DIR before deleting it
+            progress (callable): Called with (table, rows deleted so far)
+
+        Returns:
+            bool: Success status
+        """
         try:
             # Validate days parameter (must be positive integer)
             days = int(days)
@@ -411,16 +463,14 @@ password={self.db_password}
             if not conn:
                 return False
 
-            cursor = conn.cursor()
-            # Use parameterized query to prevent SQL injection
-            cursor.execute(
-                "DELETE FROM test_results WHERE created_at < DATE_SUB(NOW(), INTERVAL %s DAY)",
-                (days,)
-            )
-            rows_deleted = cursor.rowcount
-            conn.commit()
-            cursor.close()
-            conn.close()
+            try:
+                rows_deleted = 0
+                if not archive:
+                    rows_deleted += partitions.drop_expired_results(conn, self._retention_cutoff(conn, days))
+                engine = self._retention_engine(conn, batch_size, sleep_seconds, archive, progress)
+                rows_deleted += engine.purge_test_results(days)
+            finally:
+                conn.close()
 
             logger.info(f"✓ Deleted {rows_deleted} test results older than {days} days")
             return True
@@ -429,8 +479,8 @@ password={self.db_password}
             logger.error(f"Cleanup error: {e}")
             return False
     
-    def delete_old_audit_logs(self, days=180):
-        """Delete audit logs older than specified days"""
+    def delete_old_audit_logs(self, days=180, batch_size=None, sleep_seconds=None, archive=False, progress=None):
+        """Delete audit logs older than specified days, in batches (see delete_old_test_results)"""
         try:
             # Validate days parameter (must be positive integer)
             days = int(days)
@@ -442,16 +492,11 @@ password={self.db_password}
             if not conn:
                 return False
 
-            cursor = conn.cursor()
-            # Use parameterized query to prevent SQL injection
-            cursor.execute(
-                "DELETE FROM audit_log WHERE timestamp < DATE_SUB(NOW(), INTERVAL %s DAY)",
-                (days,)
-            )
-            rows_deleted = cursor.rowcount
-            conn.commit()
-            cursor.close()
-            conn.close()
+            try:
+                engine = self._retention_engine(conn, batch_size, sleep_seconds, archive, progress)
+                rows_deleted = engine.purge_audit_logs(days)
+            finally:
+                conn.close()
 
             logger.info(f"✓ Deleted {rows_deleted} audit logs older than {days} days")
             return True
@@ -460,49 +505,149 @@ password={self.db_password}
             logger.error(f"Cleanup error: {e}")
             return False
     
-    # ============== REPORTING OPERATIONS ==============
+    def maintain_partitions(self, months_ahead=PARTITION_MONTHS_AHEAD, retain_days=None):
+        """
+        Create upcoming monthly result partitions and drop expired ones
+
+        Run at least monthly (e.g. alongside the backup job) so new results
+        always land in their own month's partition.
+
+        Args:
+            months_ahead (int): Months of partitions to keep ready
+            retain_days (int): Also drop partitions entirely older than this (None keeps all)
+
+        Returns:
+            bool: Success status
+        """
+        try:
+            conn = self.connect()
+            if not conn:
+                return False
+
+            try:
+                cursor = conn.cursor(buffered=True)
+                try:
+                    for table in partitions.PARTITIONED_TABLES:
+                        added = partitions.add_future_partitions(cursor, table, months_ahead)
+                        if added:
+                            logger.info(f"✓ Added partitions {', '.join(added)} to {table}")
+                finally:
+                    cursor.close()
+
+                if retain_days is not None:
+                    dropped = partitions.drop_expired_results(conn, self._retention_cutoff(conn, int(retain_days)))
+                    logger.info(f"✓ Dropped {dropped} test results in expired partitions")
+            finally:
+                conn.close()
+            return True
+
+        except Exception as e:
+            logger.error(f"Partition maintenance error: {e}")
+            return False
     
-    def generate_summary_report(self):
-        """Generate summary report"""
+    def archive_cold_results(self, days=COLD_ARCHIVE_DAYS):
+        """
+        Move whole months of test results older than specified days to the cold archive
+
+        Archived results stay visible in Results History (see TieredResults)
+        but no longer take space in MySQL or in backups.
+
+        Args:
+            days (int): Age after which results are moved
+
+        Returns:
+            bool: Success status
+        """
         try:
+            days = int(days)
+            if days <= 0:
+                logger.error("Days parameter must be positive")
+                return False
+
             conn = self.connect()
+            if not conn:
+                return False
+
+            try:
+                moved = cold_archive.archive_results(conn, days)
+            finally:
+                conn.close()
+
+            logger.info(f"✓ Moved {moved} test results older than {days} days to the cold archive")
+            return True
+
+        except Exception as e:
+            logger.error(f"Cold archive error: {e}")
+            return False
+    
+    # ============== REPORTING OPERATIONS ==============
+    
+    def generate_summary_report(self, start_day=None, end_day=None):
+        """
+        Generate summary report from the daily rollups
+
+        Args:
+            start_day (date): First day to include (default: all history)
+            end_day (date): Last day to include (default: today)
+
+        Returns:
+            dict: overall, user_activity and stage_measurements sections, or None on error
+        """
+        try:
+            conn = self.connect_read()
             if not conn:
                 return None
             
             cursor = conn.cursor(dictionary=True)
             report = {}
+            where, params = rollups.rollup_filters(start_day, end_day)
             
             # Overall statistics
-            cursor.execute("""
-                SELECT 
-                    COUNT(DISTINCT tc.id) as total_test_cases,
-                    COUNT(DISTINCT tr.id) as total_test_runs,
-                    SUM(CASE WHEN tr.overall_pass = 1 THEN 1 ELSE 0 END) as passed_tests,
-                    SUM(CASE WHEN tr.overall_pass = 0 THEN 1 ELSE 0 END) as failed_tests,
-                    ROUND(SUM(CASE WHEN tr.overall_pass = 1 THEN 1 ELSE 0 END) / COUNT(DISTINCT tr.id) * 100, 2) as pass_rate
-                FROM test_cases tc
-                LEFT JOIN test_results tr ON tc.id = tr.test_case_id
-            """)
+            cursor.execute("SELECT COUNT(*) as total_test_cases FROM test_cases")
+            test_cases = cursor.fetchone()['total_test_cases']
+            cursor.execute(f"""
+                SELECT SUM(total) as total_test_runs, SUM(passed) as passed_tests, SUM(failed) as failed_tests
+                FROM daily_rollups
+                WHERE stage_id = %s AND {where}
+            """, [rollups.RUN_STAGE_ID] + params)
             
             result = cursor.fetchone()
+            test_runs = int(result['total_test_runs'] or 0)
+            passed = int(result['passed_tests'] or 0)
             report['overall'] = {
-                'test_cases': result['total_test_cases'] or 0,
-                'test_runs': result['total_test_runs'] or 0,
-                'passed': result['passed_tests'] or 0,
-                'failed': result['failed_tests'] or 0,
-                'pass_rate': result['pass_rate'] or 0
+                'test_cases': test_cases or 0,
+                'test_runs': test_runs,
+                'passed': passed,
+                'failed': int(result['failed_tests'] or 0),
+                'pass_rate': round(passed / test_runs * 100, 2) if test_runs else 0
             }
             
             # User activity
-            cursor.execute("""
-                SELECT u.username, COUNT(tr.id) as test_count
+            joined, joined_params = rollups.rollup_filters(start_day, end_day, alias='r')
+            cursor.execute(f"""
+                SELECT u.username, COALESCE(SUM(r.total), 0) as test_count
                 FROM users u
-                LEFT JOIN test_results tr ON u.id = tr.user_id
-                GROUP BY u.id
+                LEFT JOIN daily_rollups r ON r.user_id = u.id AND r.stage_id = %s AND {joined}
+                GROUP BY u.id, u.username
                 ORDER BY test_count DESC
-            """)
+            """, [rollups.RUN_STAGE_ID] + joined_params)
+            
+            report['user_activity'] = [{'username': row['username'], 'test_count': int(row['test_count'])}
+                                       for row in cursor.fetchall()]
             
-            report['user_activity'] = [dict(row) for row in cursor.fetchall()]
+            # Measurement statistics per test case and stage
+            cursor.execute(rollups.stage_summary_query(where), params)
+            report['stage_measurements'] = [
+                {
+                    'test_case_id': row['test_case_id'],
+                    'stage_id': row['stage_id'],
+                    'total': int(row['total']),
+                    'passed': int(row['passed']),
+                    'failed': int(row['failed']),
+                    **{name: rollups.measurement_summary(row, name) for name in rollups.MEASUREMENTS}
+                }
+                for row in cursor.fetchall()
+            ]
             
             cursor.close()
             conn.close()
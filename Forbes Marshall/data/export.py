@@ -0,0 +1,108 @@
+"""
+Export Engine - MySQL Implementation
+Streams query results to CSV or NDJSON files without loading them into memory
+"""
+import csv
+import gzip
+import json
+import logging
+from datetime import datetime
+from typing import Any, Callable, IO, Optional, Sequence
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Supported output formats
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+
+# Rows fetched from the server per round-trip
+DEFAULT_CHUNK_SIZE = 1000
+
+# Called with the number of rows written so far
+ProgressCallback = Callable[[int], None]
+
+
+class ExportEngine:
+    """Write query results to disk in fixed-size chunks from an unbuffered cursor"""
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 progress: Optional[ProgressCallback] = None) -> None:
+        self.chunk_size = max(1, int(chunk_size))
+        self.progress = progress
+
+    @staticmethod
+    def default_filename(prefix: str, fmt: str = FORMAT_CSV, compress: bool = False) -> str:
+        """Build a timestamped file name such as prefix_20250101_120000.csv.gz"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f"{prefix}_{timestamp}.{fmt}" + (".gz" if compress else "")
+
+    @staticmethod
+    def _open(path: str, compress: bool) -> IO[str]:
+        """Open the output file as text, gzip-compressed if requested"""
+        if compress:
+            return gzip.open(path, 'wt', newline='', encoding='utf-8')
+        return open(path, 'w', newline='', encoding='utf-8')
+
+    def export_query(self, conn: Any, query: str, params: Optional[Sequence[Any]] = None,
+                     output_file: str = "export.csv", fmt: str = FORMAT_CSV,
+                     compress: bool = False) -> int:
+        """
+        Run a query and stream its rows to a file
+
+        The connection is used exclusively until every row has been read,
+        so pass a connection that no other code is using at the same time.
+
+        Args:
+            conn: Open MySQL connection
+            query: SELECT statement to export
+            params: Query parameters
+            output_file: Destination path (extension is not changed)
+            fmt: FORMAT_CSV or FORMAT_NDJSON
+            compress: Write gzip-compressed output
+
+        Returns:
+            int: Number of rows written
+        """
+        if fmt not in (FORMAT_CSV, FORMAT_NDJSON):
+            raise ValueError(f"Unsupported export format: {fmt}")
+
+        cursor = conn.cursor(buffered=False)
+        rows_written = 0
+        try:
+            cursor.execute(query, params or ())
+            columns = list(cursor.column_names)
+
+            with self._open(output_file, compress) as f:
+                csv_writer = None
+                if fmt == FORMAT_CSV:
+                    csv_writer = csv.writer(f)
+                    csv_writer.writerow(columns)
+
+                while True:
+                    rows = cursor.fetchmany(self.chunk_size)
+                    if not rows:
+                        break
+
+                    if csv_writer:
+                        csv_writer.writerows(rows)
+                    else:
+                        f.writelines(
+                            json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows
+                        )
+
+                    rows_written += len(rows)
+                    if self.progress:
+                        self.progress(rows_written)
+
+            logger.info(f"Exported {rows_written} rows to {output_file}")
+            return rows_written
+        finally:
+            # Drain anything left unread (e.g. after a write error) so the
+            # connection can be reused
+            try:
+                if conn.unread_result:
+                    conn.consume_results()
+            except Exception:
+                pass
+            cursor.close()
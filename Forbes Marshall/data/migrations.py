@@ -0,0 +1,378 @@
+"""
+Schema Migrations - MySQL Implementation
+Versioned, incremental schema changes for the PCB Testing database
+"""
+import logging
+from typing import Any, Callable, List, Tuple, Union
+from mysql.connector import Error, errorcode
+from data.statistics import rebuild_statistics
+from data.partitions import partition_table
+from data.traceability import SERIAL_NORMALIZE_SQL
+from data.rollups import rebuild_all_rollups
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# A migration step is either a SQL statement or a callable receiving a cursor
+MigrationStep = Union[str, Callable[[Any], None]]
+
+# Named lock that serialises migrations when several stations start at once
+MIGRATION_LOCK_NAME = "pcb_testing_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+def add_index(table: str, index_name: str, columns: str, unique: bool = False) -> MigrationStep:
+    """
+    Build a step that adds an index only if it is missing
+
+    MySQL has no CREATE INDEX IF NOT EXISTS, so check information_schema
+    first to keep the step safe to re-run.
+    """
+    def step(cursor: Any) -> None:
+        cursor.execute(
+            """SELECT 1 FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+               LIMIT 1""",
+            (table, index_name)
+        )
+        if cursor.fetchone():
+            return
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        cursor.execute(f"ALTER TABLE {table} ADD {kind} {index_name} ({columns})")
+    return step
+
+
+def add_column(table: str, column: str, definition: str) -> MigrationStep:
+    """Build a step that adds a column only if it is missing (see add_index)"""
+    def step(cursor: Any) -> None:
+        cursor.execute(
+            """SELECT 1 FROM information_schema.columns
+               WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+               LIMIT 1""",
+            (table, column)
+        )
+        if cursor.fetchone():
+            return
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+# Ordered list of (version, description, steps). Never edit a released
+# migration; append a new one instead. MySQL commits DDL implicitly, so
+# steps should be idempotent (IF NOT EXISTS, etc.) to allow a failed
+# migration to be re-run.
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (1, "Baseline schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            role ENUM('Admin', 'Manager', 'Tester') NOT NULL,
+            email VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            INDEX idx_username (username),
+            INDEX idx_role (role)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS test_cases (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            description TEXT,
+            voltage_min DECIMAL(10, 2) NOT NULL,
+            voltage_max DECIMAL(10, 2) NOT NULL,
+            current_min DECIMAL(10, 2) NOT NULL,
+            current_max DECIMAL(10, 2) NOT NULL,
+            resistance_min DECIMAL(10, 2) NOT NULL,
+            resistance_max DECIMAL(10, 2) NOT NULL,
+            created_by INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (created_by) REFERENCES users(id),
+            INDEX idx_created_by (created_by)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS test_stages (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            test_case_id INT NOT NULL,
+            stage_number INT NOT NULL,
+            stage_name VARCHAR(255) NOT NULL,
+            description TEXT,
+            voltage_min DECIMAL(10, 2),
+            voltage_max DECIMAL(10, 2),
+            current_min DECIMAL(10, 2),
+            current_max DECIMAL(10, 2),
+            resistance_min DECIMAL(10, 2),
+            resistance_max DECIMAL(10, 2),
+            duration_seconds INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (test_case_id) REFERENCES test_cases(id) ON DELETE CASCADE,
+            UNIQUE KEY unique_stage (test_case_id, stage_number),
+            INDEX idx_test_case_id (test_case_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS test_results (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            test_case_id INT NOT NULL,
+            user_id INT NOT NULL,
+            pcb_serial_number VARCHAR(255),
+            status ENUM('Pass', 'Fail', 'In Progress') NOT NULL,
+            overall_pass BOOLEAN,
+            start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            end_time TIMESTAMP NULL,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (test_case_id) REFERENCES test_cases(id),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            INDEX idx_user_id (user_id),
+            INDEX idx_test_case_id (test_case_id),
+            INDEX idx_start_time (start_time)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS test_stage_results (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            test_result_id INT NOT NULL,
+            stage_id INT NOT NULL,
+            voltage_measured DECIMAL(10, 2),
+            current_measured DECIMAL(10, 2),
+            resistance_measured DECIMAL(10, 2),
+            status ENUM('Pass', 'Fail', 'Not Run') NOT NULL,
+            failure_reason TEXT,
+            start_time TIMESTAMP NULL,
+            end_time TIMESTAMP NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (test_result_id) REFERENCES test_results(id) ON DELETE CASCADE,
+            FOREIGN KEY (stage_id) REFERENCES test_stages(id),
+            INDEX idx_test_result_id (test_result_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS jig_diagrams (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            test_case_id INT,
+            diagram_name VARCHAR(255) NOT NULL,
+            file_path VARCHAR(500) NOT NULL,
+            description TEXT,
+            uploaded_by INT NOT NULL,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (test_case_id) REFERENCES test_cases(id) ON DELETE SET NULL,
+            FOREIGN KEY (uploaded_by) REFERENCES users(id),
+            INDEX idx_test_case_id (test_case_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS communication_config (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            config_name VARCHAR(255) NOT NULL,
+            com_port VARCHAR(50),
+            baud_rate INT DEFAULT 9600,
+            data_bits INT DEFAULT 8,
+            stop_bits INT DEFAULT 1,
+            parity VARCHAR(10) DEFAULT 'None',
+            timeout_seconds INT DEFAULT 5,
+            created_by INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (created_by) REFERENCES users(id),
+            INDEX idx_created_by (created_by)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS test_statistics (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            test_case_id INT NOT NULL,
+            total_tests INT DEFAULT 0,
+            passed_tests INT DEFAULT 0,
+            failed_tests INT DEFAULT 0,
+            pass_rate DECIMAL(5, 2) DEFAULT 0.0,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (test_case_id) REFERENCES test_cases(id) ON DELETE CASCADE,
+            UNIQUE KEY unique_test_case (test_case_id),
+            INDEX idx_test_case_id (test_case_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            action VARCHAR(255) NOT NULL,
+            entity_type VARCHAR(255),
+            entity_id INT,
+            old_values JSON,
+            new_values JSON,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            INDEX idx_user_id (user_id),
+            INDEX idx_timestamp (timestamp)
+        )
+        '''
+    ]),
+    (2, "Keyset pagination indexes for test results", [
+        add_index('test_results', 'idx_start_time_id', 'start_time, id'),
+        add_index('test_results', 'idx_user_start_time', 'user_id, start_time, id'),
+    ]),
+    (3, "Incrementally maintained global and per-user statistics", [
+        '''
+        CREATE TABLE IF NOT EXISTS summary_statistics (
+            scope ENUM('global', 'user') NOT NULL,
+            scope_id INT NOT NULL,
+            total_tests INT DEFAULT 0,
+            passed_tests INT DEFAULT 0,
+            failed_tests INT DEFAULT 0,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (scope, scope_id)
+        )
+        ''',
+        rebuild_statistics,
+    ]),
+    (4, "Journal IDs of test runs drained from the local spool", [
+        '''
+        CREATE TABLE IF NOT EXISTS spool_applied (
+            journal_id CHAR(32) PRIMARY KEY,
+            test_result_id INT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (5, "Monthly RANGE partitions on created_at for test results", [
+        lambda cursor: partition_table(cursor, 'test_results'),
+        lambda cursor: partition_table(cursor, 'test_stage_results'),
+    ]),
+    (6, "PCB serial number indexes for traceability", [
+        # As released; migration 8 switches the column to SERIAL_NORMALIZE_SQL
+        add_column('test_results', 'pcb_serial_normalized',
+                   "VARCHAR(255) GENERATED ALWAYS AS (UPPER(REPLACE(TRIM(pcb_serial_number), ' ', ''))) STORED"),
+        add_index('test_results', 'idx_pcb_serial_number', 'pcb_serial_number'),
+        add_index('test_results', 'idx_pcb_serial_normalized', 'pcb_serial_normalized, start_time, id'),
+    ]),
+    (7, "Daily rollups of test results and stage measurements", [
+        '''
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            day DATE NOT NULL,
+            test_case_id INT NOT NULL,
+            stage_id INT NOT NULL,
+            user_id INT NOT NULL,
+            total INT NOT NULL DEFAULT 0,
+            passed INT NOT NULL DEFAULT 0,
+            failed INT NOT NULL DEFAULT 0,
+            voltage_count INT NOT NULL DEFAULT 0,
+            voltage_min DOUBLE NULL,
+            voltage_max DOUBLE NULL,
+            voltage_sum DOUBLE NOT NULL DEFAULT 0,
+            voltage_sum_sq DOUBLE NOT NULL DEFAULT 0,
+            current_count INT NOT NULL DEFAULT 0,
+            current_min DOUBLE NULL,
+            current_max DOUBLE NULL,
+            current_sum DOUBLE NOT NULL DEFAULT 0,
+            current_sum_sq DOUBLE NOT NULL DEFAULT 0,
+            resistance_count INT NOT NULL DEFAULT 0,
+            resistance_min DOUBLE NULL,
+            resistance_max DOUBLE NULL,
+            resistance_sum DOUBLE NOT NULL DEFAULT 0,
+            resistance_sum_sq DOUBLE NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, test_case_id, stage_id, user_id),
+            INDEX idx_rollup_test_case (test_case_id, stage_id, day),
+            INDEX idx_rollup_user (user_id, day)
+        )
+        ''',
+        rebuild_all_rollups,
+    ]),
+    (8, "Strip tabs and line endings from normalized PCB serial numbers", [
+        # Recomputes the stored column for every row (a table rebuild)
+        f"""ALTER TABLE test_results MODIFY COLUMN pcb_serial_normalized
+            VARCHAR(255) GENERATED ALWAYS AS ({SERIAL_NORMALIZE_SQL}) STORED""",
+    ]),
+]
+
+
+def latest_version() -> int:
+    """Return the version the code expects the schema to be at"""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def get_schema_version(cursor: Any) -> int:
+    """Return the applied schema version (0 if migrations never ran)"""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_migrations")
+        row = cursor.fetchone()
+    except Error as e:
+        if e.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    return int(row[0] or 0) if row else 0
+
+
+def _ensure_migrations_table(cursor: Any) -> None:
+    """Create the schema_migrations bookkeeping table"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def run_migrations(conn: Any) -> int:
+    """
+    Bring the schema up to date
+
+    Costs a single SELECT when the schema is already current; DDL is only
+    issued for migrations newer than the recorded version.
+
+    Args:
+        conn: Open MySQL connection to the application database
+
+    Returns:
+        int: Schema version after running
+    """
+    cursor = conn.cursor(buffered=True)
+    try:
+        current = get_schema_version(cursor)
+        target = latest_version()
+        if current >= target:
+            return current
+
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+        if not cursor.fetchone()[0]:
+            raise RuntimeError("Timed out waiting for schema migration lock")
+
+        try:
+            _ensure_migrations_table(cursor)
+            # Another station may have migrated while we waited for the lock
+            current = get_schema_version(cursor)
+
+            for version, description, steps in MIGRATIONS:
+                if version <= current:
+                    continue
+
+                logger.info(f"Applying schema migration {version}: {description}")
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+                current = version
+
+            logger.info(f"Schema is at version {current}")
+            return current
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+            cursor.fetchone()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
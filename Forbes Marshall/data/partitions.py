@@ -0,0 +1,244 @@
+"""
+Result Partitioning - MySQL Implementation
+Monthly RANGE partitions on created_at for test_results and test_stage_results
+
+Partitioned InnoDB tables cannot have foreign keys, so partitioning drops
+every key on or referencing these tables (each one is logged as a warning
+and recorded in audit_log with its definition). From then on referential
+integrity is enforced by the application: Database.delete_test_case and
+retention delete stage results before their test results, and results are
+only written for existing test cases, stages and users.
+"""
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, List, Optional
+from config.config import PARTITION_MONTHS_AHEAD
+from data import statistics
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Partitioned tables, children first (the order expired partitions are dropped in)
+PARTITIONED_TABLES = ("test_stage_results", "test_results")
+
+# Catch-all partition so inserts never fail if maintenance has not run
+MAX_PARTITION = "pmax"
+
+
+def month_start(value: date) -> date:
+    """First day of the month containing value"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    """First day of the month count months after month"""
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding rows created in the given month (p202601)"""
+    return f"p{month:%Y%m}"
+
+
+def _partition_month(name: str) -> Optional[date]:
+    """Month a partition holds, or None for the catch-all partition"""
+    if name == MAX_PARTITION:
+        return None
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+
+def _partition_definition(month: date) -> str:
+    # TIMESTAMP columns can only be range partitioned through UNIX_TIMESTAMP()
+    upper = add_months(month, 1)
+    return (f"PARTITION {partition_name(month)} "
+            f"VALUES LESS THAN (UNIX_TIMESTAMP('{upper:%Y-%m-%d} 00:00:00'))")
+
+
+def _max_partition_definition() -> str:
+    return f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE"
+
+
+def list_partitions(cursor: Any, table: str) -> List[str]:
+    """Partition names of a table in range order (empty if it is not partitioned)"""
+    cursor.execute(
+        """SELECT partition_name FROM information_schema.partitions
+           WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+           ORDER BY partition_ordinal_position""",
+        (table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _drop_foreign_keys(cursor: Any, table: str) -> List[str]:
+    """
+    Drop foreign keys on or referencing a table (partitioned InnoDB tables cannot have any)
+
+    Each key is recorded in audit_log (action "Foreign Key Dropped", entity
+    type the owning table) with enough of its definition to recreate it.
+
+    Returns:
+        list: Dropped keys as table.constraint
+    """
+    cursor.execute(
+        """SELECT rc.table_name, rc.constraint_name, rc.referenced_table_name, rc.delete_rule,
+                  GROUP_CONCAT(kcu.column_name ORDER BY kcu.ordinal_position),
+                  GROUP_CONCAT(kcu.referenced_column_name ORDER BY kcu.ordinal_position)
+           FROM information_schema.referential_constraints rc
+           JOIN information_schema.key_column_usage kcu
+             ON kcu.constraint_schema = rc.constraint_schema AND kcu.table_name = rc.table_name
+            AND kcu.constraint_name = rc.constraint_name
+           WHERE rc.constraint_schema = DATABASE() AND (rc.table_name = %s OR rc.referenced_table_name = %s)
+           GROUP BY rc.table_name, rc.constraint_name, rc.referenced_table_name, rc.delete_rule""",
+        (table, table)
+    )
+    dropped = []
+    for owner, constraint, referenced, delete_rule, columns, referenced_columns in cursor.fetchall():
+        definition = f"FOREIGN KEY ({columns}) REFERENCES {referenced} ({referenced_columns}) ON DELETE {delete_rule}"
+        logger.warning(f"Dropping foreign key {constraint} on {owner} for partitioning: {definition}")
+        cursor.execute(f"ALTER TABLE {owner} DROP FOREIGN KEY {constraint}")
+        cursor.execute(
+            "INSERT INTO audit_log (action, entity_type, old_values) VALUES (%s, %s, %s)",
+            ("Foreign Key Dropped", owner, json.dumps({'constraint': constraint, 'definition': definition}))
+        )
+        dropped.append(f"{owner}.{constraint}")
+    return dropped
+
+
+def partition_table(cursor: Any, table: str, months_ahead: int = PARTITION_MONTHS_AHEAD) -> None:
+    """
+    Convert a table to monthly RANGE partitions on created_at
+
+    The primary key becomes (id, created_at), since MySQL requires the
+    partitioning column in every unique key. Existing rows are spread over
+    one partition per month from the oldest row up to months_ahead months
+    from now. Safe to re-run: an already partitioned table is left alone.
+
+    Args:
+        cursor: Cursor on the application database
+        table: One of PARTITIONED_TABLES
+        months_ahead: Future months to create partitions for
+    """
+    if list_partitions(cursor, table):
+        return
+
+    dropped = _drop_foreign_keys(cursor, table)
+    if dropped:
+        logger.warning(f"Referential integrity of {table} is now enforced by the application only "
+                       f"(dropped {', '.join(dropped)})")
+    cursor.execute(f"UPDATE {table} SET created_at = NOW() WHERE created_at IS NULL")
+    cursor.execute(
+        f"""ALTER TABLE {table}
+            MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, created_at)"""
+    )
+
+    cursor.execute(f"SELECT MIN(created_at) FROM {table}")
+    oldest = cursor.fetchone()[0]
+    current = month_start(date.today())
+    month = month_start(oldest) if oldest else current
+    last = add_months(current, months_ahead)
+
+    definitions = []
+    while month <= last:
+        definitions.append(_partition_definition(month))
+        month = add_months(month, 1)
+    definitions.append(_max_partition_definition())
+
+    logger.info(f"Partitioning {table} into {len(definitions)} partitions")
+    cursor.execute(
+        f"ALTER TABLE {table} PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) ({', '.join(definitions)})"
+    )
+
+
+def add_future_partitions(cursor: Any, table: str, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Create monthly partitions up to months_ahead months from now
+
+    New partitions are split off the catch-all partition, which is empty
+    as long as this runs at least once every months_ahead months.
+
+    Returns:
+        list: Names of the partitions created
+    """
+    names = list_partitions(cursor, table)
+    months = [month for month in map(_partition_month, names) if month]
+    if not months:
+        return []
+
+    month = add_months(max(months), 1)
+    last = add_months(month_start(date.today()), months_ahead)
+    added: List[date] = []
+    while month <= last:
+        added.append(month)
+        month = add_months(month, 1)
+    if not added:
+        return []
+
+    definitions = [_partition_definition(month) for month in added] + [_max_partition_definition()]
+    cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(definitions)})")
+    return [partition_name(month) for month in added]
+
+
+def expired_partitions(cursor: Any, table: str, cutoff: datetime) -> List[str]:
+    """Partitions whose rows were all created before cutoff"""
+    expired = []
+    for name in list_partitions(cursor, table):
+        month = _partition_month(name)
+        if month and datetime.combine(add_months(month, 1), datetime.min.time()) <= cutoff:
+            expired.append(name)
+    return expired
+
+
+def drop_expired_results(conn: Any, cutoff: datetime) -> int:
+    """
+    Drop whole result partitions created before cutoff
+
+    Deleting a month this way is a metadata change instead of a row by row
+    DELETE. The pass/fail counters are reduced by the dropped results first;
+    if dropping then fails they are rebuilt from the remaining rows.
+
+    Args:
+        conn: Open MySQL connection
+        cutoff: Rows created before this time are expired
+
+    Returns:
+        int: Number of test results dropped
+    """
+    cursor = conn.cursor(buffered=True)
+    try:
+        results = expired_partitions(cursor, 'test_results', cutoff)
+        if not results:
+            return 0
+
+        cursor.execute(
+            f"""SELECT test_case_id, user_id,
+                       COUNT(*),
+                       SUM(CASE WHEN overall_pass = 1 THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN overall_pass = 0 THEN 1 ELSE 0 END)
+                FROM test_results PARTITION ({', '.join(results)})
+                GROUP BY test_case_id, user_id"""
+        )
+        dropped = 0
+        for test_case_id, user_id, total, passed, failed in cursor.fetchall():
+            statistics.apply_result_delta(cursor, test_case_id, user_id,
+                                          -int(total), -int(passed or 0), -int(failed or 0))
+            dropped += int(total)
+        conn.commit()
+
+        try:
+            for table in PARTITIONED_TABLES:
+                names = expired_partitions(cursor, table, cutoff)
+                if names:
+                    cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(names)}")
+                    logger.info(f"Dropped partitions {', '.join(names)} from {table}")
+        except Exception:
+            statistics.rebuild_statistics(cursor)
+            conn.commit()
+            raise
+        return dropped
+    finally:
+        cursor.close()
+
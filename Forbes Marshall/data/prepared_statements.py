@@ -0,0 +1,83 @@
+"""
+Prepared Statements - MySQL Implementation
+Server-side prepared statements for the hot Database calls, reused per pooled connection
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Statements prepared once per connection and then executed by name
+STATEMENTS: Dict[str, str] = {
+    'get_user_id': "SELECT id FROM users WHERE username = %s",
+    'get_test_stages': "SELECT * FROM test_stages WHERE test_case_id = %s ORDER BY stage_number",
+    'save_test_result': (
+        "INSERT INTO test_results (test_case_id, user_id, pcb_serial_number, status, overall_pass, notes) "
+        "VALUES (%s, %s, %s, %s, %s, %s)"
+    ),
+    'save_stage_result': (
+        "INSERT INTO test_stage_results (test_result_id, stage_id, voltage_measured, current_measured, "
+        "resistance_measured, status, failure_reason, start_time, end_time) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), NOW())"
+    ),
+}
+
+
+class StatementRegistry:
+    """
+    Prepared cursors for one connection, one cursor per statement
+
+    A prepared cursor keeps the server-side statement of the last query it
+    ran, so giving every statement its own cursor means each is parsed by
+    the server once and afterwards only its parameters are sent.
+    """
+
+    def __init__(self, conn: Any) -> None:
+        self.conn = conn
+        self._cursors: Dict[str, Any] = {}
+
+    def _cursor(self, name: str) -> Any:
+        """Return the prepared cursor for a registered statement"""
+        if name not in STATEMENTS:
+            raise KeyError(f"Unknown prepared statement: {name}")
+        cursor = self._cursors.get(name)
+        if cursor is None:
+            cursor = self.conn.cursor(prepared=True)
+            self._cursors[name] = cursor
+        return cursor
+
+    def execute(self, name: str, params: Sequence[Any] = ()) -> Any:
+        """
+        Execute a registered write statement
+
+        Returns:
+            The prepared cursor, for lastrowid / rowcount
+        """
+        cursor = self._cursor(name)
+        cursor.execute(STATEMENTS[name], tuple(params))
+        return cursor
+
+    def fetch_all(self, name: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """Execute a registered query and return its rows as dictionaries"""
+        cursor = self._cursor(name)
+        cursor.execute(STATEMENTS[name], tuple(params))
+        # Prepared cursors are unbuffered: read everything before the
+        # connection is used by another cursor
+        rows = cursor.fetchall()
+        columns = cursor.column_names
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetch_one(self, name: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        """Execute a registered query and return its first row"""
+        rows = self.fetch_all(name, params)
+        return rows[0] if rows else None
+
+    def close(self) -> None:
+        """Close every prepared cursor, deallocating the statements on the server"""
+        for cursor in self._cursors.values():
+            try:
+                cursor.close()
+            except Exception as e:
+                logger.warning(f"Error closing prepared statement: {e}")
+        self._cursors.clear()
@@ -0,0 +1,236 @@
+"""
+Retention Purge - MySQL Implementation
+Deletes expired rows in small primary-key ordered batches, optionally archiving them first
+"""
+import os
+import gzip
+import json
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from config.config import RETENTION_BATCH_SIZE, RETENTION_SLEEP_SECONDS
+from data import statistics
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Called with (table, rows deleted so far) after each batch
+PurgeProgress = Callable[[str, int], None]
+
+
+class RetentionEngine:
+    """
+    Purge rows older than a cutoff without long-running locks
+
+    Each batch selects the next batch_size expired primary keys in id order,
+    optionally writes those rows (and their child rows) to a gzip NDJSON
+    archive, then deletes children first and parents second in one short
+    transaction. Every batch commits on its own, so an interrupted purge is
+    resumed simply by running it again: archive files are named after the
+    id range they hold and replaced atomically, so a repeated batch rewrites
+    the same file instead of duplicating it.
+    """
+
+    def __init__(self, conn: Any, batch_size: int = RETENTION_BATCH_SIZE,
+                 sleep_seconds: float = RETENTION_SLEEP_SECONDS, archive_dir: Optional[str] = None,
+                 progress: Optional[PurgeProgress] = None) -> None:
+        """
+        Args:
+            conn: Open MySQL connection used only by this engine
+            batch_size: Parent rows deleted per transaction
+            sleep_seconds: Pause between batches so other sessions get the locks
+            archive_dir: Write each batch here before deleting it (None to skip archiving)
+            progress: Called with (table, rows deleted so far) after each batch
+        """
+        self.conn = conn
+        self.batch_size = max(1, int(batch_size))
+        self.sleep_seconds = max(0.0, float(sleep_seconds))
+        self.archive_dir = archive_dir
+        self.progress = progress
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+
+    def _cutoff(self, cursor: Any, days: int) -> Any:
+        """Cutoff time, fixed once per purge so batches agree on what is expired"""
+        cursor.execute("SELECT DATE_SUB(NOW(), INTERVAL %s DAY) AS cutoff", (days,))
+        return cursor.fetchone()['cutoff']
+
+    def _next_ids(self, cursor: Any, table: str, time_column: str, cutoff: Any, after_id: int) -> List[int]:
+        # Walks the primary key from the last batch; expired rows have the lowest ids
+        cursor.execute(
+            f"""SELECT id FROM {table}
+                WHERE id > %s AND {time_column} < %s
+                ORDER BY id LIMIT %s""",
+            (after_id, cutoff, self.batch_size)
+        )
+        return [row['id'] for row in cursor.fetchall()]
+
+    def _archive(self, table: str, ids: Sequence[int], tables: Dict[str, List[Dict[str, Any]]]) -> str:
+        """Write one batch to <table>_<first id>_<last id>.ndjson.gz"""
+        path = os.path.join(self.archive_dir, f"{table}_{ids[0]:010d}_{ids[-1]:010d}.ndjson.gz")
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for name, rows in tables.items():
+                for row in rows:
+                    f.write(json.dumps({'table': name, 'row': row}, default=str) + '\n')
+        os.replace(tmp_path, path)
+        return path
+
+    def _finish_batch(self, table: str, deleted: int) -> None:
+        if self.progress:
+            self.progress(table, deleted)
+        if self.sleep_seconds:
+            time.sleep(self.sleep_seconds)
+
+    def purge_test_results(self, days: int) -> int:
+        """
+        Delete test results (and their stage results) created more than days ago
+
+        The maintained pass/fail counters are reduced by the deleted results.
+
+        Returns:
+            int: Number of test results deleted
+        """
+        cursor = self.conn.cursor(dictionary=True, buffered=True)
+        deleted = 0
+        last_id = 0
+        try:
+            cutoff = self._cutoff(cursor, days)
+            while True:
+                ids = self._next_ids(cursor, 'test_results', 'created_at', cutoff, last_id)
+                if not ids:
+                    break
+                if self.archive_dir:
+                    placeholders = ', '.join(['%s'] * len(ids))
+                    cursor.execute(f"SELECT * FROM test_results WHERE id IN ({placeholders})", tuple(ids))
+                    results = cursor.fetchall()
+                    cursor.execute(
+                        f"SELECT * FROM test_stage_results WHERE test_result_id IN ({placeholders})", tuple(ids)
+                    )
+                    self._archive('test_results', ids, {'test_results': results,
+                                                        'test_stage_results': cursor.fetchall()})
+
+                self._delete_results(cursor, ids)
+                deleted += len(ids)
+                last_id = ids[-1]
+                logger.info(f"Purged {deleted} test results (up to id {last_id})")
+                self._finish_batch('test_results', deleted)
+            return deleted
+        finally:
+            cursor.close()
+
+    def _delete_results(self, cursor: Any, ids: Sequence[int]) -> None:
+        """Delete one batch of test results with their stage results and counter updates"""
+        placeholders = ', '.join(['%s'] * len(ids))
+        try:
+            cursor.execute(
+                f"""SELECT test_case_id, user_id,
+                           COUNT(*) AS total,
+                           SUM(CASE WHEN overall_pass = 1 THEN 1 ELSE 0 END) AS passed,
+                           SUM(CASE WHEN overall_pass = 0 THEN 1 ELSE 0 END) AS failed
+                    FROM test_results WHERE id IN ({placeholders})
+                    GROUP BY test_case_id, user_id""",
+                tuple(ids)
+            )
+            for row in cursor.fetchall():
+                statistics.apply_result_delta(
+                    cursor, row['test_case_id'], row['user_id'],
+                    -int(row['total']), -int(row['passed'] or 0), -int(row['failed'] or 0)
+                )
+            # Children first so the delete never trips the foreign key
+            cursor.execute(
+                f"DELETE FROM test_stage_results WHERE test_result_id IN ({placeholders})", tuple(ids)
+            )
+            cursor.execute(f"DELETE FROM test_results WHERE id IN ({placeholders})", tuple(ids))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def delete_test_results(self, ids: Sequence[int]) -> int:
+        """
+        Delete specific test results (and their stage results) in batches
+
+        Returns:
+            int: Number of test results deleted
+        """
+        ids = sorted(ids)
+        cursor = self.conn.cursor(dictionary=True, buffered=True)
+        deleted = 0
+        try:
+            for i in range(0, len(ids), self.batch_size):
+                batch = ids[i:i + self.batch_size]
+                self._delete_results(cursor, batch)
+                deleted += len(batch)
+                self._finish_batch('test_results', deleted)
+            return deleted
+        finally:
+            cursor.close()
+
+    def delete_stage_results(self, test_result_ids: Sequence[int]) -> int:
+        """
+        Delete the stage results of specific test results in batches
+
+        Used after a partition drop, which removes stage results by their own
+        created_at and so misses those of runs that crossed into a later month.
+
+        Returns:
+            int: Number of stage results deleted
+        """
+        ids = sorted(test_result_ids)
+        cursor = self.conn.cursor(dictionary=True, buffered=True)
+        deleted = 0
+        try:
+            for i in range(0, len(ids), self.batch_size):
+                batch = ids[i:i + self.batch_size]
+                placeholders = ', '.join(['%s'] * len(batch))
+                try:
+                    cursor.execute(
+                        f"DELETE FROM test_stage_results WHERE test_result_id IN ({placeholders})", tuple(batch)
+                    )
+                    deleted += cursor.rowcount
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+                self._finish_batch('test_stage_results', deleted)
+            return deleted
+        finally:
+            cursor.close()
+
+    def purge_audit_logs(self, days: int) -> int:
+        """
+        Delete audit log entries recorded more than days ago
+
+        Returns:
+            int: Number of audit log entries deleted
+        """
+        cursor = self.conn.cursor(dictionary=True, buffered=True)
+        deleted = 0
+        last_id = 0
+        try:
+            cutoff = self._cutoff(cursor, days)
+            while True:
+                ids = self._next_ids(cursor, 'audit_log', 'timestamp', cutoff, last_id)
+                if not ids:
+                    break
+                placeholders = ', '.join(['%s'] * len(ids))
+
+                if self.archive_dir:
+                    cursor.execute(f"SELECT * FROM audit_log WHERE id IN ({placeholders})", tuple(ids))
+                    self._archive('audit_log', ids, {'audit_log': cursor.fetchall()})
+
+                try:
+                    cursor.execute(f"DELETE FROM audit_log WHERE id IN ({placeholders})", tuple(ids))
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+
+                deleted += len(ids)
+                last_id = ids[-1]
+                logger.info(f"Purged {deleted} audit log entries (up to id {last_id})")
+                self._finish_batch('audit_log', deleted)
+            return deleted
+        finally:
+            cursor.close()
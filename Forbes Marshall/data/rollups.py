@@ -0,0 +1,217 @@
+"""
+Daily Rollups - MySQL Implementation
+Per day, test case, stage and user counts and measurement aggregates for reports and dashboards
+"""
+import math
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from config.config import STATUS_PASS, STATUS_FAIL
+from data.statistics import dialect, pass_fail
+
+# stage_id of the rows that count whole test runs (by overall_pass);
+# rows with a real stage_id count stage results (by stage status)
+RUN_STAGE_ID = 0
+
+MEASUREMENTS = ("voltage", "current", "resistance")
+
+KEY_COLUMNS = ("day", "test_case_id", "stage_id", "user_id")
+COUNT_COLUMNS = ("total", "passed", "failed")
+# Added together when rows are merged; *_min / *_max take the smaller / larger value
+SUM_COLUMNS = COUNT_COLUMNS + tuple(f"{name}_{part}" for name in MEASUREMENTS
+                                    for part in ("count", "sum", "sum_sq"))
+MIN_COLUMNS = tuple(f"{name}_min" for name in MEASUREMENTS)
+MAX_COLUMNS = tuple(f"{name}_max" for name in MEASUREMENTS)
+COLUMNS = KEY_COLUMNS + COUNT_COLUMNS + tuple(
+    f"{name}_{part}" for name in MEASUREMENTS for part in ("count", "min", "max", "sum", "sum_sq")
+)
+
+
+def _measurement_aggregates(name: str) -> str:
+    value = f"tsr.{name}_measured"
+    return (f"COUNT({value}), MIN({value}), MAX({value}), "
+            f"COALESCE(SUM({value}), 0), COALESCE(SUM({value} * {value}), 0)")
+
+
+# Rollup rows for the test runs / stage results matching {where}; both are
+# used for incremental updates (one run) and for backfills (a day range)
+_RUN_SELECT = f"""
+    SELECT DATE(tr.start_time), tr.test_case_id, {RUN_STAGE_ID}, tr.user_id,
+           COUNT(*),
+           SUM(CASE WHEN tr.overall_pass = 1 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN tr.overall_pass = 0 THEN 1 ELSE 0 END),
+           {', '.join(['0, NULL, NULL, 0, 0'] * len(MEASUREMENTS))}
+    FROM test_results tr
+    WHERE {{where}}
+    GROUP BY DATE(tr.start_time), tr.test_case_id, tr.user_id
+"""
+_STAGE_SELECT = f"""
+    SELECT DATE(tr.start_time), tr.test_case_id, tsr.stage_id, tr.user_id,
+           COUNT(*),
+           SUM(CASE WHEN tsr.status = '{STATUS_PASS}' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN tsr.status = '{STATUS_FAIL}' THEN 1 ELSE 0 END),
+           {', '.join(_measurement_aggregates(name) for name in MEASUREMENTS)}
+    FROM test_stage_results tsr
+    JOIN test_results tr ON tr.id = tsr.test_result_id
+    WHERE {{where}}
+    GROUP BY DATE(tr.start_time), tr.test_case_id, tsr.stage_id, tr.user_id
+"""
+
+
+def _merge_clause(sql_dialect: str) -> str:
+    """Conflict clause adding a new rollup row onto an existing one"""
+    if sql_dialect == "sqlite":
+        new, smaller, larger = "excluded.{}", "MIN", "MAX"
+        clause = f"ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET "
+    else:
+        new, smaller, larger = "VALUES({})", "LEAST", "GREATEST"
+        clause = "ON DUPLICATE KEY UPDATE "
+
+    # LEAST/GREATEST (and SQLite's scalar MIN/MAX) return NULL if either side
+    # is NULL, so fall back to whichever side has a value
+    assignments = [f"{column} = {column} + {new.format(column)}" for column in SUM_COLUMNS]
+    for func, columns in ((smaller, MIN_COLUMNS), (larger, MAX_COLUMNS)):
+        assignments += [f"{column} = COALESCE({func}({column}, {new.format(column)}), "
+                        f"{column}, {new.format(column)})" for column in columns]
+    return clause + ", ".join(assignments)
+
+
+def _upsert(cursor: Any, select: str, where: str, params: Tuple) -> None:
+    # SQLite needs the WHERE in INSERT ... SELECT to parse ON CONFLICT, which every caller has
+    cursor.execute(
+        f"INSERT INTO daily_rollups ({', '.join(COLUMNS)}) {select.format(where=where)} "
+        f"{_merge_clause(dialect(cursor))}",
+        params
+    )
+
+
+def record_test_run(cursor: Any, test_result_id: int) -> None:
+    """
+    Add a newly saved test result and its stage results to the rollups
+
+    Runs on the caller's cursor so the rollups commit (or roll back) in the
+    same transaction as the rows they summarise.
+    """
+    _upsert(cursor, _RUN_SELECT, "tr.id = %s", (test_result_id,))
+    _upsert(cursor, _STAGE_SELECT, "tsr.test_result_id = %s", (test_result_id,))
+
+
+def record_stage_result(cursor: Any, stage_result_id: int) -> None:
+    """Add a single newly saved stage result to the rollups"""
+    _upsert(cursor, _STAGE_SELECT, "tsr.id = %s", (stage_result_id,))
+
+
+def record_outcome_change(cursor: Any, day: Any, test_case_id: int, user_id: int,
+                          old_pass: Optional[bool], new_pass: Optional[bool]) -> None:
+    """Move an existing test result between the passed/failed counts of its day"""
+    old_passed, old_failed = pass_fail(old_pass)
+    new_passed, new_failed = pass_fail(new_pass)
+    if (old_passed, old_failed) == (new_passed, new_failed):
+        return
+    cursor.execute(
+        """UPDATE daily_rollups SET passed = passed + %s, failed = failed + %s
+           WHERE day = %s AND test_case_id = %s AND stage_id = %s AND user_id = %s""",
+        (new_passed - old_passed, new_failed - old_failed, day, test_case_id, RUN_STAGE_ID, user_id)
+    )
+
+
+def result_days(cursor: Any) -> Tuple[Optional[date], Optional[date]]:
+    """First and last day with test results, or (None, None) if there are none"""
+    cursor.execute("SELECT MIN(start_time) AS first_start, MAX(start_time) AS last_start FROM test_results")
+    row = cursor.fetchone()
+    first, last = (row['first_start'], row['last_start']) if isinstance(row, dict) else row
+    return _to_date(first), _to_date(last)
+
+
+def rebuild_rollups(cursor: Any, start_day: date, end_day: date) -> None:
+    """
+    Recompute the rollups of start_day through end_day from the raw results
+
+    Days outside the range are left alone, so rollups of results that have
+    since been purged or archived are kept.
+    """
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+    cursor.execute("DELETE FROM daily_rollups WHERE day >= %s AND day <= %s", (start_day, end_day))
+    _upsert(cursor, _RUN_SELECT, "tr.start_time >= %s AND tr.start_time < %s", (start, end))
+    _upsert(cursor, _STAGE_SELECT, "tr.start_time >= %s AND tr.start_time < %s", (start, end))
+
+
+def rebuild_all_rollups(cursor: Any) -> None:
+    """Recompute the rollups of every day that still has test results"""
+    first, last = result_days(cursor)
+    if first is not None:
+        rebuild_rollups(cursor, first, last)
+
+
+def _to_date(value: Any) -> Optional[date]:
+    if value is None or (isinstance(value, date) and not isinstance(value, datetime)):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+def measurement_summary(row: Dict[str, Any], name: str) -> Dict[str, Optional[float]]:
+    """
+    Count, min, max, mean and standard deviation of one measurement in a rollup row
+
+    row may also be several rollup rows summed together (with min/max taken
+    over them), since the stored sums combine by addition.
+    """
+    count = int(row.get(f"{name}_count") or 0)
+    if not count:
+        return {'count': 0, 'min': None, 'max': None, 'mean': None, 'stddev': None}
+    total = float(row[f"{name}_sum"])
+    mean = total / count
+    # Population variance from the running sums; clamp rounding noise below zero
+    variance = max(0.0, float(row[f"{name}_sum_sq"]) / count - mean * mean)
+    return {
+        'count': count,
+        'min': float(row[f"{name}_min"]),
+        'max': float(row[f"{name}_max"]),
+        'mean': mean,
+        'stddev': math.sqrt(variance)
+    }
+
+
+def rollup_filters(start_day: Optional[date] = None, end_day: Optional[date] = None,
+                   user_id: Optional[int] = None, alias: str = "") -> Tuple[str, List[Any]]:
+    """Build the condition and parameters selecting rollup rows (always at least "1 = 1")"""
+    prefix = f"{alias}." if alias else ""
+    conditions = ["1 = 1"]
+    params: List[Any] = []
+    if start_day:
+        conditions.append(f"{prefix}day >= %s")
+        params.append(start_day)
+    if end_day:
+        conditions.append(f"{prefix}day <= %s")
+        params.append(end_day)
+    if user_id is not None:
+        conditions.append(f"{prefix}user_id = %s")
+        params.append(user_id)
+    return " AND ".join(conditions), params
+
+
+def stage_summary_query(where: str = "1 = 1") -> str:
+    """Rollup rows of matching days combined per test case and stage"""
+    sums = ", ".join(f"SUM({column}) AS {column}" for column in SUM_COLUMNS)
+    mins = ", ".join(f"MIN({column}) AS {column}" for column in MIN_COLUMNS)
+    maxs = ", ".join(f"MAX({column}) AS {column}" for column in MAX_COLUMNS)
+    return f"""
+        SELECT test_case_id, stage_id, {sums}, {mins}, {maxs}
+        FROM daily_rollups
+        WHERE stage_id <> {RUN_STAGE_ID} AND {where}
+        GROUP BY test_case_id, stage_id
+        ORDER BY test_case_id, stage_id
+    """
+
+
+def rollup_days(start_day: date, end_day: date, days_per_batch: int) -> List[Tuple[date, date]]:
+    """Split a day range into consecutive (first, last) batches"""
+    batches = []
+    first = start_day
+    while first <= end_day:
+        last = min(end_day, first + timedelta(days=max(1, days_per_batch) - 1))
+        batches.append((first, last))
+        first = last + timedelta(days=1)
+    return batches
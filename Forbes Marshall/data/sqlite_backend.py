@@ -0,0 +1,405 @@
+"""
+SQLite Backend - Local Station Storage
+Per-thread SQLite connections that accept the MySQL-style SQL used by Database
+"""
+import re
+import sqlite3
+import threading
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple
+from config.config import SQLITE_DB_PATH
+from data.prepared_statements import StatementRegistry
+from data.traceability import SERIAL_NORMALIZE_SQL
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Lets shared SQL helpers (e.g. data.statistics) pick the right dialect
+DIALECT = "sqlite"
+
+# Milliseconds a writer waits for another thread's transaction before failing
+BUSY_TIMEOUT_MS = 5000
+
+# Local time, matching MySQL's NOW() / CURRENT_TIMESTAMP on a station
+_LOCAL_NOW = "datetime('now', 'localtime')"
+
+# Timestamps and dates are stored as ISO text and read back as datetime / date, like MySQL
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+# Ordered list of (version, description, script); the applied version is
+# kept in PRAGMA user_version. Mirrors data/migrations.py for MySQL.
+SCHEMA: List[Tuple[int, str, str]] = [
+    (1, "Baseline schema", f"""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('Admin', 'Manager', 'Tester')),
+            email TEXT,
+            created_at TIMESTAMP DEFAULT ({_LOCAL_NOW}),
+            is_active BOOLEAN DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+
+        CREATE TABLE IF NOT EXISTS test_cases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            voltage_min REAL NOT NULL,
+            voltage_max REAL NOT NULL,
+            current_min REAL NOT NULL,
+            current_max REAL NOT NULL,
+            resistance_min REAL NOT NULL,
+            resistance_max REAL NOT NULL,
+            created_by INTEGER NOT NULL REFERENCES users(id),
+            created_at TIMESTAMP DEFAULT ({_LOCAL_NOW}),
+            updated_at TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+
+        CREATE TABLE IF NOT EXISTS test_stages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            test_case_id INTEGER NOT NULL REFERENCES test_cases(id) ON DELETE CASCADE,
+            stage_number INTEGER NOT NULL,
+            stage_name TEXT NOT NULL,
+            description TEXT,
+            voltage_min REAL,
+            voltage_max REAL,
+            current_min REAL,
+            current_max REAL,
+            resistance_min REAL,
+            resistance_max REAL,
+            duration_seconds INTEGER,
+            created_at TIMESTAMP DEFAULT ({_LOCAL_NOW}),
+            updated_at TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+        CREATE INDEX IF NOT EXISTS idx_test_stages_test_case_id ON test_stages(test_case_id);
+
+        CREATE TABLE IF NOT EXISTS test_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            test_case_id INTEGER NOT NULL REFERENCES test_cases(id),
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            pcb_serial_number TEXT,
+            status TEXT NOT NULL CHECK(status IN ('Pass', 'Fail', 'In Progress')),
+            overall_pass BOOLEAN,
+            start_time TIMESTAMP DEFAULT ({_LOCAL_NOW}),
+            end_time TIMESTAMP,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+        CREATE INDEX IF NOT EXISTS idx_test_results_test_case_id ON test_results(test_case_id);
+        CREATE INDEX IF NOT EXISTS idx_start_time_id ON test_results(start_time, id);
+        CREATE INDEX IF NOT EXISTS idx_user_start_time ON test_results(user_id, start_time, id);
+
+        CREATE TABLE IF NOT EXISTS test_stage_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            test_result_id INTEGER NOT NULL REFERENCES test_results(id) ON DELETE CASCADE,
+            stage_id INTEGER NOT NULL REFERENCES test_stages(id),
+            voltage_measured REAL,
+            current_measured REAL,
+            resistance_measured REAL,
+            status TEXT NOT NULL CHECK(status IN ('Pass', 'Fail', 'Not Run')),
+            failure_reason TEXT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            created_at TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+        CREATE INDEX IF NOT EXISTS idx_test_result_id ON test_stage_results(test_result_id);
+
+        CREATE TABLE IF NOT EXISTS jig_diagrams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            test_case_id INTEGER REFERENCES test_cases(id) ON DELETE SET NULL,
+            diagram_name TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            description TEXT,
+            uploaded_by INTEGER NOT NULL REFERENCES users(id),
+            uploaded_at TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+
+        CREATE TABLE IF NOT EXISTS communication_config (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            config_name TEXT NOT NULL,
+            com_port TEXT,
+            baud_rate INTEGER DEFAULT 9600,
+            data_bits INTEGER DEFAULT 8,
+            stop_bits INTEGER DEFAULT 1,
+            parity TEXT DEFAULT 'None',
+            timeout_seconds INTEGER DEFAULT 5,
+            created_by INTEGER NOT NULL REFERENCES users(id),
+            created_at TIMESTAMP DEFAULT ({_LOCAL_NOW}),
+            updated_at TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+
+        CREATE TABLE IF NOT EXISTS test_statistics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            test_case_id INTEGER NOT NULL UNIQUE REFERENCES test_cases(id) ON DELETE CASCADE,
+            total_tests INTEGER DEFAULT 0,
+            passed_tests INTEGER DEFAULT 0,
+            failed_tests INTEGER DEFAULT 0,
+            pass_rate REAL DEFAULT 0.0,
+            last_updated TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users(id),
+            action TEXT NOT NULL,
+            entity_type TEXT,
+            entity_id INTEGER,
+            old_values TEXT,
+            new_values TEXT,
+            timestamp TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+        CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_log(timestamp);
+
+        CREATE TABLE IF NOT EXISTS summary_statistics (
+            scope TEXT NOT NULL CHECK(scope IN ('global', 'user')),
+            scope_id INTEGER NOT NULL,
+            total_tests INTEGER DEFAULT 0,
+            passed_tests INTEGER DEFAULT 0,
+            failed_tests INTEGER DEFAULT 0,
+            last_updated TIMESTAMP DEFAULT ({_LOCAL_NOW}),
+            PRIMARY KEY (scope, scope_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS spool_applied (
+            journal_id TEXT PRIMARY KEY,
+            test_result_id INTEGER NOT NULL,
+            applied_at TIMESTAMP DEFAULT ({_LOCAL_NOW})
+        );
+
+        -- MySQL maintains these with ON UPDATE CURRENT_TIMESTAMP; test plans rely on them
+        CREATE TRIGGER IF NOT EXISTS trg_test_cases_updated_at AFTER UPDATE ON test_cases
+        WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE test_cases SET updated_at = {_LOCAL_NOW} WHERE id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_test_stages_updated_at AFTER UPDATE ON test_stages
+        WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE test_stages SET updated_at = {_LOCAL_NOW} WHERE id = NEW.id;
+        END;
+    """),
+    (2, "PCB serial number indexes for traceability", f"""
+        -- SQLite can only add VIRTUAL generated columns; they can still be indexed
+        ALTER TABLE test_results ADD COLUMN pcb_serial_normalized TEXT
+            GENERATED ALWAYS AS (UPPER(REPLACE(TRIM(pcb_serial_number), ' ', ''))) VIRTUAL;
+        CREATE INDEX IF NOT EXISTS idx_pcb_serial_number ON test_results(pcb_serial_number);
+        CREATE INDEX IF NOT EXISTS idx_pcb_serial_normalized
+            ON test_results(pcb_serial_normalized, start_time, id);
+    """),
+    (3, "Daily rollups of test results and stage measurements", """
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            day DATE NOT NULL,
+            test_case_id INTEGER NOT NULL,
+            stage_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            passed INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            voltage_count INTEGER NOT NULL DEFAULT 0,
+            voltage_min REAL,
+            voltage_max REAL,
+            voltage_sum REAL NOT NULL DEFAULT 0,
+            voltage_sum_sq REAL NOT NULL DEFAULT 0,
+            current_count INTEGER NOT NULL DEFAULT 0,
+            current_min REAL,
+            current_max REAL,
+            current_sum REAL NOT NULL DEFAULT 0,
+            current_sum_sq REAL NOT NULL DEFAULT 0,
+            resistance_count INTEGER NOT NULL DEFAULT 0,
+            resistance_min REAL,
+            resistance_max REAL,
+            resistance_sum REAL NOT NULL DEFAULT 0,
+            resistance_sum_sq REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, test_case_id, stage_id, user_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_rollup_test_case ON daily_rollups(test_case_id, stage_id, day);
+        CREATE INDEX IF NOT EXISTS idx_rollup_user ON daily_rollups(user_id, day);
+    """),
+    (4, "Strip tabs and line endings from normalized PCB serial numbers", f"""
+        -- A generated column's expression cannot be altered; drop and re-add it
+        DROP INDEX IF EXISTS idx_pcb_serial_normalized;
+        ALTER TABLE test_results DROP COLUMN pcb_serial_normalized;
+        ALTER TABLE test_results ADD COLUMN pcb_serial_normalized TEXT
+            GENERATED ALWAYS AS ({SERIAL_NORMALIZE_SQL}) VIRTUAL;
+        CREATE INDEX IF NOT EXISTS idx_pcb_serial_normalized
+            ON test_results(pcb_serial_normalized, start_time, id);
+    """),
+]
+
+
+@lru_cache(maxsize=256)
+def translate(query: str) -> str:
+    """
+    Rewrite the MySQL-specific bits of a query for SQLite
+
+    Only mechanical differences are handled here (placeholders, NOW(),
+    row locks, LIKE escapes); statements that need real dialect changes,
+    such as upserts, branch on DIALECT where they are written.
+    """
+    query = re.sub(r"\bLIKE\s+%s", "LIKE %s ESCAPE '\\\\'", query)
+    query = query.replace("NOW()", _LOCAL_NOW)
+    query = re.sub(r"\s+FOR\s+UPDATE\b", "", query)
+    return query.replace("%s", "?")
+
+
+def _dict_row(cursor: sqlite3.Cursor, row: tuple) -> dict:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """mysql.connector-style cursor over a sqlite3 cursor"""
+
+    dialect = DIALECT
+
+    def __init__(self, conn: sqlite3.Connection, dictionary: bool = False) -> None:
+        self._cursor = conn.cursor()
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def execute(self, query: str, params: Optional[Sequence[Any]] = None) -> None:
+        self._cursor.execute(translate(query), tuple(params or ()))
+
+    def executemany(self, query: str, seq_params: Sequence[Sequence[Any]]) -> None:
+        self._cursor.executemany(translate(query), [tuple(params) for params in seq_params])
+
+    def fetchone(self) -> Any:
+        return self._cursor.fetchone()
+
+    def fetchall(self) -> List[Any]:
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size: int = 1) -> List[Any]:
+        return self._cursor.fetchmany(size)
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def column_names(self) -> Tuple[str, ...]:
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """mysql.connector-style connection over a sqlite3 connection in WAL mode"""
+
+    dialect = DIALECT
+
+    # SQLite results are always fully readable; kept for ExportEngine
+    unread_result = False
+
+    def __init__(self, path: str = SQLITE_DB_PATH) -> None:
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000,
+                                     detect_types=sqlite3.PARSE_DECLTYPES)
+        # WAL lets the UI read while the write-behind worker writes, and with
+        # synchronous=NORMAL commits are appended to the WAL without an fsync
+        # each; the log is synced in batches at checkpoints.
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+
+    def cursor(self, dictionary: bool = False, buffered: Optional[bool] = None,
+               prepared: bool = False) -> SQLiteCursor:
+        # sqlite3 caches compiled statements per connection, so prepared
+        # cursors need no special handling
+        return SQLiteCursor(self._conn, dictionary=dictionary)
+
+    def executescript(self, script: str) -> None:
+        self._conn.executescript(script)
+
+    def consume_results(self) -> None:
+        pass
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def apply_schema(conn: SQLiteConnection) -> int:
+    """
+    Bring the SQLite schema up to date
+
+    Returns:
+        int: Schema version after running
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA user_version")
+    version = int(cursor.fetchone()[0])
+    for target, description, script in SCHEMA:
+        if target <= version:
+            continue
+        logger.info(f"Applying SQLite schema {target}: {description}")
+        conn.executescript(script)
+        conn.executescript(f"PRAGMA user_version = {target}")
+        version = target
+    cursor.close()
+    return version
+
+
+# Each thread keeps one connection until released, as with the MySQL pool
+_local = threading.local()
+
+
+def open_connection() -> SQLiteConnection:
+    """Open a new connection not shared with the calling thread (e.g. for exports)"""
+    return SQLiteConnection(SQLITE_DB_PATH)
+
+
+def get_connection() -> SQLiteConnection:
+    """Return the calling thread's connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = open_connection()
+        _local.conn = conn
+        _local.cursor = conn.cursor(dictionary=True)
+        _local.statements = StatementRegistry(conn)
+    return conn
+
+
+def get_cursor() -> SQLiteCursor:
+    """Return the dictionary cursor bound to the calling thread's connection"""
+    get_connection()
+    return _local.cursor
+
+
+def get_statements() -> StatementRegistry:
+    """Return the statement registry bound to the calling thread's connection"""
+    get_connection()
+    return _local.statements
+
+
+def release_connection() -> None:
+    """Close the calling thread's connection"""
+    conn = getattr(_local, 'conn', None)
+    statements = getattr(_local, 'statements', None)
+    _local.conn = None
+    _local.cursor = None
+    _local.statements = None
+    try:
+        if statements:
+            statements.close()
+        if conn:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Error closing SQLite connection: {e}")
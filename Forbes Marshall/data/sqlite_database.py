@@ -0,0 +1,64 @@
+"""
+Database Management - SQLite Implementation
+Local storage for standalone stations; selected with DB_BACKEND = "sqlite"
+"""
+import os
+import logging
+from typing import Any
+from config.config import SQLITE_DB_PATH
+from data import sqlite_backend
+from data.database import Database
+from data.prepared_statements import StatementRegistry
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+class SQLiteDatabase(Database):
+    """
+    Database with the same method surface, stored in a local SQLite file
+
+    Queries are shared with the MySQL implementation; sqlite_backend adapts
+    the connection and cursor API and the small dialect differences.
+    """
+
+    @property
+    def conn(self) -> Any:
+        """SQLite connection owned by the calling thread"""
+        return sqlite_backend.get_connection()
+
+    @property
+    def statements(self) -> StatementRegistry:
+        """Reusable statements for the hot calls on the thread's connection"""
+        return sqlite_backend.get_statements()
+
+    @property
+    def cursor(self) -> Any:
+        """Dictionary cursor bound to the calling thread's connection"""
+        return sqlite_backend.get_cursor()
+
+    @property
+    def read_cursor(self) -> Any:
+        """Same cursor as writes: there is no replica for a local file"""
+        return sqlite_backend.get_cursor()
+
+    def connect(self) -> None:
+        """Open this thread's connection"""
+        sqlite_backend.get_connection()
+
+    def close(self) -> None:
+        """Close this thread's connection"""
+        sqlite_backend.release_connection()
+
+    def _bootstrap_schema(self) -> None:
+        """Create the database file if needed, apply the schema and default users"""
+        directory = os.path.dirname(SQLITE_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        version = sqlite_backend.apply_schema(self.conn)
+        logger.info(f"SQLite database {SQLITE_DB_PATH}, schema version: {version}")
+        self._create_default_users()
+
+    def _open_export_connection(self) -> Any:
+        """Separate connection so streaming an export leaves the shared cursor usable"""
+        return sqlite_backend.open_connection()
@@ -0,0 +1,150 @@
+"""
+Test Statistics - MySQL Implementation
+Incrementally maintained pass/fail counters for test cases, users and the whole system
+"""
+from typing import Any, Optional
+
+# Scopes stored in the summary_statistics table
+SCOPE_GLOBAL = "global"
+SCOPE_USER = "user"
+
+# Upserts differ between MySQL (ON DUPLICATE KEY) and SQLite (ON CONFLICT);
+# the SQLite backend's cursors carry dialect = "sqlite"
+_TEST_STATISTICS_UPSERT = {
+    "mysql": """INSERT INTO test_statistics (test_case_id, total_tests, passed_tests, failed_tests, pass_rate)
+           VALUES (%s, %s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE
+           total_tests = total_tests + VALUES(total_tests),
+           passed_tests = passed_tests + VALUES(passed_tests),
+           failed_tests = failed_tests + VALUES(failed_tests),
+           pass_rate = IF(total_tests > 0, ROUND(passed_tests / total_tests * 100, 2), 0)""",
+    "sqlite": """INSERT INTO test_statistics (test_case_id, total_tests, passed_tests, failed_tests, pass_rate)
+           VALUES (%s, %s, %s, %s, %s)
+           ON CONFLICT (test_case_id) DO UPDATE SET
+           total_tests = total_tests + excluded.total_tests,
+           passed_tests = passed_tests + excluded.passed_tests,
+           failed_tests = failed_tests + excluded.failed_tests,
+           pass_rate = CASE WHEN total_tests + excluded.total_tests > 0
+                            THEN ROUND((passed_tests + excluded.passed_tests) * 100.0
+                                       / (total_tests + excluded.total_tests), 2)
+                            ELSE 0 END""",
+}
+_SUMMARY_UPSERT = {
+    "mysql": """INSERT INTO summary_statistics (scope, scope_id, total_tests, passed_tests, failed_tests)
+           VALUES (%s, 0, %s, %s, %s), (%s, %s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE
+           total_tests = total_tests + VALUES(total_tests),
+           passed_tests = passed_tests + VALUES(passed_tests),
+           failed_tests = failed_tests + VALUES(failed_tests)""",
+    "sqlite": """INSERT INTO summary_statistics (scope, scope_id, total_tests, passed_tests, failed_tests)
+           VALUES (%s, 0, %s, %s, %s), (%s, %s, %s, %s, %s)
+           ON CONFLICT (scope, scope_id) DO UPDATE SET
+           total_tests = total_tests + excluded.total_tests,
+           passed_tests = passed_tests + excluded.passed_tests,
+           failed_tests = failed_tests + excluded.failed_tests""",
+}
+_TEST_STATISTICS_SET = {
+    "mysql": """INSERT INTO test_statistics (test_case_id, total_tests, passed_tests, failed_tests, pass_rate)
+           VALUES (%s, %s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE
+           total_tests = VALUES(total_tests), passed_tests = VALUES(passed_tests),
+           failed_tests = VALUES(failed_tests), pass_rate = VALUES(pass_rate)""",
+    "sqlite": """INSERT INTO test_statistics (test_case_id, total_tests, passed_tests, failed_tests, pass_rate)
+           VALUES (%s, %s, %s, %s, %s)
+           ON CONFLICT (test_case_id) DO UPDATE SET
+           total_tests = excluded.total_tests, passed_tests = excluded.passed_tests,
+           failed_tests = excluded.failed_tests, pass_rate = excluded.pass_rate""",
+}
+
+
+def dialect(cursor: Any) -> str:
+    """SQL dialect of a cursor ("mysql" or "sqlite")"""
+    return getattr(cursor, 'dialect', "mysql")
+
+
+def pass_fail(overall_pass: Optional[bool]) -> tuple:
+    """Map an overall_pass value to (passed, failed) increments"""
+    if overall_pass is None:
+        return 0, 0
+    return (1, 0) if overall_pass else (0, 1)
+
+
+def apply_result_delta(cursor: Any, test_case_id: int, user_id: int,
+                       total: int, passed: int, failed: int) -> None:
+    """
+    Add deltas to the per test case, per user and global counters
+
+    Runs on the caller's cursor so the counters commit (or roll back) in the
+    same transaction as the result rows they describe.
+    """
+    if not (total or passed or failed):
+        return
+
+    # Rate of a newly inserted row; an existing row recomputes it from its updated counters
+    pass_rate = round(passed / total * 100, 2) if total > 0 else 0
+    cursor.execute(_TEST_STATISTICS_UPSERT[dialect(cursor)], (test_case_id, total, passed, failed, pass_rate))
+    cursor.execute(
+        _SUMMARY_UPSERT[dialect(cursor)],
+        (SCOPE_GLOBAL, total, passed, failed, SCOPE_USER, user_id, total, passed, failed)
+    )
+
+
+def record_result(cursor: Any, test_case_id: int, user_id: int, overall_pass: Optional[bool]) -> None:
+    """Count a newly saved test result"""
+    passed, failed = pass_fail(overall_pass)
+    apply_result_delta(cursor, test_case_id, user_id, 1, passed, failed)
+
+
+def record_outcome_change(cursor: Any, test_case_id: int, user_id: int,
+                          old_pass: Optional[bool], new_pass: Optional[bool]) -> None:
+    """Move an existing test result between the passed/failed counters"""
+    old_passed, old_failed = pass_fail(old_pass)
+    new_passed, new_failed = pass_fail(new_pass)
+    apply_result_delta(cursor, test_case_id, user_id, 0,
+                       new_passed - old_passed, new_failed - old_failed)
+
+
+def set_test_case_counts(cursor: Any, test_case_id: int, total: int, passed: int,
+                         failed: int, pass_rate: float) -> None:
+    """Overwrite the counters of one test case with freshly computed values"""
+    cursor.execute(_TEST_STATISTICS_SET[dialect(cursor)],
+                   (test_case_id, total, passed, failed, pass_rate))
+
+
+def rebuild_statistics(cursor: Any) -> None:
+    """
+    Recompute every counter from test_results
+
+    Used to backfill the counters and to repair them after bulk deletes.
+    """
+    cursor.execute("DELETE FROM test_statistics")
+    cursor.execute(
+        """INSERT INTO test_statistics (test_case_id, total_tests, passed_tests, failed_tests, pass_rate)
+           SELECT test_case_id,
+                  COUNT(*),
+                  SUM(CASE WHEN overall_pass = 1 THEN 1 ELSE 0 END),
+                  SUM(CASE WHEN overall_pass = 0 THEN 1 ELSE 0 END),
+                  ROUND(SUM(CASE WHEN overall_pass = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2)
+           FROM test_results
+           GROUP BY test_case_id"""
+    )
+    cursor.execute("DELETE FROM summary_statistics")
+    cursor.execute(
+        """INSERT INTO summary_statistics (scope, scope_id, total_tests, passed_tests, failed_tests)
+           SELECT %s, 0,
+                  COUNT(*),
+                  COALESCE(SUM(CASE WHEN overall_pass = 1 THEN 1 ELSE 0 END), 0),
+                  COALESCE(SUM(CASE WHEN overall_pass = 0 THEN 1 ELSE 0 END), 0)
+           FROM test_results""",
+        (SCOPE_GLOBAL,)
+    )
+    cursor.execute(
+        """INSERT INTO summary_statistics (scope, scope_id, total_tests, passed_tests, failed_tests)
+           SELECT %s, user_id,
+                  COUNT(*),
+                  SUM(CASE WHEN overall_pass = 1 THEN 1 ELSE 0 END),
+                  SUM(CASE WHEN overall_pass = 0 THEN 1 ELSE 0 END)
+           FROM test_results
+           GROUP BY user_id""",
+        (SCOPE_USER,)
+    )
@@ -0,0 +1,166 @@
+"""
+Test Plans - MySQL Implementation
+Compiled, cached test case + stage limits used by the test windows
+"""
+import math
+import threading
+import logging
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Measured parameters, in the order their limits are stored
+PARAMETERS = ("Voltage", "Current", "Resistance")
+UNITS = ("V", "A", "Ω")
+_LIMIT_COLUMNS = ("voltage_min", "voltage_max", "current_min", "current_max",
+                  "resistance_min", "resistance_max")
+
+# (test case updated_at, latest stage updated_at, stage count)
+PlanVersion = Tuple[Any, Any, int]
+
+_cache: Dict[int, "TestPlan"] = {}
+_cache_lock = threading.Lock()
+
+
+def _compile_limits(record: Dict[str, Any]) -> array:
+    """Pack min/max limits into floats, treating missing bounds as unbounded"""
+    limits = array('d')
+    for i, column in enumerate(_LIMIT_COLUMNS):
+        value = record.get(column)
+        if value is None:
+            limits.append(-math.inf if i % 2 == 0 else math.inf)
+        else:
+            limits.append(float(value))
+    return limits
+
+
+def _check(limits: array, voltage: float, current: float, resistance: float) -> Tuple[bool, bool, bool]:
+    """Compare measurements against packed limits"""
+    return (limits[0] <= voltage <= limits[1],
+            limits[2] <= current <= limits[3],
+            limits[4] <= resistance <= limits[5])
+
+
+def _failed(checks: Tuple[bool, bool, bool]) -> List[str]:
+    """Names of the parameters that failed"""
+    return [name for name, ok in zip(PARAMETERS, checks) if not ok]
+
+
+class PlanStage:
+    """One stage of a compiled test plan"""
+
+    __slots__ = ('stage_id', 'stage_number', 'name', 'duration_seconds', 'limits')
+
+    def __init__(self, stage: Dict[str, Any]) -> None:
+        self.stage_id: int = stage['id']
+        self.stage_number: int = stage['stage_number']
+        self.name: str = stage.get('stage_name') or f"Stage {stage['stage_number']}"
+        self.duration_seconds: Optional[int] = stage.get('duration_seconds')
+        self.limits: array = _compile_limits(stage)
+
+    def check(self, voltage: float, current: float, resistance: float) -> Tuple[bool, bool, bool]:
+        """Return (voltage_ok, current_ok, resistance_ok)"""
+        return _check(self.limits, voltage, current, resistance)
+
+    def failed_parameters(self, voltage: float, current: float, resistance: float) -> List[str]:
+        """Names of the parameters outside this stage's limits"""
+        return _failed(self.check(voltage, current, resistance))
+
+    def range(self, parameter: int) -> Tuple[float, float]:
+        """(min, max) for a parameter index into PARAMETERS"""
+        return self.limits[parameter * 2], self.limits[parameter * 2 + 1]
+
+
+class TestPlan:
+    """A test case and its stages, loaded once and checked with plain floats"""
+
+    __slots__ = ('test_case_id', 'name', 'description', 'version', 'limits', 'stages')
+
+    def __init__(self, test_case: Dict[str, Any], stages: List[Dict[str, Any]], version: PlanVersion) -> None:
+        self.test_case_id: int = test_case['id']
+        self.name: str = test_case['name']
+        self.description: Optional[str] = test_case.get('description')
+        self.version: PlanVersion = version
+        self.limits: array = _compile_limits(test_case)
+        self.stages: Tuple[PlanStage, ...] = tuple(PlanStage(stage) for stage in stages)
+
+    def check(self, voltage: float, current: float, resistance: float) -> Tuple[bool, bool, bool]:
+        """Check measurements against the test case level limits"""
+        return _check(self.limits, voltage, current, resistance)
+
+    def failed_parameters(self, voltage: float, current: float, resistance: float) -> List[str]:
+        """Names of the parameters outside the test case level limits"""
+        return _failed(self.check(voltage, current, resistance))
+
+
+def _get_version(cursor: Any, test_case_id: int) -> Optional[PlanVersion]:
+    """Read what a cached plan is validated against, or None if the test case is gone"""
+    cursor.execute(
+        """SELECT tc.updated_at,
+                  (SELECT MAX(ts.updated_at) FROM test_stages ts WHERE ts.test_case_id = tc.id) AS stages_updated_at,
+                  (SELECT COUNT(*) FROM test_stages ts WHERE ts.test_case_id = tc.id) AS stage_count
+           FROM test_cases tc
+           WHERE tc.id = %s""",
+        (test_case_id,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row['updated_at'], row['stages_updated_at'], int(row['stage_count'])
+
+
+def load_plan(cursor: Any, test_case_id: int) -> Optional[TestPlan]:
+    """
+    Get the compiled plan for a test case
+
+    A cached plan is reused while the test case's updated_at and its stages'
+    latest updated_at and count are unchanged; otherwise it is recompiled.
+
+    Args:
+        cursor: Dictionary cursor
+        test_case_id: Test case to load
+
+    Returns:
+        TestPlan: Compiled plan, or None if the test case does not exist
+    """
+    version = _get_version(cursor, test_case_id)
+    if version is None:
+        invalidate(test_case_id)
+        return None
+
+    with _cache_lock:
+        plan = _cache.get(test_case_id)
+    if plan is not None and plan.version == version:
+        return plan
+
+    cursor.execute("SELECT * FROM test_cases WHERE id = %s", (test_case_id,))
+    test_case = cursor.fetchone()
+    if not test_case:
+        return None
+    cursor.execute(
+        "SELECT * FROM test_stages WHERE test_case_id = %s ORDER BY stage_number, id",
+        (test_case_id,)
+    )
+    plan = TestPlan(test_case, cursor.fetchall(), version)
+
+    with _cache_lock:
+        _cache[test_case_id] = plan
+    logger.debug(f"Compiled test plan for test case {test_case_id} ({len(plan.stages)} stages)")
+    return plan
+
+
+def cached_plan(test_case_id: int) -> Optional[TestPlan]:
+    """Last compiled plan for a test case without checking it is current (for when MySQL is unreachable)"""
+    with _cache_lock:
+        return _cache.get(test_case_id)
+
+
+def invalidate(test_case_id: Optional[int] = None) -> None:
+    """Drop a cached plan, or every plan if no test case is given"""
+    with _cache_lock:
+        if test_case_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(test_case_id, None)
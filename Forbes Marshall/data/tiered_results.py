@@ -0,0 +1,176 @@
+"""
+Tiered Result Queries
+Answers test result queries across MySQL (hot) and the monthly archive files (cold)
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from data.database import Database, DBRecord, ResultsCursor, EXPORT_BATCH_SIZE
+from data.cold_archive import ColdArchive
+from data import traceability
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+def _sort_key(row: DBRecord) -> Tuple[datetime, int]:
+    return row['start_time'] or datetime.min, row['id']
+
+
+class TieredResults:
+    """
+    Same result query methods as Database, covering archived months too
+
+    Callers do not need to know whether a result is still in MySQL or has
+    been moved to the cold archive. If the archive cannot be read, results
+    from MySQL are still returned, unless raise_errors is set (as the
+    export does) to fail instead of returning partial results.
+    """
+
+    def __init__(self, db: Optional[Database] = None, archive: Optional[ColdArchive] = None) -> None:
+        self.db = db or Database()
+        self.archive = archive or ColdArchive()
+
+    def query_test_results(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                           start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                           serial_prefix: Optional[str] = None, limit: int = 100,
+                           after: Optional[ResultsCursor] = None,
+                           raise_errors: bool = False) -> Tuple[List[DBRecord], Optional[ResultsCursor]]:
+        """
+        Get one page of test results from both tiers, newest first
+
+        Takes the first page after the cursor from each tier and merges
+        them, so paging works exactly as with Database.query_test_results.
+
+        Returns:
+            tuple: (rows, cursor for the next page or None if this was the last page)
+        """
+        hot, hot_next = self.db.query_test_results(status, user_id, start_date, end_date,
+                                                   serial_prefix, limit, after, raise_errors)
+        try:
+            cold = self.archive.query_results(status, user_id, start_date, end_date,
+                                              serial_prefix, limit=limit + 1, after=after)
+        except Exception as e:
+            logger.error(f"Error querying archived test results: {e}")
+            if raise_errors:
+                raise
+            return hot, hot_next
+
+        rows = sorted(hot + cold, key=_sort_key, reverse=True)
+        if hot_next is None and len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, (last['start_time'], last['id'])
+
+    def count_test_results(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                           start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                           serial_prefix: Optional[str] = None) -> DBRecord:
+        """Get total/passed/failed counts from both tiers"""
+        counts = self.db.count_test_results(status, user_id, start_date, end_date, serial_prefix)
+        try:
+            cold = self.archive.count_results(status, user_id, start_date, end_date, serial_prefix)
+        except Exception as e:
+            logger.error(f"Error counting archived test results: {e}")
+            return counts
+        return {key: counts[key] + cold[key] for key in counts}
+
+    def get_stage_results_bulk(self, test_result_ids: List[int], batch_size: int = EXPORT_BATCH_SIZE,
+                               raise_errors: bool = False) -> Dict[int, List[DBRecord]]:
+        """Get stage results for many test results from both tiers (see Database.get_stage_results_bulk)"""
+        stages_by_result = self.db.get_stage_results_bulk(test_result_ids, batch_size, raise_errors)
+        try:
+            for result_id in test_result_ids:
+                hot = stages_by_result.get(result_id, [])
+                hot_ids = {stage['id'] for stage in hot}
+                archived = [stage for stage in self.archive.get_stage_results(result_id)
+                            if stage['id'] not in hot_ids]
+                stages_by_result[result_id] = archived + hot
+        except Exception as e:
+            logger.error(f"Error getting archived stage results: {e}")
+            if raise_errors:
+                raise
+        return stages_by_result
+
+    def get_result_stage_numbers(self, status: Optional[str] = None, user_id: Optional[int] = None,
+                                 start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                                 serial_prefix: Optional[str] = None, raise_errors: bool = False) -> List[int]:
+        """Get the distinct stage numbers recorded for the filtered test results in both tiers"""
+        numbers = self.db.get_result_stage_numbers(status, user_id, start_date, end_date,
+                                                   serial_prefix, raise_errors)
+        try:
+            cold = self.archive.get_result_stage_numbers(status, user_id, start_date, end_date, serial_prefix)
+        except Exception as e:
+            logger.error(f"Error getting archived stage numbers: {e}")
+            if raise_errors:
+                raise
+            return numbers
+        return sorted(set(numbers) | set(cold))
+
+    def export_test_results_with_stages(self, output_file: str, status: Optional[str] = None,
+                                        user_id: Optional[int] = None, start_date: Optional[datetime] = None,
+                                        end_date: Optional[datetime] = None, serial_prefix: Optional[str] = None,
+                                        batch_size: int = EXPORT_BATCH_SIZE) -> int:
+        """
+        Export filtered test results from both tiers to CSV with one column group per stage
+
+        Same file layout and error handling as Database.export_test_results_with_stages.
+
+        Returns:
+            int: Number of test results written
+        """
+        return self.db.export_test_results_with_stages(output_file, status, user_id, start_date, end_date,
+                                                       serial_prefix, batch_size, source=self)
+
+    def get_pcb_history(self, serial: str, user_id: Optional[int] = None) -> List[DBRecord]:
+        """Get every test run of one board from both tiers, oldest first (see Database.get_pcb_history)"""
+        runs = self.db.get_pcb_history(serial, user_id)
+        try:
+            archived = self.archive.query_results(user_id=user_id, serial=serial)
+        except Exception as e:
+            logger.error(f"Error getting archived PCB history: {e}")
+            return runs
+        if not archived:
+            return runs
+
+        test_cases = {test_case['id']: test_case['name'] for test_case in self.db.get_test_cases()}
+        usernames = {}
+        for result in archived:
+            if result['user_id'] not in usernames:
+                user = self.db.get_user_by_id(result['user_id'])
+                usernames[result['user_id']] = user['username'] if user else None
+            run = {field: result.get(field) for field in traceability.RUN_FIELDS}
+            run['test_case_name'] = test_cases.get(result['test_case_id'])
+            run['username'] = usernames[result['user_id']]
+            run['stages'] = [{field: stage.get(field) for field in traceability.STAGE_FIELDS}
+                             for stage in self.archive.get_stage_results(result['id'])]
+            runs.append(run)
+        return traceability.number_attempts(runs)
+
+    def get_test_result_by_id(self, result_id: int) -> Optional[DBRecord]:
+        """Get a test result from MySQL, or from the archive if it has been moved"""
+        result = self.db.get_test_result_by_id(result_id)
+        if result:
+            return result
+        try:
+            return self.archive.get_result(result_id)
+        except Exception as e:
+            logger.error(f"Error getting archived test result: {e}")
+            return None
+
+    def get_stage_results(self, test_result_id: int) -> List[DBRecord]:
+        """
+        Get all stage results for a test result from both tiers
+
+        Rows from both are merged, since a run archived before its stage rows
+        were all removed from MySQL can have some in each.
+        """
+        stage_results = self.db.get_stage_results(test_result_id)
+        try:
+            archived = self.archive.get_stage_results(test_result_id)
+        except Exception as e:
+            logger.error(f"Error getting archived stage results: {e}")
+            return stage_results
+        hot_ids = {stage['id'] for stage in stage_results}
+        # Archived rows were created first, so they come first in run order
+        return [stage for stage in archived if stage['id'] not in hot_ids] + stage_results
@@ -0,0 +1,76 @@
+"""
+PCB Traceability - MySQL Implementation
+Serial number normalization and per-board test history
+"""
+from typing import Any, Dict, List, Optional
+
+DBRecord = Dict[str, Any]
+
+# Characters dropped anywhere in a serial number: spaces, and the tabs and
+# line endings barcode scanners append
+SERIAL_STRIP_CHARS = (' ', '\t', '\r', '\n')
+
+# How the indexed pcb_serial_normalized column is computed from pcb_serial_number.
+# The characters go into the literals as-is, which MySQL and SQLite both accept.
+SERIAL_NORMALIZE_SQL = ("UPPER(" + "REPLACE(" * len(SERIAL_STRIP_CHARS) + "pcb_serial_number"
+                        + "".join(f", '{char}', '')" for char in SERIAL_STRIP_CHARS) + ")")
+_SERIAL_STRIP_TABLE = str.maketrans('', '', ''.join(SERIAL_STRIP_CHARS))
+
+# Run and stage fields returned by get_pcb_history
+RUN_FIELDS = ('id', 'test_case_id', 'test_case_name', 'user_id', 'username', 'pcb_serial_number',
+              'status', 'overall_pass', 'start_time', 'end_time', 'notes')
+STAGE_FIELDS = ('id', 'stage_id', 'stage_number', 'stage_name', 'voltage_measured',
+                'current_measured', 'resistance_measured', 'status', 'failure_reason')
+
+# One row per stage result (or per run without stages); stage columns are
+# aliased so they do not collide with the run columns
+HISTORY_QUERY = """
+    SELECT tr.id, tr.test_case_id, tc.name AS test_case_name, tr.user_id, u.username,
+           tr.pcb_serial_number, tr.status, tr.overall_pass, tr.start_time, tr.end_time, tr.notes,
+           tsr.id AS stage_result_id, tsr.stage_id, ts.stage_number, ts.stage_name,
+           tsr.voltage_measured, tsr.current_measured, tsr.resistance_measured,
+           tsr.status AS stage_status, tsr.failure_reason
+    FROM test_results tr
+    LEFT JOIN test_cases tc ON tc.id = tr.test_case_id
+    LEFT JOIN users u ON u.id = tr.user_id
+    LEFT JOIN test_stage_results tsr ON tsr.test_result_id = tr.id
+    LEFT JOIN test_stages ts ON ts.id = tsr.stage_id
+    WHERE tr.pcb_serial_normalized = %s {user_filter}
+    ORDER BY tr.start_time, tr.id, tsr.created_at, tsr.id
+"""
+
+
+def normalize_serial(serial: Optional[str]) -> str:
+    """Canonical form of a serial number: SERIAL_STRIP_CHARS removed, upper case (as SERIAL_NORMALIZE_SQL)"""
+    return (serial or '').translate(_SERIAL_STRIP_TABLE).upper()
+
+
+def group_history(rows: List[DBRecord]) -> List[DBRecord]:
+    """
+    Fold HISTORY_QUERY rows into runs, each with its stages
+
+    Returns:
+        list: Runs oldest first; each has RUN_FIELDS, 'stages' and 'attempt'
+              (1 for the first test of the board, 2 for the first retest, ...)
+    """
+    runs: Dict[int, DBRecord] = {}
+    for row in rows:
+        run = runs.get(row['id'])
+        if run is None:
+            run = {field: row.get(field) for field in RUN_FIELDS}
+            run['stages'] = []
+            runs[row['id']] = run
+        if row.get('stage_result_id') is not None:
+            stage = {field: row.get(field) for field in STAGE_FIELDS}
+            stage['id'] = row['stage_result_id']
+            stage['status'] = row['stage_status']
+            run['stages'].append(stage)
+    return number_attempts(list(runs.values()))
+
+
+def number_attempts(runs: List[DBRecord]) -> List[DBRecord]:
+    """Sort runs oldest first and number them as attempts"""
+    runs.sort(key=lambda run: (run['start_time'] is not None, run['start_time'], run['id']))
+    for attempt, run in enumerate(runs, 1):
+        run['attempt'] = attempt
+    return runs
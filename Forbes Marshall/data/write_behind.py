@@ -0,0 +1,325 @@
+"""
+Write-Behind Persistence
+Test runs are appended to a local journal and drained to MySQL by a background thread
+"""
+import os
+import json
+import uuid
+import threading
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from mysql.connector import errors
+from data.database import Database
+from config.config import SPOOL_DIR, SPOOL_BATCH_SIZE, SPOOL_RETRY_MIN_SECONDS, SPOOL_RETRY_MAX_SECONDS
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Errors caused by the data itself; retrying the same record cannot succeed
+PERMANENT_ERRORS = (errors.IntegrityError, errors.DataError, sqlite3.IntegrityError, sqlite3.DataError,
+                    KeyError, TypeError, ValueError)
+
+_TIME_FIELDS = ('start_time', 'end_time')
+
+
+class SpoolJournal:
+    """
+    Append-only NDJSON journal with a separately stored read offset
+
+    Every record is flushed and fsync'ed before append() returns. The offset
+    file holds the byte position of the first record not yet in MySQL and is
+    replaced atomically, so after a crash draining resumes where it stopped.
+    Lines that cannot be decoded are moved, byte for byte, to
+    dead_letter.raw instead of blocking the records behind them.
+    """
+
+    JOURNAL_FILE = "journal.ndjson"
+    OFFSET_FILE = "journal.offset"
+    DEAD_LETTER_FILE = "dead_letter.ndjson"
+    DEAD_LETTER_RAW_FILE = "dead_letter.raw"
+
+    def __init__(self, directory: str = SPOOL_DIR) -> None:
+        self.directory = directory
+        self.journal_path = os.path.join(directory, self.JOURNAL_FILE)
+        self.offset_path = os.path.join(directory, self.OFFSET_FILE)
+        self.dead_letter_path = os.path.join(directory, self.DEAD_LETTER_FILE)
+        self.dead_letter_raw_path = os.path.join(directory, self.DEAD_LETTER_RAW_FILE)
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._offset = self._read_offset()
+        if self._offset > self._journal_size():
+            # Left by an older version that truncated before resetting the offset;
+            # replaying is safe since stored runs are skipped by journal ID
+            logger.warning("Spool offset is past the end of the journal, replaying it from the start")
+            self._offset = 0
+        self._pending = self._count_pending()
+
+    def _recover(self) -> None:
+        """Drop a partially written last line left by a crash during append"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+                logger.warning("Discarded incomplete record at end of spool journal")
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self.offset_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, offset: int) -> None:
+        tmp_path = self.offset_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+
+    def _journal_size(self) -> int:
+        try:
+            return os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return 0
+
+    def _count_pending(self) -> int:
+        if not os.path.exists(self.journal_path):
+            return 0
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._offset)
+            return sum(1 for _ in f)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Durably append one record"""
+        line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        with self._lock:
+            with open(self.journal_path, 'ab') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending += 1
+
+    def read_pending(self, limit: int) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """
+        Read up to limit unacknowledged records, oldest first
+
+        An undecodable record at the head of the journal is moved to the raw
+        dead letter file and skipped.
+
+        Returns:
+            tuple: (records, journal offset just past each record)
+        """
+        records: List[Dict[str, Any]] = []
+        ends: List[int] = []
+        with self._lock:
+            if not self._pending:
+                return records, ends
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._offset)
+                while len(records) < limit:
+                    line = f.readline()
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        if records:
+                            # Return what precedes it; it is set aside on the next read
+                            break
+                        logger.error(f"Undecodable spool record moved to {self.DEAD_LETTER_RAW_FILE}: {e}")
+                        self._dead_letter_raw(line)
+                        self._advance(f.tell(), 1)
+                        continue
+                    records.append(record)
+                    ends.append(f.tell())
+        return records, ends
+
+    def ack(self, offset: int, count: int) -> None:
+        """Mark records up to offset as stored, compacting the journal once it is fully drained"""
+        with self._lock:
+            self._advance(offset, count)
+
+    def _advance(self, offset: int, count: int) -> None:
+        """Move the read offset past count records; lock must be held"""
+        self._pending = max(0, self._pending - count)
+        if self._pending == 0:
+            # Nothing left to drain: reset the offset durably before starting a
+            # fresh journal, so a crash in between only replays stored runs
+            self._write_offset(0)
+            open(self.journal_path, 'wb').close()
+            self._offset = 0
+        else:
+            self._offset = offset
+            self._write_offset(offset)
+
+    def dead_letter(self, record: Dict[str, Any], error: str) -> None:
+        """Keep a record that can never be stored, for manual inspection"""
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'error': error, 'record': record}, default=str) + '\n')
+
+    def _dead_letter_raw(self, line: bytes) -> None:
+        with open(self.dead_letter_raw_path, 'ab') as f:
+            f.write(line)
+
+    @property
+    def pending(self) -> int:
+        """Records written locally but not yet stored in MySQL"""
+        return self._pending
+
+
+def _restore_times(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn the ISO timestamps stored in the journal back into datetimes"""
+    for row in [record['result'], *record['stage_results']]:
+        for field in _TIME_FIELDS:
+            if isinstance(row.get(field), str):
+                row[field] = datetime.fromisoformat(row[field])
+    return record
+
+
+class WriteBehindWriter:
+    """Background thread that drains the spool journal to MySQL in order"""
+
+    def __init__(self, journal: Optional[SpoolJournal] = None, batch_size: int = SPOOL_BATCH_SIZE) -> None:
+        self.journal = journal or SpoolJournal()
+        self.batch_size = max(1, batch_size)
+        self.last_error: Optional[str] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._db: Optional[Database] = None
+
+    def start(self) -> None:
+        """Start draining (also replays anything left from a previous run)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        if self.journal.pending:
+            logger.info(f"Write-behind started with {self.journal.pending} spooled test runs")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker after its current batch; unsent records stay in the journal"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def submit(self, result: Dict[str, Any], stage_results: List[Dict[str, Any]]) -> str:
+        """
+        Journal a test run for saving; returns as soon as it is on local disk
+
+        Args:
+            result: Header row, as for Database.save_test_run
+            stage_results: Stage rows, as for Database.save_test_run
+
+        Returns:
+            str: Journal ID of the test run
+        """
+        journal_id = uuid.uuid4().hex
+        now = datetime.now()
+        result = {**result}
+        result.setdefault('start_time', now)
+        stage_results = [{'start_time': now, 'end_time': now, **stage} for stage in stage_results]
+
+        self.journal.append({'journal_id': journal_id, 'result': result, 'stage_results': stage_results})
+        self._wake.set()
+        return journal_id
+
+    def backlog(self) -> int:
+        """Number of test runs waiting to be stored in MySQL"""
+        return self.journal.pending
+
+    def _database(self) -> Database:
+        """Database handle for the worker thread (created lazily: MySQL may be down at startup)"""
+        if self._db is None:
+            self._db = Database()
+        return self._db
+
+    def _drop_connection(self) -> None:
+        """Return this thread's connection so the next attempt starts on a fresh one"""
+        try:
+            if self._db is not None:
+                self._db.close()
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        delay = SPOOL_RETRY_MIN_SECONDS
+        # While > 0, records are drained one at a time to single out a bad one
+        isolate = 0
+        while not self._stop.is_set():
+            try:
+                drained = self._drain(1 if isolate else self.batch_size)
+                isolate = max(0, isolate - drained)
+                delay = SPOOL_RETRY_MIN_SECONDS
+                self.last_error = None
+                if not drained:
+                    self._wake.wait()
+                    self._wake.clear()
+            except PERMANENT_ERRORS as e:
+                if not isolate:
+                    isolate = self.batch_size
+                    continue
+                # The oldest record itself was rejected: set it aside so the rest can proceed
+                try:
+                    self._reject_oldest(e)
+                except Exception as reject_error:
+                    logger.error(f"Could not move rejected spooled test run to dead letter: {reject_error}")
+                    self._stop.wait(delay)
+                    delay = min(delay * 2, SPOOL_RETRY_MAX_SECONDS)
+                isolate = max(0, isolate - 1)
+            except Exception as e:
+                # Connection problems: keep the records and retry with backoff
+                self.last_error = str(e)
+                logger.warning(f"Write-behind drain failed, retrying in {delay}s: {e}")
+                self._drop_connection()
+                self._stop.wait(delay)
+                delay = min(delay * 2, SPOOL_RETRY_MAX_SECONDS)
+        self._drop_connection()
+
+    def _reject_oldest(self, error: Exception) -> None:
+        records, ends = self.journal.read_pending(1)
+        if records:
+            logger.error(f"Spooled test run {records[0].get('journal_id')} rejected, moved to dead letter: {error}")
+            self.journal.dead_letter(records[0], str(error))
+            self.journal.ack(ends[0], 1)
+
+    def _drain(self, limit: int) -> int:
+        """Store the oldest pending records; returns how many were acknowledged"""
+        records, ends = self.journal.read_pending(limit)
+        if not records:
+            return 0
+        runs = [_restore_times(record) for record in records]
+        written = self._database().save_spooled_test_runs(runs)
+        self.journal.ack(ends[-1], len(records))
+        logger.info(f"Write-behind stored {written} test runs ({self.journal.pending} pending)")
+        return len(records)
+
+
+_writer: Optional[WriteBehindWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> WriteBehindWriter:
+    """Return the process-wide writer, starting it on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehindWriter()
+                _writer.start()
+    return _writer
+
+
+def shutdown(timeout: float = 5.0) -> None:
+    """Stop the writer if it was started"""
+    if _writer is not None:
+        _writer.stop(timeout)
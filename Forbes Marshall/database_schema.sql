@@ -1,5 +1,7 @@
 -- PCB Testing Automation System - SQL Database Schema
 -- Database: pcb_testing
+-- Reference only: the authoritative MySQL schema is versioned in
+-- data/migrations.py and applied automatically on startup.
 
 -- Users Table
 CREATE TABLE IF NOT EXISTS users (
@@ -4,6 +4,8 @@ Main Entry Point
 """
 import customtkinter as ctk
 from ui.login_window import LoginWindow
+from data import write_behind
+from data import audit_log
 import logging
 import sys
 
@@ -31,6 +33,9 @@ def main():
     app = LoginWindow()
     logger.info("Login Window created, starting mainloop")
     app.mainloop()
+    # Unsaved test runs stay in the spool and are stored on next start
+    write_behind.shutdown()
+    audit_log.shutdown()
     logger.info("Application closed")
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+"""
+Virtual Jig Runner
+Serves simulated test jigs on pseudo-terminals (Linux) so the serial path can run without hardware.
+
+Usage:
+    python run_virtual_jig.py [--jigs N] [--rate LINES_PER_S] [--latency S] [--noise P]
+                              [--drop P] [--binary] [--test-case ID] [--spread X]
+                              [--load-test SECONDS]
+
+Without --load-test the jigs run until Ctrl+C; point Communication Settings
+(or SERIAL_JIGS) at the printed ports. With --load-test, an
+AsyncSerialHandler reads every jig for the given time in this process and
+the measurement rate and parser errors are reported.
+"""
+import sys
+import time
+import asyncio
+import argparse
+from utils.virtual_jig import DEFAULT_PROFILES, JigSettings, VirtualJig, profiles_from_plan
+
+
+def load_profiles(test_case_id):
+    if test_case_id is None:
+        return DEFAULT_PROFILES
+    from data.database import Database
+    db = Database()
+    try:
+        plan = db.get_test_plan(test_case_id)
+    finally:
+        db.close()
+    if not plan:
+        print(f"Test case {test_case_id} not found")
+        sys.exit(1)
+    return plan
+
+
+async def load_test(jigs, seconds):
+    """Read every jig through AsyncSerialHandler for a while and report what arrived"""
+    import serial
+    from utils.async_serial import AsyncSerialHandler
+
+    handlers = []
+    for jig in jigs:
+        handler = AsyncSerialHandler()
+        handler.attach(serial.Serial(jig.port_name, timeout=0, write_timeout=0))
+        handlers.append(handler)
+
+    received = [0] * len(handlers)
+
+    async def drain(index, handler):
+        while True:
+            received[index] += len(await handler.read_measurements(1.0))
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(drain(i, handler)) for i, handler in enumerate(handlers)]
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    elapsed = time.perf_counter() - start
+    for handler in handlers:
+        await handler.disconnect()
+
+    sent = sum(jig.lines_sent for jig in jigs)
+    errors = sum(handler._parser.errors for handler in handlers)
+    print(f"{len(jigs)} jigs, {elapsed:.1f} s: sent {sent} measurements, received {sum(received)} "
+          f"({sum(received) / elapsed:,.0f}/s), {errors} parser errors, "
+          f"{sum(jig.bytes_dropped for jig in jigs)} bytes dropped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve simulated test jigs on pseudo-terminals")
+    parser.add_argument("--jigs", type=int, default=1, help="number of jigs")
+    parser.add_argument("--rate", type=float, default=10.0, help="streamed lines per second per jig (0: MEASURE only)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each reply")
+    parser.add_argument("--noise", type=float, default=0.0, help="chance of a garbage line after each line")
+    parser.add_argument("--drop", type=float, default=0.0, help="chance of each byte being dropped")
+    parser.add_argument("--binary", action="store_true", help="send binary frames instead of text lines")
+    parser.add_argument("--test-case", type=int, help="take stage distributions from this test case's limits")
+    parser.add_argument("--spread", type=float, default=1.0, help="widen the test case distributions (>1 fails boards)")
+    parser.add_argument("--load-test", type=float, metavar="SECONDS", help="read the jigs in-process and report")
+    args = parser.parse_args()
+
+    profiles = load_profiles(args.test_case)
+    if args.test_case is not None:
+        profiles = profiles_from_plan(profiles, args.spread)
+
+    jigs = []
+    for index in range(max(1, args.jigs)):
+        settings = JigSettings(line_rate=args.rate, latency=args.latency, noise_rate=args.noise,
+                               drop_rate=args.drop, binary=args.binary, pcb_id=235 + index)
+        jig = VirtualJig(profiles, settings)
+        print(f"Jig {index + 1}: {jig.start()}  (PCB ID {settings.pcb_id})")
+        jigs.append(jig)
+
+    try:
+        if args.load_test:
+            asyncio.run(load_test(jigs, args.load_test))
+        else:
+            print("Serving; press Ctrl+C to stop")
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for jig in jigs:
+            jig.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,11 @@ Advanced Test Window - Run multi-stage test sequences
 import customtkinter as ctk
 from tkinter import messagebox
 from data.database import Database, DBRecord
+from data.test_plan import TestPlan, PlanStage
+from data import write_behind
 from config.config import STATUS_PASS, STATUS_FAIL
 import time
+import math
 import logging
 import traceback
 from typing import List, Dict, Any, Optional
@@ -21,6 +24,7 @@ class AdvancedTestWindow(ctk.CTkFrame):
         self.username: str = username
         self.db: Database = Database()
         self.current_sequence: Optional[DBRecord] = None
+        self.current_plan: Optional[TestPlan] = None
         self.test_running: bool = False
         self.stages_widgets: List[Dict[str, Any]] = []  # Store references to stage widgets
         self.sequences_data: List[DBRecord] = []
@@ -172,9 +176,9 @@ class AdvancedTestWindow(ctk.CTkFrame):
                 break
         
         if self.current_sequence:
-            # Get stages to count them
-            stages = self.db.get_test_stages(self.current_sequence['id'])
-            stage_count = len(stages) if stages else 0
+            # Compile (or reuse) the plan once; display and run both use it
+            self.current_plan = self.db.get_test_plan(self.current_sequence['id'])
+            stage_count = len(self.current_plan.stages) if self.current_plan else 0
             self.sequence_info_label.configure(
                 text=f"PCB Type: {self.current_sequence.get('description', 'N/A')} | Total Stages: {stage_count}"
             )
@@ -188,10 +192,10 @@ class AdvancedTestWindow(ctk.CTkFrame):
         
         self.stages_widgets = []  # Clear the list
         
-        if not self.current_sequence:
+        if not self.current_sequence or not self.current_plan:
             return
         
-        stages: List[DBRecord] = self.db.get_test_stages(self.current_sequence['id'])
+        stages = self.current_plan.stages
         
         # If no stages from database, show message
         if not stages:
@@ -212,11 +216,9 @@ class AdvancedTestWindow(ctk.CTkFrame):
                 header_frame = ctk.CTkFrame(stage_frame)
                 header_frame.pack(fill="x", padx=10, pady=5)
                 
-                # Use stage_name from database or name from dictionary
-                stage_display_name = stage.get('stage_name') or stage.get('name', 'Unknown')
                 ctk.CTkLabel(
                     header_frame,
-                    text=f"Stage {idx + 1}: {stage_display_name}",
+                    text=f"Stage {idx + 1}: {stage.name}",
                     font=ctk.CTkFont(size=14, weight="bold")
                 ).pack(side="left", padx=10)
                 
@@ -238,15 +240,16 @@ class AdvancedTestWindow(ctk.CTkFrame):
                 }
                 self.stages_widgets.append(stage_info)
                 
-                # Stage parameters - handle missing fields gracefully
-                v_min = stage.get('voltage_min', 0)
-                v_max = stage.get('voltage_max', 0)
-                c_min = stage.get('current_min', 0)
-                c_max = stage.get('current_max', 0)
-                r_min = stage.get('resistance_min', 0)
-                r_max = stage.get('resistance_max', 0)
+                # Stage parameters - unset limits are shown as "-"
+                def fmt(value: float) -> str:
+                    return f"{value:.2f}" if math.isfinite(value) else "-"
+                
+                v_min, v_max = stage.range(0)
+                c_min, c_max = stage.range(1)
+                r_min, r_max = stage.range(2)
                 
-                params_text = f"V: {v_min}-{v_max}V | C: {c_min}-{c_max}A | R: {r_min}-{r_max}Ω"
+                params_text = (f"V: {fmt(v_min)}-{fmt(v_max)}V | C: {fmt(c_min)}-{fmt(c_max)}A | "
+                               f"R: {fmt(r_min)}-{fmt(r_max)}Ω")
                 ctk.CTkLabel(
                     stage_frame,
                     text=params_text,
@@ -283,9 +286,7 @@ class AdvancedTestWindow(ctk.CTkFrame):
         self.run_test_btn.configure(state="disabled")
         self.overall_result_label.configure(text="Testing in progress...", text_color="orange")
         
-        # Get all stages
-        stages = self.db.get_test_stages(self.current_sequence['id'])
-        logger.info(f"Total stages to run: {len(stages)}")
+        logger.info(f"Total stages to run: {len(self.stages_widgets)}")
         all_passed = True
         failed_stages = []
         
@@ -296,20 +297,23 @@ class AdvancedTestWindow(ctk.CTkFrame):
                 stage_info['status_label'].configure(text="🔄 Running...", text_color="orange")
                 self.update()
                 
-                stage = stage_info['stage_data']
+                stage: PlanStage = stage_info['stage_data']
                 idx = stage_info['index']
-                stage_name = stage.get('stage_name') or stage.get('name', f'Stage {idx + 1}')
+                stage_name = stage.name
                 
                 logger.info(f"Running {stage_name}...")
                 
                 # Simulate test (in real implementation, this would read from hardware)
                 # For demo, we'll use random values within a range
                 import random
-                voltage = random.uniform(float(stage['voltage_min']) - 0.5, float(stage['voltage_max']) + 0.5)
-                current = random.uniform(float(stage['current_min']) - 0.1, float(stage['current_max']) + 0.1)
-                resistance = random.uniform(float(stage['resistance_min']) - 5, float(stage['resistance_max']) + 5)
+                v_min, v_max = stage.range(0)
+                c_min, c_max = stage.range(1)
+                r_min, r_max = stage.range(2)
+                voltage = random.uniform(v_min - 0.5, v_max + 0.5)
+                current = random.uniform(c_min - 0.1, c_max + 0.1)
+                resistance = random.uniform(r_min - 5, r_max + 5)
                 
-                logger.info(f"Measured values - V: {voltage:.2f}V (range: {stage['voltage_min']}-{stage['voltage_max']}), C: {current:.2f}A, R: {resistance:.2f}Ω")
+                logger.info(f"Measured values - V: {voltage:.2f}V (range: {v_min}-{v_max}), C: {current:.2f}A, R: {resistance:.2f}Ω")
                 
                 # Store measured values in stage_info for later saving
                 stage_info['voltage_measured'] = voltage
@@ -317,9 +321,7 @@ class AdvancedTestWindow(ctk.CTkFrame):
                 stage_info['resistance_measured'] = resistance
                 
                 # Check if values are within range
-                voltage_ok = stage['voltage_min'] <= voltage <= stage['voltage_max']
-                current_ok = stage['current_min'] <= current <= stage['current_max']
-                resistance_ok = stage['resistance_min'] <= resistance <= stage['resistance_max']
+                voltage_ok, current_ok, resistance_ok = stage.check(voltage, current, resistance)
                 
                 stage_passed = voltage_ok and current_ok and resistance_ok
                 
@@ -366,39 +368,31 @@ class AdvancedTestWindow(ctk.CTkFrame):
         user_id: Optional[int] = self.db.get_user_id(self.username)
         
         # Collect stage measurements for saving
-        stage_measurements: List[Dict[str, Any]] = []
+        stage_results: List[Dict[str, Any]] = []
         for stage_info in self.stages_widgets:
             stage = stage_info['stage_data']
-            stage_measurements.append({
-                'stage_id': stage.get('id'),
-                'voltage': stage_info.get('voltage_measured', 0),
-                'current': stage_info.get('current_measured', 0),
-                'resistance': stage_info.get('resistance_measured', 0),
-                'status': stage_info.get('stage_status', STATUS_FAIL)
+            stage_results.append({
+                'stage_id': stage.stage_id,
+                'voltage_measured': stage_info.get('voltage_measured', 0),
+                'current_measured': stage_info.get('current_measured', 0),
+                'resistance_measured': stage_info.get('resistance_measured', 0),
+                'status': stage_info.get('stage_status', STATUS_FAIL),
+                'failure_reason': stage_info.get('failure_reason')
             })
         
-        test_result_id = self.db.save_test_result(
-            test_case_id=test_case_id,
-            user_id=user_id,
-            pcb_serial_number=pcb_id,
-            status=overall_status,
-            overall_pass=all_passed,
-            notes=notes
+        # Journal locally; the write-behind worker stores header and stages in one transaction
+        journal_id = write_behind.get_writer().submit(
+            {
+                'test_case_id': test_case_id,
+                'user_id': user_id,
+                'pcb_serial_number': pcb_id,
+                'status': overall_status,
+                'overall_pass': all_passed,
+                'notes': notes
+            },
+            stage_results
         )
-        
-        # Save individual stage results
-        if test_result_id:
-            for idx, stage_info in enumerate(self.stages_widgets):
-                stage = stage_info['stage_data']
-                self.db.save_stage_result(
-                    test_result_id=test_result_id,
-                    stage_id=stage.get('id'),
-                    voltage_measured=stage_info.get('voltage_measured', 0),
-                    current_measured=stage_info.get('current_measured', 0),
-                    resistance_measured=stage_info.get('resistance_measured', 0),
-                    status=stage_info.get('stage_status', STATUS_FAIL),
-                    failure_reason=stage_info.get('failure_reason')
-                )
+        logger.info(f"Test run queued as {journal_id}")
         
         # Display overall result
         if all_passed:
@@ -426,6 +420,7 @@ class AdvancedTestWindow(ctk.CTkFrame):
         self.barcode_label.configure(text="📷 Ready to scan", text_color="gray")
         self.sequence_combo.set("Select a sequence")
         self.current_sequence = None
+        self.current_plan = None
         self.sequence_info_label.configure(text="")
         self.overall_result_label.configure(text="")
         self.run_test_btn.configure(state="disabled")
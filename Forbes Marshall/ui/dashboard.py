@@ -7,8 +7,9 @@ from PIL import Image, ImageDraw
 import os
 import logging
 from typing import Union, Dict, Any, List
-from config.config import DASHBOARD_WINDOW_SIZE, WINDOW_TITLE, LOGO_PATH, ROLE_ADMIN, ROLE_MANAGER, ROLE_TESTER, STATUS_PASS
+from config.config import DASHBOARD_WINDOW_SIZE, WINDOW_TITLE, LOGO_PATH, ROLE_ADMIN, ROLE_MANAGER, ROLE_TESTER
 from data.database import Database, DBRecord
+from data import write_behind
 from ui.start_test import StartTestWindow
 from ui.test_case_editor import TestCaseEditorWindow
 from ui.results_history import ResultsHistoryWindow
@@ -20,6 +21,9 @@ from ui.communication_config import CommunicationConfigWindow
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+# Days shown in the daily yield panel
+DAILY_YIELD_DAYS = 7
+
 class Dashboard(ctk.CTkToplevel):
     def __init__(self, username: str, role: Union[str, Dict[str, Any]], parent, session_manager=None) -> None:
         super().__init__(parent)
@@ -46,6 +50,9 @@ class Dashboard(ctk.CTkToplevel):
 
         # Create UI
         self.create_widgets()
+
+        # Start storing spooled test runs (including any left from a previous session)
+        self.update_backlog_display()
     
     def _extract_role(self, role: Union[str, Dict[str, Any]]) -> str:
         """Extract role string from either dict or string"""
@@ -118,6 +125,20 @@ class Dashboard(ctk.CTkToplevel):
                 text_color=color
             )
 
+    def update_backlog_display(self) -> None:
+        """Show how many test runs are waiting to be stored in the database"""
+        writer = write_behind.get_writer()
+        backlog = writer.backlog()
+        if backlog == 0:
+            self.backlog_label.configure(text="DB: up to date", text_color="lightgreen")
+        elif writer.last_error:
+            self.backlog_label.configure(text=f"DB offline: {backlog} pending", text_color="#FF6B6B")
+        else:
+            self.backlog_label.configure(text=f"DB: saving {backlog}", text_color="orange")
+
+        # Schedule next update in 1 second
+        self.after(1000, self.update_backlog_display)
+
     def handle_session_timeout(self) -> None:
         """Handle session timeout"""
         messagebox.showwarning(
@@ -195,6 +216,15 @@ class Dashboard(ctk.CTkToplevel):
                 )
                 self.session_label.pack(side="left", padx=(0, 15))
 
+        # Write-behind backlog (test runs saved locally but not yet in MySQL)
+        self.backlog_label = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=ctk.CTkFont(size=10),
+            text_color="lightgreen"
+        )
+        self.backlog_label.pack(side="left", padx=(0, 15))
+
         user_info = ctk.CTkLabel(
             info_frame,
             text=f"User: {self.username} | Role: {self.role.upper()}",
@@ -350,26 +380,33 @@ class Dashboard(ctk.CTkToplevel):
         
         ctk.CTkLabel(
             left_panel,
-            text="Recent Batches Summary",
+            text=f"Daily Yield (Last {DAILY_YIELD_DAYS} Days)",
             font=ctk.CTkFont(size=13, weight="bold")
         ).pack(pady=15, padx=15, anchor="w")
         
-        # Get recent batches (simulated data - using test results)
-        batches_data = self._get_recent_batches()
-        batches_frame = ctk.CTkScrollableFrame(left_panel, fg_color="#2A2A2A")
-        batches_frame.pack(fill="both", expand=True, padx=15, pady=(0, 15))
+        daily_data = self._get_daily_yield()
+        daily_frame = ctk.CTkScrollableFrame(left_panel, fg_color="#2A2A2A")
+        daily_frame.pack(fill="both", expand=True, padx=15, pady=(0, 15))
         
-        for batch in batches_data[:5]:
-            batch_item = ctk.CTkFrame(batches_frame, fg_color="#3D3D3D", corner_radius=8)
-            batch_item.pack(fill="x", pady=5)
+        for day in daily_data:
+            day_item = ctk.CTkFrame(daily_frame, fg_color="#3D3D3D", corner_radius=8)
+            day_item.pack(fill="x", pady=5)
             
-            batch_label = ctk.CTkLabel(
-                batch_item,
-                text=f"Batch #{batch['id']}: {batch['yield']}% Yield",
+            day_label = ctk.CTkLabel(
+                day_item,
+                text=f"{day['day']:%d %b}: {day['yield']}% Yield ({day['total']} tests)",
                 font=ctk.CTkFont(size=11),
-                text_color="lightgreen"
+                text_color="lightgreen" if day['yield'] >= 80 else "orange" if day['yield'] >= 60 else "#FF9999"
             )
-            batch_label.pack(pady=10, padx=10, anchor="w")
+            day_label.pack(pady=10, padx=10, anchor="w")
+        
+        if not daily_data:
+            ctk.CTkLabel(
+                daily_frame,
+                text="No tests in this period",
+                font=ctk.CTkFont(size=11),
+                text_color="gray"
+            ).pack(pady=20)
         
         # Separator
         sep = ctk.CTkFrame(left_panel, height=1, fg_color="gray30")
@@ -487,11 +524,11 @@ class Dashboard(ctk.CTkToplevel):
             ).pack(pady=(0, 10), padx=10)
     
     def _get_test_statistics(self) -> Dict[str, Any]:
-        """Get test statistics from database"""
+        """Get test statistics from the maintained counters (results currently held)"""
         try:
-            results: List[DBRecord] = self.db.get_test_results()
-            total: int = len(results)
-            passed: int = sum(1 for r in results if r.get('overall_pass') or r.get('status') == STATUS_PASS)
+            counters: DBRecord = self.db.get_summary_statistics()
+            total: int = counters['total_tests']
+            passed: int = counters['passed_tests']
             failed: int = total - passed
             pass_rate: int = int((passed / total * 100) if total > 0 else 0)
             
@@ -516,49 +553,36 @@ class Dashboard(ctk.CTkToplevel):
                 'test_status': {'passed': 0, 'failed': 0, 'not_run': 0}
             }
     
-    def _get_recent_batches(self) -> List[Dict[str, Any]]:
-        """Get recent batch data"""
+    def _get_daily_yield(self) -> List[Dict[str, Any]]:
+        """Get per-day yield of recent days from the daily rollups, newest first"""
         try:
-            results: List[DBRecord] = self.db.get_test_results()
-            batches: Dict[int, Dict[str, Any]] = {}
-            
-            for result in results:
-                batch_id: int = int(result.get('id', 0))
-                passed: bool = result.get('overall_pass', False) or result.get('status') == STATUS_PASS
-                
-                if batch_id not in batches:
-                    batches[batch_id] = {'id': batch_id, 'total': 0, 'passed': 0}
-                
-                batches[batch_id]['total'] += 1
-                if passed:
-                    batches[batch_id]['passed'] += 1
-            
-            batch_list = []
-            for batch_id in sorted(batches.keys(), reverse=True):
-                batch = batches[batch_id]
-                yield_pct: int = int((batch['passed'] / batch['total'] * 100) if batch['total'] > 0 else 0)
-                batch_list.append({'id': batch_id, 'yield': yield_pct})
-            
-            return batch_list
+            days: List[DBRecord] = self.db.get_daily_yield(DAILY_YIELD_DAYS)
+            return [
+                {
+                    'day': day['day'],
+                    'total': day['total'],
+                    'yield': int((day['passed'] / day['total'] * 100) if day['total'] > 0 else 0)
+                }
+                for day in days
+            ]
         except Exception as e:
-            logger.error(f"Error getting batches: {e}")
-            return [{'id': i, 'yield': 100} for i in range(1, 6)]
+            logger.error(f"Error getting daily yield: {e}")
+            return []
     
     def _get_recent_errors(self) -> List[Dict[str, Any]]:
         """Get recent errors from test results"""
         try:
-            results: List[DBRecord] = self.db.get_test_results()
+            results: List[DBRecord] = self.db.get_recent_result_notes(limit=5)
             errors = []
             
             for result in results:
                 notes: str = result.get('notes', '')
-                if notes and notes.lower() != 'pass':
-                    errors.append({
-                        'error_code': notes[:30],
-                        'test_id': result.get('id')
-                    })
+                errors.append({
+                    'error_code': notes[:30],
+                    'test_id': result.get('id')
+                })
             
-            return errors[:5]
+            return errors
         except Exception as e:
             logger.error(f"Error getting errors: {e}")
             return []
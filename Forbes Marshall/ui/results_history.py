@@ -4,18 +4,27 @@ Results History Window
 import customtkinter as ctk
 from tkinter import messagebox, filedialog
 from data.database import Database, DBRecord
+from data.tiered_results import TieredResults
 from config.config import STATUS_PASS, STATUS_FAIL
-import csv
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class ResultsHistoryWindow(ctk.CTkFrame):
+    # Number of results fetched per page
+    PAGE_SIZE = 100
+    # user_id filter that matches no result (IDs start at 1)
+    NO_USER_ID = -1
+    
     def __init__(self, parent: ctk.CTkFrame, username: str, role: str, is_embedded: bool = False) -> None:
         super().__init__(parent)
         
         self.username: str = username
         self.role: str = role
         self.db: Database = Database()
+        self.results = TieredResults(self.db)
+        self.active_filters: Dict[str, Any] = {}
+        self.next_page: Optional[Any] = None
+        self.load_more_btn: Optional[ctk.CTkButton] = None
         
         self.create_widgets()
         self.load_results()
@@ -53,10 +62,11 @@ class ResultsHistoryWindow(ctk.CTkFrame):
         self.status_filter.set("All")
         self.status_filter.pack(side="left", padx=10)
         
-        # Search by PCB ID
+        # Search by PCB ID prefix
         ctk.CTkLabel(filter_frame, text="Search PCB ID:").pack(side="left", padx=10)
-        self.search_entry = ctk.CTkEntry(filter_frame, width=200, placeholder_text="Enter PCB ID")
+        self.search_entry = ctk.CTkEntry(filter_frame, width=200, placeholder_text="PCB ID or prefix")
         self.search_entry.pack(side="left", padx=10)
+        self.search_entry.bind('<Return>', self.load_results)
         
         search_btn = ctk.CTkButton(
             filter_frame,
@@ -75,6 +85,23 @@ class ResultsHistoryWindow(ctk.CTkFrame):
         )
         export_btn.pack(side="right", padx=10)
         
+        # Board traceability: a scanner types the serial and presses Enter
+        trace_frame = ctk.CTkFrame(container)
+        trace_frame.pack(pady=(0, 10), padx=20, fill="x")
+        
+        ctk.CTkLabel(trace_frame, text="Scan PCB:").pack(side="left", padx=10)
+        self.scan_entry = ctk.CTkEntry(trace_frame, width=250, placeholder_text="Scan or type a serial number")
+        self.scan_entry.pack(side="left", padx=10)
+        self.scan_entry.bind('<Return>', self.show_pcb_history)
+        self.scan_entry.focus_set()
+        
+        ctk.CTkButton(
+            trace_frame,
+            text="Board History",
+            width=120,
+            command=self.show_pcb_history
+        ).pack(side="left", padx=10)
+        
         # Stats frame
         stats_frame = ctk.CTkFrame(container)
         stats_frame.pack(pady=10, padx=20, fill="x")
@@ -121,41 +148,58 @@ class ResultsHistoryWindow(ctk.CTkFrame):
         )
         close_btn.pack(pady=10)
     
+    def get_active_filters(self) -> Dict[str, Any]:
+        """Translate the UI filter widgets into query_test_results filters"""
+        filters: Dict[str, Any] = {}
+        
+        if self.role == "tester":
+            # Testers only see their own results
+            filters['user_id'] = self.viewer_user_id()
+        
+        status_filter: str = self.status_filter.get()
+        if status_filter != "All":
+            filters['status'] = status_filter
+        
+        search_query: str = self.search_entry.get().strip()
+        if search_query:
+            filters['serial_prefix'] = search_query
+        
+        return filters
+    
+    def viewer_user_id(self) -> Optional[int]:
+        """
+        user_id results are restricted to: None for roles that see everyone
+
+        A tester whose ID cannot be looked up (unknown user, database
+        unavailable) gets an ID that matches nothing rather than no filter.
+        """
+        if self.role != "tester":
+            return None
+        user_id = self.db.get_user_id(self.username)
+        return self.NO_USER_ID if user_id is None else user_id
+    
     def load_results(self, *args) -> None:
-        """Load and display test results"""
+        """Load and display the first page of test results"""
         # Clear existing
         for widget in self.results_scroll.winfo_children():
             widget.destroy()
+        self.load_more_btn = None
 
-        # Get filters
-        status_filter: str = self.status_filter.get()
-        search_query: str = self.search_entry.get().strip()
-
-        # Get results with measurements in a single query (optimized)
-        results: List[DBRecord] = self.db.get_test_results_with_measurements()
-        if self.role == "tester":
-            # Filter by current user
-            user_id = self.db.get_user_id(self.username)
-            results = [r for r in results if r.get('user_id') == user_id]
-
-        # Apply filters
-        if status_filter != "All":
-            results = [r for r in results if r.get('status') == status_filter]
+        # Filtering and counting happen in SQL
+        self.active_filters = self.get_active_filters()
+        self.next_page = None
 
-        if search_query:
-            results = [r for r in results if search_query.lower() in str(r.get('pcb_serial_number', '')).lower()]
-
-        # Update stats
-        total = len(results)
-        passed = len([r for r in results if r['status'] == "Pass"])
-        failed = len([r for r in results if r['status'] == "Fail"])
+        stats = self.results.count_test_results(**self.active_filters)
+        total = stats['total']
+        passed = stats['passed']
+        failed = stats['failed']
         pass_rate = (passed / total * 100) if total > 0 else 0
 
         self.stats_label.configure(
             text=f"Total Tests: {total} | Passed: {passed} | Failed: {failed} | Pass Rate: {pass_rate:.1f}%"
         )
 
-        if not results:
+        if total == 0:
             ctk.CTkLabel(
                 self.results_scroll,
                 text="No test results found",
@@ -163,60 +207,84 @@ class ResultsHistoryWindow(ctk.CTkFrame):
             ).pack(pady=20)
             return
 
-        # Display results - measurements are already included in results
+        self.load_next_page()
+    
+    def load_next_page(self) -> None:
+        """Append the next page of results to the list"""
+        if self.load_more_btn:
+            self.load_more_btn.destroy()
+            self.load_more_btn = None
+
+        results, self.next_page = self.results.query_test_results(
+            **self.active_filters, limit=self.PAGE_SIZE, after=self.next_page
+        )
+
         for result in results:
-            result_frame = ctk.CTkFrame(self.results_scroll)
-            result_frame.pack(pady=2, padx=5, fill="x")
+            self.add_result_row(result)
 
-            # Get measurements directly from the optimized query result
-            voltage_val = result.get('voltage_measured')
-            current_val = result.get('current_measured')
-            resistance_val = result.get('resistance_measured')
+        if self.next_page:
+            self.load_more_btn = ctk.CTkButton(
+                self.results_scroll,
+                text="Load More",
+                width=150,
+                command=self.load_next_page
+            )
+            self.load_more_btn.pack(pady=10)
+    
+    def add_result_row(self, result: DBRecord) -> None:
+        """Add a single result row to the list"""
+        result_frame = ctk.CTkFrame(self.results_scroll)
+        result_frame.pack(pady=2, padx=5, fill="x")
 
-            # PCB ID
-            pcb_id: str = str(result.get('pcb_serial_number', 'N/A'))
-            ctk.CTkLabel(result_frame, text=pcb_id, width=100).pack(side="left", padx=5)
+        # Measurements of the first stage are included in the query result
+        voltage_val = result.get('voltage_measured')
+        current_val = result.get('current_measured')
+        resistance_val = result.get('resistance_measured')
 
-            # Tester
-            tester_id: str = str(result.get('user_id', 'N/A'))
-            ctk.CTkLabel(result_frame, text=tester_id, width=100).pack(side="left", padx=5)
+        # PCB ID
+        pcb_id: str = str(result.get('pcb_serial_number', 'N/A'))
+        ctk.CTkLabel(result_frame, text=pcb_id, width=100).pack(side="left", padx=5)
 
-            # Status
-            status: str = str(result.get('status', 'N/A'))
-            status_color = "green" if status == "Pass" else "red"
-            ctk.CTkLabel(
-                result_frame,
-                text=status,
-                width=80,
-                text_color=status_color,
-                font=ctk.CTkFont(weight="bold")
-            ).pack(side="left", padx=5)
+        # Tester
+        tester_id: str = str(result.get('user_id', 'N/A'))
+        ctk.CTkLabel(result_frame, text=tester_id, width=100).pack(side="left", padx=5)
 
-            # Voltage
-            voltage_str = f"{voltage_val:.2f}V" if voltage_val is not None else "N/A"
-            ctk.CTkLabel(result_frame, text=voltage_str, width=80).pack(side="left", padx=5)
+        # Status
+        status: str = str(result.get('status', 'N/A'))
+        status_color = "green" if status == "Pass" else "red"
+        ctk.CTkLabel(
+            result_frame,
+            text=status,
+            width=80,
+            text_color=status_color,
+            font=ctk.CTkFont(weight="bold")
+        ).pack(side="left", padx=5)
 
-            # Current
-            current_str = f"{current_val:.2f}A" if current_val is not None else "N/A"
-            ctk.CTkLabel(result_frame, text=current_str, width=80).pack(side="left", padx=5)
+        # Voltage
+        voltage_str = f"{voltage_val:.2f}V" if voltage_val is not None else "N/A"
+        ctk.CTkLabel(result_frame, text=voltage_str, width=80).pack(side="left", padx=5)
 
-            # Resistance
-            resistance_str = f"{resistance_val:.2f}Ω" if resistance_val is not None else "N/A"
-            ctk.CTkLabel(result_frame, text=resistance_str, width=100).pack(side="left", padx=5)
+        # Current
+        current_str = f"{current_val:.2f}A" if current_val is not None else "N/A"
+        ctk.CTkLabel(result_frame, text=current_str, width=80).pack(side="left", padx=5)
 
-            # Date/Time
-            date_time: str = str(result.get('start_time', 'N/A'))
-            ctk.CTkLabel(result_frame, text=date_time, width=150).pack(side="left", padx=5)
+        # Resistance
+        resistance_str = f"{resistance_val:.2f}Ω" if resistance_val is not None else "N/A"
+        ctk.CTkLabel(result_frame, text=resistance_str, width=100).pack(side="left", padx=5)
+
+        # Date/Time
+        date_time: str = str(result.get('start_time', 'N/A'))
+        ctk.CTkLabel(result_frame, text=date_time, width=150).pack(side="left", padx=5)
+
+        # View details button
+        view_btn = ctk.CTkButton(
+            result_frame,
+            text="View",
+            width=80,
+            command=lambda r=result: self.view_details(r)
+        )
+        view_btn.pack(side="left", padx=5)
 
-            # View details button
-            view_btn = ctk.CTkButton(
-                result_frame,
-                text="View",
-                width=80,
-                command=lambda r=result: self.view_details(r)
-            )
-            view_btn.pack(side="left", padx=5)
-    
     def view_details(self, result: DBRecord) -> None:
         """Show detailed view of a test result"""
         details_window: ctk.CTkToplevel = ctk.CTkToplevel(self)
@@ -245,7 +313,7 @@ class ResultsHistoryWindow(ctk.CTkFrame):
         ).pack(pady=20)
         
         # Get stage results to display measurements
-        stage_results = self.db.get_stage_results(result['id'])
+        stage_results = self.results.get_stage_results(result['id'])
         
         # Build details text
         details_text = f"PCB ID: {result['pcb_serial_number']}\n"
@@ -308,18 +376,80 @@ class ResultsHistoryWindow(ctk.CTkFrame):
         )
         close_btn.pack(pady=10)
     
+    @staticmethod
+    def format_pcb_history(serial: str, runs: List[DBRecord]) -> str:
+        """Render a board's runs and stage results as text"""
+        retests = max(len(runs) - 1, 0)
+        text = f"PCB ID: {serial}\nRuns: {len(runs)} (retests: {retests})\n"
+        
+        for run in runs:
+            text += f"\n#{run['attempt']}  {run['status']}  {run.get('start_time') or 'N/A'}\n"
+            text += f"  Test case: {run.get('test_case_name') or run['test_case_id']}\n"
+            text += f"  Tester: {run.get('username') or run['user_id']}\n"
+            if run.get('notes'):
+                text += f"  Notes: {run['notes']}\n"
+            for stage in run['stages']:
+                v = stage.get('voltage_measured')
+                c = stage.get('current_measured')
+                r = stage.get('resistance_measured')
+                v_str = f"{v:.2f}V" if v is not None else "N/A"
+                c_str = f"{c:.2f}A" if c is not None else "N/A"
+                r_str = f"{r:.2f}Ω" if r is not None else "N/A"
+                name = stage.get('stage_name') or f"Stage {stage.get('stage_number', '?')}"
+                text += f"    {name}: {stage.get('status', 'N/A')}  {v_str}  {c_str}  {r_str}\n"
+                if stage.get('failure_reason'):
+                    text += f"      Reason: {stage['failure_reason']}\n"
+        return text
+    
+    def show_pcb_history(self, *args) -> None:
+        """Show every run of the scanned board"""
+        serial: str = self.scan_entry.get().strip()
+        if not serial:
+            return
+        
+        # Testers only see their own results
+        runs = self.results.get_pcb_history(serial, self.viewer_user_id())
+        
+        # Clear the entry so the next scan starts fresh
+        self.scan_entry.delete(0, "end")
+        
+        if not runs:
+            messagebox.showinfo("Board History", f"No test runs found for {serial}")
+            return
+        
+        history_window: ctk.CTkToplevel = ctk.CTkToplevel(self)
+        history_window.title(f"Board History - {serial}")
+        history_window.geometry("600x650")
+        history_window.attributes('-topmost', True)
+        history_window.lift()
+        history_window.focus_force()
+        
+        container = ctk.CTkFrame(history_window)
+        container.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        ctk.CTkLabel(
+            container,
+            text="Board History",
+            font=ctk.CTkFont(size=20, weight="bold")
+        ).pack(pady=10)
+        
+        text_widget = ctk.CTkTextbox(container, width=550, height=480)
+        text_widget.pack(pady=10, fill="both", expand=True)
+        text_widget.insert("1.0", self.format_pcb_history(serial, runs))
+        text_widget.configure(state="disabled")
+        
+        ctk.CTkButton(
+            container,
+            text="Close",
+            width=150,
+            command=history_window.destroy
+        ).pack(pady=10)
+    
     def export_to_csv(self) -> None:
         """Export results to CSV file"""
-        # Get current filtered results
-        results: List[DBRecord] = self.db.get_test_results()
-        if self.role == "tester":
-            user_id: Any = self.db.get_user_id(self.username)
-            results = [r for r in results if r.get('user_id') == user_id]
-        status_filter: str = self.status_filter.get()
-        if status_filter != "All":
-            results = [r for r in results if r['status'] == status_filter]
-        
-        if not results:
+        # Export exactly what the current filters show
+        filters: Dict[str, Any] = self.get_active_filters()
+        if self.results.count_test_results(**filters)['total'] == 0:
             messagebox.showwarning("No Data", "No results to export")
             return
         
@@ -334,39 +464,8 @@ class ResultsHistoryWindow(ctk.CTkFrame):
             return
         
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['Test ID', 'PCB ID', 'Tester ID', 'Status', 'Voltage (V)', 'Current (A)', 'Resistance (Ω)', 'Notes', 'Test Date/Time'])
-                
-                # Write each result with measured values
-                for result in results:
-                    # Get stage results for measured values
-                    stage_results = self.db.get_stage_results(result['id'])
-                    voltage_val = "N/A"
-                    current_val = "N/A"
-                    resistance_val = "N/A"
-                    
-                    if stage_results and len(stage_results) > 0:
-                        first_stage = stage_results[0]
-                        v = first_stage.get('voltage_measured')
-                        c = first_stage.get('current_measured')
-                        r = first_stage.get('resistance_measured')
-                        voltage_val = f"{v:.2f}" if v is not None else "N/A"
-                        current_val = f"{c:.2f}" if c is not None else "N/A"
-                        resistance_val = f"{r:.2f}" if r is not None else "N/A"
-                    
-                    writer.writerow([
-                        result['id'],
-                        result.get('pcb_serial_number', 'N/A'),
-                        result.get('user_id', 'N/A'),
-                        result.get('status', 'N/A'),
-                        voltage_val,
-                        current_val,
-                        resistance_val,
-                        result.get('notes', ''),
-                        result.get('start_time', 'N/A')
-                    ])
-            
-            messagebox.showinfo("Success", f"Results exported to:\n{filename}")
+            # Results and their stage measurements are fetched in batches, archived months included
+            exported: int = self.results.export_test_results_with_stages(filename, **filters)
+            messagebox.showinfo("Success", f"{exported} results exported to:\n{filename}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export: {str(e)}")
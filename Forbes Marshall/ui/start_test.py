@@ -8,10 +8,13 @@ import logging
 import traceback
 import csv
 import os
+import threading
 from datetime import datetime
 from data.database import Database, DBRecord
-from config.config import STATUS_PASS, STATUS_FAIL
-from utils.serial_handler import SerialHandler
+from data.test_plan import TestPlan
+from data import write_behind
+from config.config import STATUS_PASS, STATUS_FAIL, SERIAL_JIGS
+from utils.serial_port_manager import SerialPortManager
 from typing import List, Optional
 
 # Set up logger for this module
@@ -24,15 +27,40 @@ class StartTestWindow(ctk.CTkFrame):
         logger.info(f"Initializing StartTestWindow for user: {username}")
         self.username: str = username
         self.db: Database = Database()
-        self.serial_handler: SerialHandler = SerialHandler()
+        self.serial_handler: SerialPortManager = SerialPortManager()
         self.use_serial: bool = False
+        self.plan: Optional[TestPlan] = None
+        self._plan_refresh: Optional[threading.Thread] = None
         
         # Create UI
         self.create_widgets()
+        self.refresh_plan()
         
         # Auto-focus on PCB ID field for barcode scanning
         self.after(100, lambda: self.pcb_id_entry.focus())
     
+    def refresh_plan(self) -> None:
+        """Reload the test plan on a background thread, so a database stall never blocks testing"""
+        if self._plan_refresh is not None and self._plan_refresh.is_alive():
+            return
+        self._plan_refresh = threading.Thread(target=self._load_plan, name="plan-refresh", daemon=True)
+        self._plan_refresh.start()
+    
+    def _load_plan(self) -> None:
+        try:
+            # Limits come from the test case (for now, the first one)
+            test_cases = self.db.get_test_cases()
+            plan = self.db.get_test_plan(test_cases[0]['id']) if test_cases else None
+            if plan:
+                self.plan = plan
+            # Warms the identity cache for run_test
+            self.db.get_user_id(self.username)
+        except Exception as e:
+            logger.warning(f"Could not refresh test plan: {e}")
+        finally:
+            # Hand this thread's connection back to the pool
+            self.db.close()
+    
     def on_closing(self):
         """Handle window close"""
         if self.use_serial:
@@ -119,6 +147,17 @@ class StartTestWindow(ctk.CTkFrame):
         )
         self.serial_status_label.pack(side="left", padx=10)
         
+        # Jig selector, only on stations with several jigs configured
+        self.jig_var = ctk.StringVar(value=next(iter(SERIAL_JIGS), ""))
+        if len(SERIAL_JIGS) > 1:
+            ctk.CTkOptionMenu(
+                serial_frame,
+                variable=self.jig_var,
+                values=list(SERIAL_JIGS),
+                width=120
+            ).pack(side="right", padx=10)
+            ctk.CTkLabel(serial_frame, text="Jig:").pack(side="right")
+        
         # Test Parameters Frame
         params_frame = ctk.CTkFrame(container)
         params_frame.pack(pady=20, padx=20, fill="both", expand=True)
@@ -213,10 +252,13 @@ class StartTestWindow(ctk.CTkFrame):
         if self.serial_switch.get():
             try:
                 logger.info("Attempting to connect to serial port...")
-                self.serial_handler.connect()
+                failed_jigs = self.serial_handler.connect()
                 self.use_serial = True
                 self.serial_status_label.configure(text="✓ Connected", text_color="green")
                 logger.info("✓ Serial connection successful!")
+                if failed_jigs:
+                    details = "\n".join(f"{jig}: {error.splitlines()[0]}" for jig, error in failed_jigs.items())
+                    messagebox.showwarning("Some Jigs Unavailable", f"These jigs could not be opened:\n\n{details}")
                 
                 # Disable manual entry when using serial
                 self.voltage_entry.configure(state="disabled")
@@ -429,6 +471,19 @@ class StartTestWindow(ctk.CTkFrame):
         
         logger.info(f"Starting test for PCB: {pcb_id}, Serial Mode: {self.use_serial}")
         
+        # Use the plan refreshed in the background; only read the database
+        # here if no plan has been loaded yet
+        plan = self.plan
+        if plan is None:
+            test_cases = self.db.get_test_cases()
+            plan = self.db.get_test_plan(test_cases[0]['id']) if test_cases else None
+            self.plan = plan
+        if not plan:
+            logger.error("ERROR: No test case configured")
+            messagebox.showerror("Error", "No test case configured. Create a test case before running tests.")
+            return
+        test_case_id = plan.test_case_id
+        
         if self.use_serial:
             # Read from serial
             try:
@@ -436,7 +491,7 @@ class StartTestWindow(ctk.CTkFrame):
                 self.result_label.configure(text="Reading from PCB...", text_color="orange")
                 self.update()
                 
-                test_data = self.serial_handler.read_test_data()
+                test_data = self.serial_handler.read_test_data(self.jig_var.get() or None)
                 voltage = test_data['voltage']
                 current = test_data['current']
                 resistance = test_data['resistance']
@@ -471,84 +526,53 @@ class StartTestWindow(ctk.CTkFrame):
                 messagebox.showerror("Error", "Please enter valid numeric values for all parameters")
                 return
         
-        # Test logic - check if values are within acceptable ranges
-        voltage_ok = 4.5 <= voltage <= 5.5
-        current_ok = 0.1 <= current <= 1.0
-        resistance_ok = 90 <= resistance <= 110
-        
-        test_passed = voltage_ok and current_ok and resistance_ok
+        # Test logic - check if values are within the test case limits
+        failed_params = plan.failed_parameters(voltage, current, resistance)
+        test_passed = not failed_params
         
         # Get notes
         notes = self.notes_entry.get("1.0", "end-1c").strip()
         
-        # Get user_id for save_test_result
+        # Get user_id for save_test_result (from the identity cache filled at
+        # login; the database is only asked on a miss)
         user_id = self.db.get_user_id(self.username)
         
-        # Get test case ID (for now, use the first one or None)
-        test_cases = self.db.get_test_cases()
-        test_case_id = test_cases[0]['id'] if test_cases else None
-        
-        # Save to database with new signature
+        # Measured values are stored as the result of the test case's first stage
         status = "Pass" if test_passed else "Fail"
-        result_id = self.db.save_test_result(
-            test_case_id=test_case_id,
-            user_id=user_id,
-            pcb_serial_number=pcb_id,
-            status=status,
-            overall_pass=test_passed,
-            notes=notes
+        if plan.stages:
+            stage_id = plan.stages[0].stage_id
+        else:
+            stage_id = self.db.get_or_create_default_stage(test_case_id)
+        if not stage_id:
+            logger.error(f"Could not find or create stage_id for test_case_id={test_case_id}")
+        
+        stage_results = []
+        if stage_id:
+            stage_results.append({
+                'stage_id': stage_id,
+                'voltage_measured': voltage,
+                'current_measured': current,
+                'resistance_measured': resistance,
+                'status': status,
+                'failure_reason': ""
+            })
+        
+        # Journal locally; the write-behind worker stores it in MySQL
+        journal_id = write_behind.get_writer().submit(
+            {
+                'test_case_id': test_case_id,
+                'user_id': user_id,
+                'pcb_serial_number': pcb_id,
+                'status': status,
+                'overall_pass': test_passed,
+                'notes': notes
+            },
+            stage_results
         )
         
-        logger.info(f"Test result saved with ID: {result_id}")
-        
-        # Save measured values as stage result for single test
-        if result_id:
-            try:
-                # Get the first stage ID from test_stages table for this test case
-                stage_id = None
-                if test_case_id:
-                    self.db.cursor.execute(
-                        "SELECT id FROM test_stages WHERE test_case_id = %s ORDER BY stage_number LIMIT 1",
-                        (test_case_id,)
-                    )
-                    stage_result = self.db.cursor.fetchone()
-                    if stage_result:
-                        stage_id = stage_result['id']
-                    else:
-                        # Create a default stage if none exists
-                        logger.info(f"No stage found for test case {test_case_id}, creating default stage")
-                        self.db.cursor.execute(
-                            """INSERT INTO test_stages (test_case_id, stage_number, stage_name, description,
-                               voltage_min, voltage_max, current_min, current_max, resistance_min, resistance_max)
-                               VALUES (%s, 1, 'Default Stage', 'Auto-created stage for single PCB test',
-                               0, 999, 0, 999, 0, 9999)""",
-                            (test_case_id,)
-                        )
-                        self.db.conn.commit()
-                        stage_id = self.db.cursor.lastrowid
-                        logger.info(f"Created default stage with ID: {stage_id}")
-                
-                # If we found or created a stage_id, save the stage result
-                if stage_id:
-                    save_result = self.db.save_stage_result(
-                        test_result_id=result_id,
-                        stage_id=stage_id,
-                        voltage_measured=voltage,
-                        current_measured=current,
-                        resistance_measured=resistance,
-                        status=status,
-                        failure_reason=""
-                    )
-                    if save_result:
-                        logger.info(f"Stage result saved successfully with ID {save_result}: V={voltage}, C={current}, R={resistance}")
-                    else:
-                        logger.error(f"Stage result save returned None/False - check database errors")
-                else:
-                    logger.error(f"Could not find or create stage_id for test_case_id={test_case_id}")
-            except Exception as e:
-                logger.error(f"Failed to save stage result: {str(e)}")
-                import traceback
-                logger.error(traceback.format_exc())
+        logger.info(f"Test result queued as {journal_id}: V={voltage}, C={current}, R={resistance}")
+        # Pick up limit changes for the next run
+        self.refresh_plan()
         
         # Log to CSV file automatically
         self.log_test_to_csv(pcb_id, voltage, current, resistance, status, test_passed)
@@ -558,14 +582,6 @@ class StartTestWindow(ctk.CTkFrame):
             self.result_label.configure(text="✓ TEST PASSED", text_color="green")
             messagebox.showinfo("Success", f"PCB {pcb_id} passed all tests!")
         else:
-            failed_params = []
-            if not voltage_ok:
-                failed_params.append("Voltage")
-            if not current_ok:
-                failed_params.append("Current")
-            if not resistance_ok:
-                failed_params.append("Resistance")
-            
             self.result_label.configure(text="✗ TEST FAILED", text_color="red")
             messagebox.showerror(
                 "Test Failed",
@@ -0,0 +1,235 @@
+"""
+Asyncio Serial Transport
+Event-loop driven alternative to the thread-based SerialHandler
+
+On POSIX the port's file descriptor is watched with loop.add_reader /
+loop.add_writer, so any number of jigs share one event loop with no thread
+per port. Where the loop cannot watch the port (Windows COM ports, pyserial
+URL handlers such as loop://), short blocking reads run in the loop's
+default executor instead; the API is the same either way.
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from data.database import Database
+from config.config import SERIAL_READ_TIMEOUT_SECONDS
+from utils.frame_parser import FrameParser, Measurement
+from utils.command_protocol import CommandReply, CommandTracker
+from utils.serial_handler import finish_test_data, merge_test_data, open_serial_port
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+class AsyncSerialHandler:
+    """
+    One serial port read and written from an asyncio event loop
+
+    Every coroutine takes its own timeout and can be cancelled (directly or
+    through asyncio.wait_for); a cancelled read loses no data, since
+    measurements and replies stay queued until a later read takes them.
+    """
+
+    def __init__(self) -> None:
+        self.serial_port: Any = None
+        self.is_connected = False
+        self.measurement_queue: "asyncio.Queue[List[Measurement]]" = asyncio.Queue()
+        self.data_queue: "asyncio.Queue[str]" = asyncio.Queue()  # Text events; ACK/NAK replies go to their command
+        self._parser = FrameParser()
+        self._commands = CommandTracker()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fd: Optional[int] = None
+        self._read_task: Optional["asyncio.Task[None]"] = None
+        self._write_lock = asyncio.Lock()
+
+    async def connect(self, config: Optional[Dict[str, Any]] = None) -> bool:
+        """Open the port from the given settings, or the saved configuration"""
+        loop = asyncio.get_running_loop()
+        if config is None:
+            config = await loop.run_in_executor(None, lambda: Database().get_comm_config())
+        # Non-blocking reads and writes; waiting is left to the event loop
+        port = await loop.run_in_executor(None, lambda: open_serial_port(config, read_timeout=0, write_timeout=0))
+        self.attach(port)
+        logger.info(f"✓ Async serial port opened on {port.port}")
+        return True
+
+    def attach(self, port: Any) -> None:
+        """
+        Start reading an already open pyserial port (a real port, PTY or URL
+        handler), e.g. for simulated stations
+        """
+        self._loop = asyncio.get_running_loop()
+        self.serial_port = port
+        self._parser.reset()
+        self._fd = self._watchable_fd(port)
+        if self._fd is not None:
+            self._loop.add_reader(self._fd, self._on_readable)
+        else:
+            port.timeout = SERIAL_READ_TIMEOUT_SECONDS
+            self._read_task = self._loop.create_task(self._read_in_executor(port))
+        self.is_connected = True
+
+    def _watchable_fd(self, port: Any) -> Optional[int]:
+        """The port's file descriptor, if the running loop can watch it"""
+        try:
+            fd = port.fileno()
+            self._loop.add_reader(fd, lambda: None)
+            self._loop.remove_reader(fd)
+            return fd
+        except (AttributeError, NotImplementedError, ValueError, OSError):
+            return None
+
+    def _on_readable(self) -> None:
+        """Called by the event loop when the port has bytes waiting"""
+        try:
+            data = self.serial_port.read(self.serial_port.in_waiting or 1)
+        except Exception as e:
+            logger.error(f"Error reading serial data: {e}")
+            self._stop_watching()
+            return
+        if data:
+            self._dispatch(data)
+
+    async def _read_in_executor(self, port: Any) -> None:
+        loop = asyncio.get_running_loop()
+        while self.is_connected:
+            try:
+                data = await loop.run_in_executor(None, lambda: port.read(port.in_waiting or 1))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.is_connected:
+                    logger.error(f"Error reading serial data: {e}")
+                return
+            if data:
+                self._dispatch(data)
+
+    def _dispatch(self, data: bytes) -> None:
+        measurements, messages = self._parser.feed(data)
+        if measurements:
+            self.measurement_queue.put_nowait(measurements)
+        for message in messages:
+            if not self._commands.handle_message(message):
+                self.data_queue.put_nowait(message)
+
+    def _stop_watching(self) -> None:
+        if self._fd is not None and self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+
+    async def disconnect(self) -> None:
+        """Stop reading and close the port"""
+        self.is_connected = False
+        self._stop_watching()
+        if self._read_task is not None:
+            # Let the executor read in flight finish before the port closes
+            self._read_task.cancel()
+            await asyncio.gather(self._read_task, return_exceptions=True)
+            await asyncio.sleep(SERIAL_READ_TIMEOUT_SECONDS)
+            self._read_task = None
+        if self.serial_port is not None and self.serial_port.is_open:
+            self.serial_port.close()
+        self.serial_port = None
+        self._commands.fail_all("disconnected")
+
+    async def write(self, data: str) -> bool:
+        """Write data to the port, waiting for the port to accept all of it"""
+        if not self.is_connected:
+            raise Exception("Not connected to serial port")
+        pending = memoryview(data.encode('utf-8'))
+        async with self._write_lock:
+            try:
+                while pending:
+                    pending = pending[self._write_some(pending):]
+                    if pending:
+                        await self._writable()
+                return True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                raise Exception(f"Failed to write data: {str(e)}")
+
+    def _write_some(self, data: memoryview) -> int:
+        """Write what the port accepts without blocking; returns the bytes written"""
+        if self._fd is None:
+            return self.serial_port.write(data) or 0
+        # pyserial retries a full non-blocking port in a busy loop, so write the
+        # descriptor directly and let the event loop wait for room instead
+        try:
+            return os.write(self._fd, data)
+        except BlockingIOError:
+            return 0
+
+    async def _writable(self) -> None:
+        """Wait until the port can take more bytes"""
+        fd = self._fd
+        if fd is None:
+            await asyncio.sleep(SERIAL_READ_TIMEOUT_SECONDS)
+            return
+        ready = self._loop.create_future()
+        self._loop.add_writer(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            self._loop.remove_writer(fd)
+
+    async def read(self, timeout: float = 1.0) -> Optional[str]:
+        """Read a text event (neither a measurement nor a command reply), or None on timeout"""
+        try:
+            return await asyncio.wait_for(self.data_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def read_measurements(self, timeout: float = 1.0) -> List[Measurement]:
+        """Read the next batch of parsed measurements, or an empty list on timeout"""
+        try:
+            return await asyncio.wait_for(self.measurement_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+
+    async def read_test_data(self, timeout: float = 20.0) -> Dict[str, float]:
+        """
+        Read one voltage, current and resistance reading
+
+        Args:
+            timeout: Seconds to wait for the full set; missing values are then
+                filled with 0 as in SerialHandler.read_test_data
+
+        Returns dict with voltage, current, resistance
+        """
+        logger.info("Reading test data from PCB...")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        result: Dict[str, float] = {}
+        while True:
+            remaining = deadline - loop.time()
+            measurements = await self.read_measurements(remaining) if remaining > 0 else []
+            if not measurements:
+                return finish_test_data(result)
+            if merge_test_data(result, measurements):
+                logger.info(f"All test data received: {result}")
+                return result
+
+    async def submit_command(self, command: str, timeout: float = 2.0) -> "asyncio.Future[CommandReply]":
+        """
+        Send a command and return once it is written, without waiting for its reply
+
+        Any number of commands may be in flight; each is failed with detail
+        "timeout" if no reply arrives within its own timeout.
+
+        Returns an asyncio future resolving to a CommandReply
+        """
+        future, line = self._commands.begin(command, timeout)
+        try:
+            await self.write(line)
+        except BaseException:
+            self._commands.abandon(future, "write failed")
+            raise
+        self._loop.call_later(timeout, self._commands.expire)
+        return asyncio.wrap_future(future)
+
+    async def send_command(self, command: str, timeout: float = 2.0) -> bool:
+        """Send command to PCB and wait up to timeout seconds for acknowledgment"""
+        reply = await (await self.submit_command(command, timeout))
+        return reply.ok
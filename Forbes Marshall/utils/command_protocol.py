@@ -0,0 +1,148 @@
+"""
+Jig Command Protocol
+Sequence-tagged commands and the routing of ACK/NAK replies back to them
+
+By default commands are sent as plain ``<command>`` lines, as existing jig
+firmware expects, and each untagged ``ACK`` / ``NAK`` reply completes the
+oldest command in flight. With SERIAL_TAG_COMMANDS on (firmware with sequence
+support) they are sent as ``<seq>:<command>`` and the jig answers each with
+``ACK <seq>`` or ``NAK <seq> [reason]``, so replies may arrive in any order.
+Either way several commands may be in flight at once, each with its own
+deadline.
+Text lines that are not replies are events and never complete a command.
+"""
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import NamedTuple, Optional, Tuple
+from config.config import SERIAL_TAG_COMMANDS
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Sequence IDs run 1..SEQUENCE_LIMIT - 1 and wrap
+SEQUENCE_LIMIT = 10000
+
+_COMMAND = re.compile(r'^(\d+):(.*)$')
+_REPLY = re.compile(r'^(ACK|NAK)\b[\s:#]*(\d+)?\s*(.*)$', re.IGNORECASE)
+
+
+class CommandReply(NamedTuple):
+    """Outcome of one command"""
+    seq: int
+    ok: bool
+    detail: str = ""  # NAK reason, "timeout", or whatever followed the ACK
+
+
+class _Pending(NamedTuple):
+    command: str
+    deadline: float
+    future: "Future[CommandReply]"
+
+
+def parse_command(line: str) -> Tuple[Optional[int], str]:
+    """Split a received command line into (seq or None if untagged, command); used by simulated jigs"""
+    match = _COMMAND.match(line.strip())
+    if not match:
+        return None, line.strip()
+    return int(match.group(1)), match.group(2).strip()
+
+
+def parse_reply(line: str) -> Optional[Tuple[bool, Optional[int], str]]:
+    """Split an ACK/NAK line into (ok, seq or None, detail); None for any other line"""
+    match = _REPLY.match(line.strip())
+    if not match:
+        return None
+    kind, seq, detail = match.groups()
+    return kind.upper() == 'ACK', int(seq) if seq else None, detail
+
+
+class CommandTracker:
+    """
+    Commands in flight on one port
+
+    Thread-safe: begin() is called by writers, handle_message() and
+    expire() by the reader, and a future may be waited on from anywhere.
+    """
+
+    def __init__(self, tag_commands: bool = SERIAL_TAG_COMMANDS) -> None:
+        self.tag_commands = tag_commands
+        self._pending: "OrderedDict[int, _Pending]" = OrderedDict()
+        self._next_seq = 1
+        self._lock = threading.Lock()
+
+    def begin(self, command: str, timeout: float) -> Tuple["Future[CommandReply]", str]:
+        """
+        Register a command about to be written
+
+        Returns:
+            tuple: (future resolving to its CommandReply, line to write)
+        """
+        future: "Future[CommandReply]" = Future()
+        with self._lock:
+            seq = self._next_seq
+            while seq in self._pending:
+                seq = seq % (SEQUENCE_LIMIT - 1) + 1
+            self._next_seq = seq % (SEQUENCE_LIMIT - 1) + 1
+            self._pending[seq] = _Pending(command, time.monotonic() + timeout, future)
+        line = f"{seq}:{command}\n" if self.tag_commands else f"{command}\n"
+        return future, line
+
+    def handle_message(self, line: str) -> bool:
+        """Complete the command a reply belongs to; returns False if the line is not a reply"""
+        reply = parse_reply(line)
+        if reply is None:
+            return False
+        ok, seq, detail = reply
+        with self._lock:
+            if seq is None and self._pending:
+                seq = next(iter(self._pending))
+            pending = self._pending.pop(seq, None) if seq is not None else None
+        if pending is None:
+            logger.warning(f"Reply for no command in flight: {line}")
+        else:
+            if not ok:
+                logger.warning(f"Command {pending.command} rejected: {detail or 'NAK'}")
+            self._finish(pending, CommandReply(seq, ok, detail))
+        return True
+
+    def abandon(self, future: "Future[CommandReply]", detail: str) -> None:
+        """Fail a command that never reached the jig (e.g. its write failed)"""
+        with self._lock:
+            seq = next((seq for seq, pending in self._pending.items() if pending.future is future), None)
+            pending = self._pending.pop(seq, None)
+        if pending is not None:
+            self._finish(pending, CommandReply(seq, False, detail))
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Fail every command whose deadline has passed"""
+        if not self._pending:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [(seq, pending) for seq, pending in self._pending.items() if pending.deadline <= now]
+            for seq, _ in expired:
+                del self._pending[seq]
+        for seq, pending in expired:
+            logger.warning(f"No reply to command {pending.command} (seq {seq})")
+            self._finish(pending, CommandReply(seq, False, "timeout"))
+
+    def fail_all(self, detail: str) -> None:
+        """Fail every command in flight, e.g. when the port closes"""
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+        for seq, command in pending:
+            self._finish(command, CommandReply(seq, False, detail))
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    @staticmethod
+    def _finish(pending: _Pending, reply: CommandReply) -> None:
+        if not pending.future.done():
+            pending.future.set_result(reply)
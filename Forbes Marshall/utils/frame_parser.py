@@ -0,0 +1,268 @@
+"""
+Measurement Frame Parser
+Incremental parser for the text and binary measurement frames sent by test jigs
+
+Text frames are lines of the form ``PCB_ID,Parameter,Value`` (e.g.
+``235,Voltage,4.4``). Binary frames are 10 bytes::
+
+    A5 5A | pcb_id uint16 LE | parameter code uint8 | value float32 LE | checksum uint8
+
+where the checksum is the sum of the 7 bytes between the sync word and the
+checksum, modulo 256. Both formats may be mixed on one stream.
+"""
+import re
+import struct
+import logging
+import numpy as np
+from itertools import repeat
+from typing import Dict, List, NamedTuple, Tuple
+from config.config import SERIAL_MAX_LINE_BYTES
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+SYNC = b'\xa5\x5a'
+_SYNC_FIRST = SYNC[0]
+_PAYLOAD = struct.Struct('<HBf')
+BINARY_FRAME_SIZE = len(SYNC) + _PAYLOAD.size + 1
+
+# A binary frame as (sync, pcb_id, code, value, checksum) and as its checksummed
+# bytes, for frame-by-frame parsing; the same layout as a numpy record for whole runs
+_FRAME = struct.Struct('<2sHBfB')
+_CHECKSUMMED = struct.Struct(f'<2x{_PAYLOAD.size}Bx')
+_FRAME_DTYPE = np.dtype([('sync', 'S2'), ('pcb_id', '<u2'), ('code', 'u1'), ('value', '<f4'), ('checksum', 'u1')])
+
+# Shorter runs of binary frames are cheaper to parse one by one than with numpy
+_BLOCK_MIN_FRAMES = 16
+
+# One text line: three comma-separated fields (anything after a third comma
+# is ignored), or any other line, which is passed on as a message
+_LINE = re.compile(rb'([^,\n]*),([^,\n]*),([^,\n]*)[^\n]*\n|([^\n]*)\n')
+
+# Binary parameter codes, and the canonical names both formats map to
+PARAMETER_CODES = {1: 'voltage', 2: 'current', 3: 'resistance'}
+_TEXT_PARAMETER_NAMES = {spelling: name for name in PARAMETER_CODES.values()
+                         for spelling in (name, name.capitalize(), name.upper())}
+_PARAMETER_NAMES = {spelling.encode(): name for spelling, name in _TEXT_PARAMETER_NAMES.items()}
+
+# Lines starting with these are command replies (utils.command_protocol), not measurements
+_REPLY_PREFIXES = (b'ACK', b'NAK')
+
+# Consumed bytes are reclaimed once this many have built up at the front of the buffer
+_COMPACT_BYTES = 64 * 1024
+
+# Distinct PCB IDs remembered in decoded form
+_PCB_ID_CACHE_SIZE = 1024
+
+
+class Measurement(NamedTuple):
+    """One parsed measurement"""
+    pcb_id: str
+    parameter: str
+    value: float
+
+
+# Builds a Measurement without going through its Python-level __new__
+_new_measurement = tuple.__new__
+
+
+def encode_binary(pcb_id: int, parameter: str, value: float) -> bytes:
+    """Build a binary frame (used by jig simulators and tests)"""
+    code = next(code for code, name in PARAMETER_CODES.items() if name == parameter)
+    payload = _PAYLOAD.pack(pcb_id, code, value)
+    return SYNC + payload + bytes([sum(payload) & 0xFF])
+
+
+class FrameParser:
+    """
+    Turns received bytes into measurements, whatever chunks they arrive in
+
+    Bytes are appended to one bytearray and parsed in place. Complete text
+    lines are decoded once and split column-wise, and runs of binary frames
+    are read through a memoryview with numpy, so per-frame Python work is
+    avoided; odd input falls back to line by line / frame by frame parsing.
+    Consumed bytes are only reclaimed in bulk. A malformed frame or
+    undecodable byte is counted in errors and skipped, never raised.
+    """
+
+    def __init__(self, max_line_bytes: int = SERIAL_MAX_LINE_BYTES) -> None:
+        """
+        Args:
+            max_line_bytes: Longest text line kept while waiting for its newline
+        """
+        self.max_line_bytes = max_line_bytes
+        self.errors = 0
+        self._buffer = bytearray()
+        self._start = 0
+        self._pcb_ids: Dict[bytes, str] = {}
+
+    def feed(self, data: bytes) -> Tuple[List[Measurement], List[str]]:
+        """
+        Add received bytes and parse every frame they complete
+
+        Returns:
+            tuple: (measurements, other text lines such as "ACK"), each in arrival order
+        """
+        self._buffer += data
+        measurements: List[Measurement] = []
+        messages: List[str] = []
+        buffer = self._buffer
+        end = len(buffer)
+        pos = self._start
+
+        while pos < end:
+            if buffer[pos] == _SYNC_FIRST:
+                parsed = self._parse_binary(pos, end, measurements)
+                if parsed == pos:
+                    break  # Incomplete frame; wait for more bytes
+                pos = parsed
+                continue
+
+            # Text runs up to the next binary frame; only complete lines are parsed
+            sync = buffer.find(SYNC, pos, end)
+            stop = end if sync < 0 else sync
+            last_newline = buffer.rfind(b'\n', pos, stop)
+            if last_newline >= 0:
+                self._parse_text(pos, last_newline + 1, measurements, messages)
+                pos = last_newline + 1
+            if sync >= 0:
+                # A binary frame interrupts a partial line: drop the partial line
+                if buffer[pos:sync].strip():
+                    self.errors += 1
+                pos = sync
+                continue
+            if end - pos > self.max_line_bytes:
+                logger.warning(f"Discarding {end - pos} bytes received without a newline")
+                self.errors += 1
+                pos = end
+            break
+
+        self._start = pos
+        if pos == end:
+            buffer.clear()
+            self._start = 0
+        elif pos >= _COMPACT_BYTES:
+            del buffer[:pos]
+            self._start = 0
+        return measurements, messages
+
+    def _parse_binary(self, pos: int, end: int, measurements: List[Measurement]) -> int:
+        """Parse the run of binary frames starting at pos; returns the position after it"""
+        count = (end - pos) // BINARY_FRAME_SIZE
+        if count == 0:
+            if end - pos > 1 and self._buffer[pos + 1] != SYNC[1]:
+                # A stray sync byte, not the start of a frame
+                self.errors += 1
+                return pos + 1
+            return pos
+
+        append = measurements.append
+        first = pos
+        with memoryview(self._buffer)[pos:pos + count * BINARY_FRAME_SIZE] as run:
+            if count >= _BLOCK_MIN_FRAMES and self._parse_binary_block(run, measurements):
+                return pos + count * BINARY_FRAME_SIZE
+            for (sync, pcb_id, code, value, checksum), payload in zip(_FRAME.iter_unpack(run),
+                                                                       _CHECKSUMMED.iter_unpack(run)):
+                if sync != SYNC or sum(payload) & 0xFF != checksum:
+                    if pos != first:
+                        return pos  # End of the run; whatever follows is parsed by feed()
+                    # Not a frame after all; resynchronise on the next byte
+                    self.errors += 1
+                    return pos + 1
+                parameter = PARAMETER_CODES.get(code)
+                if parameter is None:
+                    self.errors += 1
+                else:
+                    append(_new_measurement(Measurement, (str(pcb_id), parameter, value)))
+                pos += BINARY_FRAME_SIZE
+        return pos
+
+    @staticmethod
+    def _parse_binary_block(run: memoryview, measurements: List[Measurement]) -> bool:
+        """
+        Parse a run of binary frames column-wise with numpy
+
+        Returns False, having added nothing, unless every frame in the run
+        is valid; _parse_binary then goes frame by frame.
+        """
+        frames = np.frombuffer(run, dtype=_FRAME_DTYPE)
+        raw = np.frombuffer(run, dtype=np.uint8).reshape(-1, BINARY_FRAME_SIZE)
+        if not (frames['sync'] == SYNC).all():
+            return False
+        # Each frame's byte sum minus its checksum must be a multiple of 256
+        if ((raw[:, 2:-1].sum(axis=1, dtype=np.uint32) - raw[:, -1]) % 256).any():
+            return False
+        try:
+            parameters = list(map(PARAMETER_CODES.__getitem__, frames['code'].tolist()))
+        except KeyError:
+            return False
+        pcb_ids = map(str, frames['pcb_id'].tolist())
+        values = frames['value'].astype(np.float64).tolist()
+        measurements.extend(map(_new_measurement, repeat(Measurement), zip(pcb_ids, parameters, values)))
+        return True
+
+    def _parse_text(self, start: int, end: int, measurements: List[Measurement], messages: List[str]) -> None:
+        """Parse the complete lines between start and end"""
+        if self._parse_text_block(start, end, measurements):
+            return
+        append = measurements.append
+        for pcb_id, name, value, other in _LINE.findall(self._buffer, start, end):
+            if not value or pcb_id.lstrip()[:3].upper() in _REPLY_PREFIXES:
+                # A command reply stays a message even if its reason contains commas
+                raw = b','.join((pcb_id, name, value)) if value else other
+                line = raw.decode('utf-8', errors='replace').strip()
+                if line:
+                    messages.append(line)
+                continue
+
+            parameter = _PARAMETER_NAMES.get(name)
+            if parameter is None:
+                parameter = name.strip().lower().decode('utf-8', errors='replace')
+            try:
+                # float() accepts bytes and ignores surrounding whitespace, including '\r'
+                number = float(value)
+            except ValueError:
+                self.errors += 1
+                line = b','.join((pcb_id, name, value)).decode('utf-8', errors='replace').strip()
+                logger.warning(f"Invalid measurement line: {line}")
+                continue
+            append(_new_measurement(Measurement, (self._pcb_id(pcb_id), parameter, number)))
+
+    def _parse_text_block(self, start: int, end: int, measurements: List[Measurement]) -> bool:
+        """
+        Parse lines that are all plain "id,Parameter,value" in column-wise C-level passes
+
+        Returns False, having added nothing, if any line does not fit (a
+        reply, extra fields, unknown parameter, bad value); _parse_text then
+        goes line by line.
+        """
+        text = self._buffer[start:end].decode('utf-8', errors='replace')
+        # Each newline ends the field before it, so a field holds at most one
+        # newline, at its end. Every line has exactly two commas only if all
+        # newlines fall in the value column; a matching total comma count alone
+        # would let a short and a long line be re-framed as two measurements.
+        fields = text.replace('\n', '\n,').split(',')
+        if (len(fields) != 3 * text.count('\n') + 1
+                or '\n' in ''.join(fields[0::3]) or '\n' in ''.join(fields[1::3])):
+            return False
+        try:
+            parameters = list(map(_TEXT_PARAMETER_NAMES.__getitem__, fields[1::3]))
+            values = list(map(float, fields[2::3]))
+        except (KeyError, ValueError):
+            return False
+        pcb_ids = map(str.strip, fields[0:-1:3])
+        measurements.extend(map(_new_measurement, repeat(Measurement), zip(pcb_ids, parameters, values)))
+        return True
+
+    def _pcb_id(self, raw: bytes) -> str:
+        pcb_id = self._pcb_ids.get(raw)
+        if pcb_id is None:
+            if len(self._pcb_ids) >= _PCB_ID_CACHE_SIZE:
+                self._pcb_ids.clear()
+            pcb_id = self._pcb_ids[raw] = raw.decode('utf-8', errors='replace').strip()
+        return pcb_id
+
+    def reset(self) -> None:
+        """Drop any partial frame"""
+        self._buffer.clear()
+        self._start = 0
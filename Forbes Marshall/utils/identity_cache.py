@@ -0,0 +1,54 @@
+"""
+Identity Cache
+In-process username -> user ID map shared by every view
+"""
+import threading
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_user_ids: Dict[str, int] = {}
+
+
+def remember(username: str, user_id: int) -> None:
+    """
+    Record the ID of a user
+
+    Called by SessionManager at login and by Database after a lookup miss.
+
+    Args:
+        username: Username
+        user_id: User ID from database
+    """
+    if not username or user_id is None:
+        return
+    with _lock:
+        _user_ids[username] = int(user_id)
+
+
+def get_user_id(username: str) -> Optional[int]:
+    """
+    Get a cached user ID
+
+    Returns:
+        int: User ID, or None if the user has not been seen yet
+    """
+    with _lock:
+        return _user_ids.get(username)
+
+
+def invalidate(username: Optional[str] = None) -> None:
+    """
+    Forget cached identities after users change
+
+    Args:
+        username: User to forget, or None to clear the whole cache
+    """
+    with _lock:
+        if username is None:
+            _user_ids.clear()
+            logger.info("Identity cache cleared")
+        else:
+            _user_ids.pop(username, None)
@@ -5,22 +5,170 @@ import serial
 import serial.tools.list_ports
 import threading
 import queue
-import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import logging
 from data.database import Database
+from config.config import SERIAL_READ_TIMEOUT_SECONDS
+from utils.frame_parser import FrameParser
+from utils.command_protocol import CommandTracker
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+
+def collect_test_data(read_measurements, max_attempts=10, timeout=2.0):
+    """
+    Gather one voltage, current and resistance reading
+
+    Args:
+        read_measurements: Callable(timeout) returning the next list of Measurement (empty on timeout)
+        max_attempts: Give up after this many reads without data
+        timeout: Seconds each read waits
+
+    Returns dict with voltage, current, resistance
+    """
+    result = {}
+    timeout_counter = 0
+    
+    while timeout_counter < max_attempts:
+        measurements = read_measurements(timeout)
+        
+        if not measurements:
+            timeout_counter += 1
+            continue
+        
+        # Check if we have all required values
+        if merge_test_data(result, measurements):
+            logger.info(f"All test data received: {result}")
+            return result
+    
+    return finish_test_data(result)
+
+
+def merge_test_data(result, measurements):
+    """Add measurements to a partial test data dict; returns True once it is complete"""
+    for measurement in measurements:
+        logger.info(f"Parsed - PCB ID: {measurement.pcb_id}, Parameter: {measurement.parameter}, "
+                    f"Value: {measurement.value}")
+        if measurement.parameter in ('voltage', 'current', 'resistance'):
+            result[measurement.parameter] = measurement.value
+    return len(result) == 3
+
+
+def finish_test_data(result):
+    """Complete test data that stopped arriving, or raise if none came at all"""
+    # Check if we got partial data
+    if result:
+        logger.warning(f"Incomplete data received, using what we have: {result}")
+        # Fill in missing values with 0
+        for parameter in ('voltage', 'current', 'resistance'):
+            result.setdefault(parameter, 0)
+        return result
+    
+    raise Exception("No test data received from PCB after multiple attempts")
+
+
+def open_serial_port(config, read_timeout=SERIAL_READ_TIMEOUT_SECONDS, write_timeout=None):
+    """
+    Open the serial port described by a communication configuration
+
+    Args:
+        config: Saved communication settings (com_port, baud_rate, ...)
+        read_timeout: Port read timeout in seconds (0 for non-blocking)
+        write_timeout: Port write timeout; defaults to the configured timeout
+
+    Raises Exception with the available ports listed if the port cannot be opened
+    """
+    if not config:
+        logger.error("No communication configuration found in database")
+        available_ports = SerialHandler.get_available_ports()
+        logger.info(f"Available ports detected: {available_ports}")
+        ports_info = "\n".join(available_ports) if available_ports else "No ports found"
+        error_msg = f"No communication configuration found. Please configure in settings.\n\nAvailable ports:\n{ports_info}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    
+    try:
+        # Get port from config - handle both 'port' and 'com_port' key names
+        port = config.get('com_port') or config.get('port')
+        baud_rate = config.get('baud_rate')
+        data_bits = config.get('data_bits')
+        timeout = config.get('timeout_seconds') or config.get('timeout')
+        
+        logger.info(f"Configuration loaded: Port={port}, BaudRate={baud_rate}, DataBits={data_bits}, Timeout={timeout}")
+        
+        # Check if configured port exists
+        available_ports_list = [p.split()[0] for p in SerialHandler.get_available_ports()]  # Extract just the port name
+        
+        if port not in available_ports_list:
+            logger.warning(f"Configured port {port} not available on system")
+            available_ports = SerialHandler.get_available_ports()
+            ports_info = "\n".join(available_ports) if available_ports else "No ports found"
+            
+            # Suggest the first available port
+            suggestion = ""
+            if available_ports_list:
+                suggestion = f"\n\n[SUGGESTION] Use {available_ports_list[0]} instead and save in Communication Settings."
+            
+            error_msg = f"Configured port '{port}' is not available on this system.{suggestion}\n\nAvailable ports:\n{ports_info}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        
+        # Map parity string to serial constant
+        parity_map = {
+            'None': serial.PARITY_NONE,
+            'Even': serial.PARITY_EVEN,
+            'Odd': serial.PARITY_ODD,
+            'Mark': serial.PARITY_MARK,
+            'Space': serial.PARITY_SPACE
+        }
+        
+        # Map stop bits string to serial constant
+        stopbits_map = {
+            '1': serial.STOPBITS_ONE,
+            '1.5': serial.STOPBITS_ONE_POINT_FIVE,
+            '2': serial.STOPBITS_TWO
+        }
+        
+        logger.info(f"Opening serial port: {port}")
+        return serial.Serial(
+            port=port,
+            baudrate=baud_rate,
+            bytesize=data_bits,
+            parity=parity_map.get(config.get('parity', 'None'), serial.PARITY_NONE),
+            stopbits=stopbits_map.get(str(config.get('stop_bits', '1')), serial.STOPBITS_ONE),
+            timeout=read_timeout,
+            write_timeout=(float(timeout) if timeout else 5.0) if write_timeout is None else write_timeout
+        )
+        
+    except serial.SerialException as e:
+        logger.error(f"Serial connection failed: {str(e)}")
+        available_ports = SerialHandler.get_available_ports()
+        ports_info = "\n".join(available_ports) if available_ports else "No ports found"
+        logger.error(f"Available ports: {ports_info}")
+        error_msg = f"Failed to connect to {config.get('com_port') or config.get('port')}: {str(e)}\n\nAvailable ports:\n{ports_info}"
+        raise Exception(error_msg)
+
+
 class SerialHandler:
-    def __init__(self):
+    def __init__(self, on_measurements=None):
+        """
+        Args:
+            on_measurements: Optional callable receiving each list of parsed
+                measurements from the reader thread, instead of queueing them
+        """
         self.serial_port = None
         self.is_connected = False
         self.read_thread = None
-        self.data_queue = queue.Queue()
+        self.data_queue = queue.Queue()  # Text events; ACK/NAK replies go to their command
+        self.measurement_queue = queue.Queue()  # Lists of Measurement, one per read
         self.stop_reading = False
         self.db = Database()
-        self._lock = threading.Lock()  # Thread synchronization lock
+        self._lock = threading.Lock()  # Guards opening and closing the port
+        self._write_lock = threading.Lock()  # Serialises writers; the reader never takes it
+        self._parser = FrameParser()
+        self._commands = CommandTracker()
+        self.on_measurements = on_measurements
     
     @staticmethod
     def get_available_ports():
@@ -30,88 +178,22 @@ class SerialHandler:
             ports.append(f"{port.device} ({port.description})")
         return ports
     
-    def connect(self):
-        """Connect to serial port using saved configuration"""
+    def connect(self, config=None):
+        """Connect to serial port using the given settings, or the saved configuration"""
         logger.info("=" * 60)
         logger.info("Attempting serial connection...")
         logger.info("=" * 60)
         
-        config = self.db.get_comm_config()
-        
-        if not config:
-            logger.error("No communication configuration found in database")
-            available_ports = self.get_available_ports()
-            logger.info(f"Available ports detected: {available_ports}")
-            ports_info = "\n".join(available_ports) if available_ports else "No ports found"
-            error_msg = f"No communication configuration found. Please configure in settings.\n\nAvailable ports:\n{ports_info}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+        config = config or self.db.get_comm_config()
+        # Reads block only briefly so the reader notices disconnect(); the
+        # configured timeout bounds writes instead
+        self.serial_port = open_serial_port(config)
         
-        try:
-            # Get port from config - handle both 'port' and 'com_port' key names
-            port = config.get('com_port') or config.get('port')
-            baud_rate = config.get('baud_rate')
-            data_bits = config.get('data_bits')
-            timeout = config.get('timeout_seconds') or config.get('timeout')
-            
-            logger.info(f"Configuration loaded: Port={port}, BaudRate={baud_rate}, DataBits={data_bits}, Timeout={timeout}")
-            
-            # Check if configured port exists
-            available_ports_list = [p.split()[0] for p in self.get_available_ports()]  # Extract just the port name
-            
-            if port not in available_ports_list:
-                logger.warning(f"Configured port {port} not available on system")
-                available_ports = self.get_available_ports()
-                ports_info = "\n".join(available_ports) if available_ports else "No ports found"
-                
-                # Suggest the first available port
-                suggestion = ""
-                if available_ports_list:
-                    suggestion = f"\n\n[SUGGESTION] Use {available_ports_list[0]} instead and save in Communication Settings."
-                
-                error_msg = f"Configured port '{port}' is not available on this system.{suggestion}\n\nAvailable ports:\n{ports_info}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
-            
-            # Map parity string to serial constant
-            parity_map = {
-                'None': serial.PARITY_NONE,
-                'Even': serial.PARITY_EVEN,
-                'Odd': serial.PARITY_ODD,
-                'Mark': serial.PARITY_MARK,
-                'Space': serial.PARITY_SPACE
-            }
-            
-            # Map stop bits string to serial constant
-            stopbits_map = {
-                '1': serial.STOPBITS_ONE,
-                '1.5': serial.STOPBITS_ONE_POINT_FIVE,
-                '2': serial.STOPBITS_TWO
-            }
-            
-            logger.info(f"Opening serial port: {port}")
-            self.serial_port = serial.Serial(
-                port=port,
-                baudrate=baud_rate,
-                bytesize=data_bits,
-                parity=parity_map.get(config.get('parity', 'None'), serial.PARITY_NONE),
-                stopbits=stopbits_map.get(str(config.get('stop_bits', '1')), serial.STOPBITS_ONE),
-                timeout=float(timeout) if timeout else 5.0
-            )
-            
-            self.is_connected = True
-            logger.info(f"✓ Serial port opened successfully on {port}")
-            self.start_reading()
-            logger.info("Background read thread started")
-            return True
-            
-        except serial.SerialException as e:
-            logger.error(f"Serial connection failed: {str(e)}")
-            available_ports = self.get_available_ports()
-            ports_info = "\n".join(available_ports) if available_ports else "No ports found"
-            logger.error(f"Available ports: {ports_info}")
-            error_msg = f"Failed to connect to {config.get('com_port') or config.get('port')}: {str(e)}\n\nAvailable ports:\n{ports_info}"
-            raise Exception(error_msg)
+        self.is_connected = True
+        logger.info(f"✓ Serial port opened successfully on {self.serial_port.port}")
+        self.start_reading()
+        logger.info("Background read thread started")
+        return True
     
     def disconnect(self):
         """Disconnect from serial port"""
@@ -126,27 +208,42 @@ class SerialHandler:
             self.serial_port = None
 
         self.is_connected = False
+        self._commands.fail_all("disconnected")
     
     def start_reading(self):
         """Start reading data in background thread"""
         self.stop_reading = False
-        self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._parser.reset()
+        self.read_thread = threading.Thread(target=self._read_loop, args=(self.serial_port,), daemon=True)
         self.read_thread.start()
     
-    def _read_loop(self):
-        """Background thread for reading serial data"""
+    def _read_loop(self, port):
+        """
+        Background thread for reading serial data
+
+        Blocks in port.read() until bytes arrive or the short read timeout
+        expires, so frames are queued as soon as they are complete. No
+        lock is held while reading; disconnect() closes the port only after
+        this thread has stopped.
+        """
         while not self.stop_reading:
             try:
-                with self._lock:
-                    if self.serial_port is None or not self.serial_port.is_open:
-                        break
-                    if self.serial_port.in_waiting > 0:
-                        data = self.serial_port.readline().decode('utf-8').strip()
-                        if data:
-                            self.data_queue.put(data)
-                time.sleep(0.01)  # Small delay to prevent CPU spinning
+                # Wait for at least one byte, then take whatever else has arrived
+                data = port.read(port.in_waiting or 1)
+                self._commands.expire()
+                if data:
+                    measurements, messages = self._parser.feed(data)
+                    if measurements:
+                        if self.on_measurements:
+                            self.on_measurements(measurements)
+                        else:
+                            self.measurement_queue.put(measurements)
+                    for message in messages:
+                        if not self._commands.handle_message(message):
+                            self.data_queue.put(message)
             except Exception as e:
-                logger.error(f"Error reading serial data: {e}")
+                if not self.stop_reading:
+                    logger.error(f"Error reading serial data: {e}")
                 break
     
     def write(self, data):
@@ -155,97 +252,65 @@ class SerialHandler:
             raise Exception("Not connected to serial port")
 
         try:
-            with self._lock:
-                if self.serial_port is None:
-                    raise Exception("Serial port is not available")
-                self.serial_port.write(data.encode('utf-8'))
+            port = self.serial_port
+            if port is None:
+                raise Exception("Serial port is not available")
+            with self._write_lock:
+                port.write(data.encode('utf-8'))
             return True
         except Exception as e:
             raise Exception(f"Failed to write data: {str(e)}")
     
     def read(self, timeout=1.0):
-        """Read data from queue with timeout"""
+        """Read a text event (a line that is neither a measurement nor a command reply) with timeout"""
         try:
             return self.data_queue.get(timeout=timeout)
         except queue.Empty:
             return None
     
+    def read_measurements(self, timeout=1.0):
+        """Read the next batch of parsed measurements, or an empty list on timeout"""
+        try:
+            return self.measurement_queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+    
     def read_test_data(self):
         """
         Read test data from PCB
-        Expected format: 
+        Expected format (text lines, or the binary frames in utils.frame_parser): 
         235,Voltage,4.4
         235,resistance,1
         235,current,0
         
         Returns dict with voltage, current, resistance
         """
-        result = {}
-        timeout_counter = 0
-        max_attempts = 10  # Try reading up to 10 lines
-        
         logger.info("Reading test data from PCB...")
-        
-        while timeout_counter < max_attempts:
-            data = self.read(timeout=2.0)
-            
-            if not data:
-                timeout_counter += 1
-                continue
-            
-            try:
-                # Parse CSV format: PCB_ID,Parameter,Value
-                parts = data.strip().split(',')
-                
-                if len(parts) < 3:
-                    logger.warning(f"Invalid data format: {data}")
-                    continue
-                
-                pcb_id = parts[0].strip()
-                parameter = parts[1].strip().lower()
-                value = float(parts[2].strip())
-                
-                logger.info(f"Parsed - PCB ID: {pcb_id}, Parameter: {parameter}, Value: {value}")
-                
-                # Map parameter names to result keys
-                if parameter == 'voltage':
-                    result['voltage'] = value
-                elif parameter == 'current':
-                    result['current'] = value
-                elif parameter == 'resistance':
-                    result['resistance'] = value
-                
-                # Check if we have all required values
-                if len(result) == 3:
-                    logger.info(f"All test data received: {result}")
-                    return result
-                    
-            except Exception as e:
-                logger.warning(f"Failed to parse data line: {data} - {str(e)}")
-                continue
-        
-        # Check if we got partial data
-        if result:
-            logger.warning(f"Incomplete data received, using what we have: {result}")
-            # Fill in missing values with 0
-            if 'voltage' not in result:
-                result['voltage'] = 0
-            if 'current' not in result:
-                result['current'] = 0
-            if 'resistance' not in result:
-                result['resistance'] = 0
-            return result
-        
-        raise Exception("No test data received from PCB after multiple attempts")
+        return collect_test_data(self.read_measurements)
     
-    def send_command(self, command):
+    def submit_command(self, command, timeout=2.0):
+        """
+        Send a command without waiting for its reply
+
+        Any number of commands may be in flight; each is failed with detail
+        "timeout" if no reply arrives within its own timeout.
+
+        Returns a concurrent.futures.Future resolving to a CommandReply
+        """
+        future, line = self._commands.begin(command, timeout)
+        try:
+            self.write(line)
+        except Exception:
+            self._commands.abandon(future, "write failed")
+            raise
+        return future
+    
+    def send_command(self, command, timeout=2.0):
         """Send command to PCB and wait for acknowledgment"""
-        self.write(command + '\n')
-        
-        # Wait for ACK
-        response = self.read(timeout=2.0)
-        
-        if response and 'ACK' in response:
-            return True
-        
-        return False
+        future = self.submit_command(command, timeout)
+        try:
+            return future.result(timeout).ok
+        except FutureTimeoutError:
+            # The reader fails it at its deadline; do it here in case the reader has stopped
+            self._commands.expire()
+            return future.result(0).ok
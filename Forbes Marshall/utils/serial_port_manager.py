@@ -0,0 +1,227 @@
+"""
+Serial Port Manager
+Opens several test jigs at once and routes their measurements by jig and PCB ID
+"""
+import threading
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+from data.database import Database
+from config.config import SERIAL_JIGS, SERIAL_JIG_MAX_PENDING
+from utils.frame_parser import Measurement
+from utils.command_protocol import CommandReply
+from utils.serial_handler import SerialHandler, collect_test_data
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+class _Mailbox:
+    """Unread measurements of one jig, kept per PCB ID in arrival order"""
+
+    def __init__(self, max_pending: int) -> None:
+        self.max_pending = max_pending
+        self.boards: "OrderedDict[str, Deque[Measurement]]" = OrderedDict()
+        self.condition = threading.Condition()
+
+    def put(self, measurements: List[Measurement]) -> None:
+        """Called from the jig's reader thread"""
+        with self.condition:
+            for measurement in measurements:
+                board = self.boards.get(measurement.pcb_id)
+                if board is None:
+                    board = self.boards[measurement.pcb_id] = deque(maxlen=self.max_pending)
+                elif len(board) == self.max_pending:
+                    logger.warning(f"Unread measurements for PCB {measurement.pcb_id} full, dropping oldest")
+                board.append(measurement)
+            self.condition.notify_all()
+
+    def take(self, pcb_id: Optional[str]) -> List[Measurement]:
+        """Remove and return pending measurements of one board, or of every board; lock must be held"""
+        if pcb_id is not None:
+            board = self.boards.pop(pcb_id, None)
+            return list(board) if board else []
+        taken = [measurement for board in self.boards.values() for measurement in board]
+        self.boards.clear()
+        return taken
+
+
+class SerialPortManager:
+    """
+    One SerialHandler per jig, each with its own port, reader thread and parser
+
+    Readers hand their measurements straight to the jig's mailbox, where
+    they wait, grouped by the PCB ID in the frame, until a test reads them.
+    Reads of different jigs or boards never wait on each other, so boards
+    on several jigs (or several boards on one jig) can be tested in parallel
+    from separate threads.
+    """
+
+    def __init__(self, jigs: Optional[Dict[str, str]] = None,
+                 max_pending: int = SERIAL_JIG_MAX_PENDING) -> None:
+        """
+        Args:
+            jigs: Jig name -> COM port; defaults to SERIAL_JIGS, and to the single
+                saved port if that is empty
+            max_pending: Unread measurements kept per board before the oldest are dropped
+        """
+        self.jig_ports: Dict[str, str] = dict(SERIAL_JIGS if jigs is None else jigs)
+        self.max_pending = max(1, max_pending)
+        self.db = Database()
+        self._handlers: Dict[str, SerialHandler] = {}
+        self._mailboxes: Dict[str, _Mailbox] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_available_ports():
+        """Get list of available COM ports"""
+        return SerialHandler.get_available_ports()
+
+    @property
+    def jigs(self) -> List[str]:
+        """Names of the connected jigs"""
+        return list(self._handlers)
+
+    @property
+    def is_connected(self) -> bool:
+        return bool(self._handlers)
+
+    def open(self) -> Dict[str, str]:
+        """
+        Open every configured jig concurrently
+
+        Each jig uses its own COM port with the saved baud rate, framing and
+        timeout. Jigs that fail to open are left closed.
+
+        Returns:
+            dict: Jig name -> error message for each jig that failed
+        """
+        base_config = self.db.get_comm_config()
+        if not base_config:
+            logger.error("No communication configuration found in database")
+            error = "No communication configuration found. Please configure in settings."
+            return {name: error for name in self.jig_ports or ["Serial"]}
+
+        jig_configs = {name: dict(base_config, com_port=port, port=port)
+                       for name, port in self.jig_ports.items()}
+        if not jig_configs:
+            jig_configs = {base_config.get('com_port') or base_config.get('port'): base_config}
+
+        with self._lock:
+            pending = {name: config for name, config in jig_configs.items() if name not in self._handlers}
+            with ThreadPoolExecutor(max_workers=max(1, len(pending))) as executor:
+                futures = {name: executor.submit(self._open_jig, name, config)
+                           for name, config in pending.items()}
+            errors = {}
+            for name, future in futures.items():
+                handler, mailbox, error = future.result()
+                if error:
+                    errors[name] = error
+                else:
+                    self._handlers[name] = handler
+                    self._mailboxes[name] = mailbox
+        return errors
+
+    def connect(self) -> Dict[str, str]:
+        """
+        Open every configured jig; raises the first error if none could be opened
+
+        Returns:
+            dict: Jig name -> error message for jigs that failed while others opened
+        """
+        errors = self.open()
+        if not self._handlers:
+            raise Exception(next(iter(errors.values()), "No jigs configured"))
+        return errors
+
+    def _open_jig(self, name: str, config: Dict[str, Any]):
+        mailbox = _Mailbox(self.max_pending)
+        handler = SerialHandler(on_measurements=mailbox.put)
+        try:
+            handler.connect(config)
+        except Exception as e:
+            logger.error(f"Jig {name} failed to open: {e}")
+            return handler, mailbox, str(e)
+        logger.info(f"Jig {name} connected on {config.get('com_port')}")
+        return handler, mailbox, None
+
+    def close(self) -> None:
+        """Disconnect every jig"""
+        with self._lock:
+            handlers = list(self._handlers.items())
+            self._handlers.clear()
+            self._mailboxes.clear()
+        for name, handler in handlers:
+            try:
+                handler.disconnect()
+            except Exception as e:
+                logger.error(f"Error closing jig {name}: {e}")
+
+    def disconnect(self) -> None:
+        self.close()
+
+    def _jig(self, jig: Optional[str]) -> str:
+        """Resolve a jig name; None means the first connected jig"""
+        if jig is None:
+            if not self._handlers:
+                raise Exception("Not connected to serial port")
+            return next(iter(self._handlers))
+        if jig not in self._handlers:
+            raise Exception(f"Jig {jig} is not connected")
+        return jig
+
+    def boards(self, jig: Optional[str] = None) -> List[str]:
+        """PCB IDs with unread measurements on a jig, oldest first"""
+        mailbox = self._mailboxes[self._jig(jig)]
+        with mailbox.condition:
+            return list(mailbox.boards)
+
+    def discard(self, jig: Optional[str] = None, pcb_id: Optional[str] = None) -> None:
+        """Drop unread measurements of one board, or of the whole jig, before a new test"""
+        mailbox = self._mailboxes[self._jig(jig)]
+        with mailbox.condition:
+            mailbox.take(pcb_id)
+
+    def read_measurements(self, jig: Optional[str] = None, pcb_id: Optional[str] = None,
+                          timeout: float = 1.0) -> List[Measurement]:
+        """
+        Wait for and take the unread measurements of a jig
+
+        Args:
+            jig: Jig name; None for the first connected jig
+            pcb_id: Only this board's measurements; None for every board on the jig
+            timeout: Seconds to wait for at least one measurement
+
+        Returns an empty list on timeout
+        """
+        mailbox = self._mailboxes[self._jig(jig)]
+        with mailbox.condition:
+            mailbox.condition.wait_for(
+                lambda: mailbox.boards if pcb_id is None else pcb_id in mailbox.boards, timeout
+            )
+            return mailbox.take(pcb_id)
+
+    def read_test_data(self, jig: Optional[str] = None, pcb_id: Optional[str] = None) -> Dict[str, float]:
+        """
+        Read one voltage, current and resistance reading from a jig
+
+        With pcb_id, only frames carrying that PCB ID count, so boards sharing
+        a jig can be read by concurrent callers. Returns dict with voltage,
+        current, resistance.
+        """
+        jig = self._jig(jig)
+        logger.info(f"Reading test data from jig {jig}" + (f", PCB {pcb_id}" if pcb_id else ""))
+        return collect_test_data(lambda timeout: self.read_measurements(jig, pcb_id, timeout))
+
+    def write(self, data: str, jig: Optional[str] = None) -> bool:
+        """Write data to a jig's serial port"""
+        return self._handlers[self._jig(jig)].write(data)
+
+    def submit_command(self, command: str, jig: Optional[str] = None, timeout: float = 2.0) -> "Future[CommandReply]":
+        """Send a command to a jig without waiting; see SerialHandler.submit_command"""
+        return self._handlers[self._jig(jig)].submit_command(command, timeout)
+
+    def send_command(self, command: str, jig: Optional[str] = None, timeout: float = 2.0) -> bool:
+        """Send command to a jig and wait for acknowledgment"""
+        return self._handlers[self._jig(jig)].send_command(command, timeout)
@@ -6,6 +6,7 @@ import time
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
+from utils import identity_cache
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +48,9 @@ class SessionManager:
             self._last_activity = current_time
             self._session_start = current_time
 
+            # Views resolve the logged-in user's ID from the cache instead of the database
+            identity_cache.remember(username, user_id)
+
             logger.info(f"Session created for user: {username} (ID: {user_id}, Role: {role})")
             return True
         except Exception as e:
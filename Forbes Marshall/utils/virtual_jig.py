@@ -0,0 +1,280 @@
+"""
+Virtual Test Jig
+Simulated PCB test jig on a Linux pseudo-terminal, for exercising the serial path without hardware
+
+The jig opens a PTY and behaves like the real fixture on its slave side
+(port_name), which SerialHandler, AsyncSerialHandler or SerialPortManager
+open like any other port. It streams ``PCB_ID,Parameter,Value`` lines (or
+binary frames) and answers commands as described in utils.command_protocol:
+
+    STAGE <n>   measure with stage n's distributions
+    PCB <id>    report measurements for another PCB ID
+    MEASURE     send one voltage, current and resistance reading now
+    START       stream readings at line_rate lines per second (the default)
+    STOP        stop streaming
+
+Line rate, reply latency, garbage lines and dropped bytes are configurable
+so parsers and timeouts can be load-tested on any Linux machine.
+"""
+import os
+import tty
+import math
+import time
+import heapq
+import random
+import select
+import threading
+import logging
+from itertools import count
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+from utils.frame_parser import PARAMETER_CODES, encode_binary
+from utils.command_protocol import parse_command
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+PARAMETERS = tuple(PARAMETER_CODES.values())
+
+# Unsent bytes kept while nothing reads the port; older ones are lost, like a UART overrun
+_MAX_UNSENT_BYTES = 1024 * 1024
+
+
+class Distribution(NamedTuple):
+    """Normally distributed readings, clipped to [low, high] when given"""
+    mean: float
+    stddev: float = 0.0
+    low: Optional[float] = None
+    high: Optional[float] = None
+
+    def sample(self, rng: random.Random) -> float:
+        value = rng.gauss(self.mean, self.stddev) if self.stddev else self.mean
+        if self.low is not None:
+            value = max(self.low, value)
+        if self.high is not None:
+            value = min(self.high, value)
+        return value
+
+
+class StageProfile(NamedTuple):
+    """What the simulated board reads during one stage"""
+    name: str
+    voltage: Distribution
+    current: Distribution
+    resistance: Distribution
+
+
+class JigSettings(NamedTuple):
+    """Line behaviour of the simulated jig"""
+    line_rate: float = 10.0  # Streamed measurement lines per second; 0 sends only on MEASURE
+    latency: float = 0.0  # Seconds before each command reply and MEASURE reading
+    noise_rate: float = 0.0  # Chance of a garbage line after each line sent
+    drop_rate: float = 0.0  # Chance of each sent byte being lost
+    binary: bool = False  # Binary frames instead of text lines
+    pcb_id: int = 235
+    seed: Optional[int] = None
+
+
+DEFAULT_PROFILES = (
+    StageProfile("Default", Distribution(4.4, 0.05), Distribution(0.5, 0.01), Distribution(100.0, 1.0)),
+)
+
+
+def profiles_from_plan(plan: Any, spread: float = 1.0) -> Tuple[StageProfile, ...]:
+    """
+    Stage profiles centred in each stage's limits of a TestPlan
+
+    With spread 1.0 the limits are three standard deviations from the
+    centre, so nearly every reading passes; larger spreads produce failures.
+    A missing (infinite) limit is replaced by that side of the default
+    profile's three-sigma range, shifted to stay beyond the other limit.
+    """
+    profiles = []
+    for stage in plan.stages:
+        distributions = []
+        for parameter in range(len(PARAMETERS)):
+            low, high = stage.range(parameter)
+            default = getattr(DEFAULT_PROFILES[0], PARAMETERS[parameter])
+            width = 6 * default.stddev
+            if not math.isfinite(low) and not math.isfinite(high):
+                low, high = default.mean - width / 2, default.mean + width / 2
+            elif not math.isfinite(low):
+                low = min(default.mean - width / 2, high - width)
+            elif not math.isfinite(high):
+                high = max(default.mean + width / 2, low + width)
+            distributions.append(Distribution((low + high) / 2, (high - low) / 6 * spread))
+        profiles.append(StageProfile(stage.name, *distributions))
+    return tuple(profiles) or DEFAULT_PROFILES
+
+
+class VirtualJig:
+    """
+    A simulated jig served on a PTY from a background thread
+
+    Usage:
+        with VirtualJig(settings=JigSettings(line_rate=100)) as jig:
+            handler.connect({'com_port': jig.port_name, ...})
+    """
+
+    def __init__(self, profiles: Sequence[StageProfile] = DEFAULT_PROFILES,
+                 settings: JigSettings = JigSettings()) -> None:
+        self.profiles = tuple(profiles) or DEFAULT_PROFILES
+        self.settings = settings
+        self.stage = 0
+        self.pcb_id = settings.pcb_id
+        self.streaming = settings.line_rate > 0
+        self.lines_sent = 0
+        self.bytes_dropped = 0
+        self.commands: List[str] = []
+        self.port_name: Optional[str] = None
+        self._rng = random.Random(settings.seed)
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._outbox: List[Tuple[float, int, bytes]] = []  # (due, order, bytes) heap
+        self._order = count()
+        self._tx = bytearray()
+        self._next_parameter = 0
+
+    def start(self) -> str:
+        """Open the PTY and start serving; returns the port name to connect to"""
+        self._master, self._slave = os.openpty()
+        # Raw mode: no echo and no newline translation, as on a real UART
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port_name = os.ttyname(self._slave)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="virtual-jig", daemon=True)
+        self._thread.start()
+        logger.info(f"Virtual jig listening on {self.port_name}")
+        return self.port_name
+
+    def stop(self) -> None:
+        """Stop serving and close the PTY"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self) -> "VirtualJig":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        received = bytearray()
+        next_line = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            wake = [now + 0.1]
+            if self.streaming:
+                wake.append(next_line)
+            if self._outbox:
+                wake.append(self._outbox[0][0])
+            timeout = max(0.0, min(wake) - now)
+            readable, writable, _ = select.select([self._master], [self._master] if self._tx else [], [], timeout)
+
+            if readable:
+                try:
+                    received += os.read(self._master, 4096)
+                except (BlockingIOError, InterruptedError):
+                    pass
+                except OSError:
+                    # EIO while no client has the slave side open
+                    time.sleep(0.01)
+                while b'\n' in received:
+                    line, _, rest = received.partition(b'\n')
+                    received[:] = rest
+                    self._handle_command(line.decode('utf-8', errors='replace').strip())
+
+            now = time.monotonic()
+            while self._outbox and self._outbox[0][0] <= now:
+                self._send(heapq.heappop(self._outbox)[2])
+            if self.streaming and next_line <= now:
+                # Catch up in one write if the loop fell behind the line rate
+                due = int((now - next_line) * self.settings.line_rate) + 1
+                self._send(b''.join(self._next_line() for _ in range(due)))
+                next_line += due / self.settings.line_rate
+            elif not self.streaming:
+                next_line = now
+
+            if self._tx:
+                self._flush()
+
+    def _handle_command(self, line: str) -> None:
+        if not line:
+            return
+        seq, command = parse_command(line)
+        self.commands.append(command)
+        verb, _, argument = command.partition(' ')
+        verb = verb.upper()
+        tag = f" {seq}" if seq is not None else ""
+        reply = f"ACK{tag}\n"
+        readings = b""
+        try:
+            if verb == 'STAGE':
+                stage = int(argument) - 1
+                if not 0 <= stage < len(self.profiles):
+                    raise ValueError(f"no stage {argument}")
+                self.stage = stage
+            elif verb == 'PCB':
+                self.pcb_id = int(argument)
+            elif verb == 'MEASURE':
+                readings = b''.join(self._reading(parameter) for parameter in PARAMETERS)
+            elif verb == 'START':
+                if self.settings.line_rate <= 0:
+                    raise ValueError("line rate is 0")
+                self.streaming = True
+            elif verb == 'STOP':
+                self.streaming = False
+            else:
+                raise ValueError("unknown command")
+        except ValueError as e:
+            reply = f"NAK{tag} {e}\n"
+        self._schedule(reply.encode() + readings)
+
+    def _schedule(self, data: bytes) -> None:
+        heapq.heappush(self._outbox, (time.monotonic() + self.settings.latency, next(self._order), data))
+
+    def _next_line(self) -> bytes:
+        parameter = PARAMETERS[self._next_parameter]
+        self._next_parameter = (self._next_parameter + 1) % len(PARAMETERS)
+        return self._reading(parameter)
+
+    def _reading(self, parameter: str) -> bytes:
+        """One measurement of the current stage, plus a garbage line now and then"""
+        value = getattr(self.profiles[self.stage], parameter).sample(self._rng)
+        if self.settings.binary:
+            data = encode_binary(self.pcb_id, parameter, value)
+        else:
+            data = f"{self.pcb_id},{parameter.capitalize()},{value:.4f}\r\n".encode()
+        self.lines_sent += 1
+        if self.settings.noise_rate and self._rng.random() < self.settings.noise_rate:
+            data += bytes(self._rng.randrange(32, 127) for _ in range(self._rng.randrange(1, 24))) + b'\n'
+        return data
+
+    def _send(self, data: bytes) -> None:
+        if self.settings.drop_rate:
+            rng, rate = self._rng.random, self.settings.drop_rate
+            kept = bytes(byte for byte in data if rng() >= rate)
+            self.bytes_dropped += len(data) - len(kept)
+            data = kept
+        self._tx += data
+        if len(self._tx) > _MAX_UNSENT_BYTES:
+            del self._tx[:len(self._tx) - _MAX_UNSENT_BYTES]
+
+    def _flush(self) -> None:
+        try:
+            written = os.write(self._master, self._tx)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # No client on the slave side; the bytes are lost as on an unplugged cable
+            written = len(self._tx)
+        del self._tx[:written]